@@ -0,0 +1,114 @@
+"""Memory allocated per frame on the capture-to-display path, with tracemalloc.
+
+    python -m benchmarks.bench_allocations --frames 200
+
+A 1920x1080 source is captured, resized to 1280x720 and converted to RGB
+(as in the desktop window), run through the motion gate and drawn with the
+cached detections of a skipped frame. For every frame the tracemalloc peak
+above the memory already in use is recorded (a high-water mark, so allocations
+freed before the next one do not add up). The previous path allocated a
+new decode, resize, color conversion and frame copy each time; the pooled
+path writes into buffers it already owns. The script exits non-zero if the
+pooled path's median is not below the previous path's or reaches --budget.
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import detection
+from services.capture import CaptureStage
+from services.motion import MotionGate
+from benchmarks.synthetic import SyntheticCapture, make_people
+
+class PreviousCapture(CaptureStage):
+    """The capture loop before buffers were pooled"""
+    def _loop(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            captured_at = time.perf_counter()
+            if not ret:
+                self.ended = True
+                self.slot.close()
+                return
+            if self.size is not None and (frame.shape[1], frame.shape[0]) != self.size:
+                frame = cv2.resize(frame, self.size)
+            if self.rgb:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            self.slot.put({'frame': frame, 'captured_at': captured_at, 'ready_at': time.perf_counter()},
+                          block=True)
+
+class PreviousGate(MotionGate):
+    """Thumbnail and difference images allocated on every check"""
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, int(height * self.width / width)))
+        gray = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_run(self, frame):
+        self.frames_since += 1
+        thumbnail = self._thumbnail(frame)
+        if self.reference is None or self.frames_since >= self.max_interval:
+            run = True
+        else:
+            _, changed = cv2.threshold(cv2.absdiff(thumbnail, self.reference), self.pixel_delta, 255,
+                                       cv2.THRESH_BINARY)
+            run = cv2.countNonZero(changed) / changed.size >= self.threshold
+        if run:
+            self.reference = thumbnail
+            self.frames_since = 0
+        return run
+
+def measure(stage_class, gate, frames, previous):
+    pipeline = detection.DetectionPipeline(name="bench", gate=gate)
+    people = make_people(20)
+    pipeline.cache['person_boxes'] = [box for box in people]
+    pipeline.cache['person_ids'] = list(range(len(people)))
+
+    stage = stage_class(SyntheticCapture(frames), size=(1280, 720), rgb=True, live=False)
+    tracemalloc.start()
+    stage.start()
+    peaks = []
+    while True:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        packet = stage.slot.get(timeout=5.0)
+        if packet is None:
+            break
+        frame = packet['frame']
+        gate.should_run(frame)
+        if previous:
+            frame = frame.copy()  # render_cached used to copy the frame before drawing
+        pipeline.render_cached(frame)
+        stage.release(packet['frame'])
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - baseline)
+    tracemalloc.stop()
+    stage.stop()
+    return np.array(peaks[10:]), stage.allocated  # Skip the warm-up frames
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--budget", type=float, default=64.0, help="Allowed pooled median, KiB per frame")
+    args = parser.parse_args()
+
+    print(f"{'path':>9} {'median KiB':>11} {'max KiB':>9} {'pool buffers':>13}")
+    medians = {}
+    for name, stage_class, gate, previous in (
+        ("previous", PreviousCapture, PreviousGate(min_interval=1), True),
+        ("pooled", CaptureStage, MotionGate(min_interval=1), False)
+    ):
+        peaks, allocated = measure(stage_class, gate, args.frames, previous)
+        medians[name] = np.median(peaks) / 1024
+        print(f"{name:>9} {medians[name]:>11.1f} {peaks.max() / 1024:>9.1f} "
+              f"{allocated if not previous else '-':>13}")
+    if medians["pooled"] >= medians["previous"] or medians["pooled"] >= args.budget:
+        print(f"pooled path allocates {medians['pooled']:.1f} KiB per frame (previous {medians['previous']:.1f} KiB, "
+              f"budget {args.budget:.1f} KiB)", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
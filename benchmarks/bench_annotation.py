@@ -0,0 +1,95 @@
+"""Per-frame annotation cost at 1280x720: previous drawing code vs cached overlays.
+
+    python -m benchmarks.bench_annotation --repeats 200
+
+Covers what a frame that skipped inference pays: person and PPE boxes with
+labels, violation text and the station overlay. The previous code copied
+the frame, drew every label with two cv2.putText calls and redrew every
+station outline and name on each frame.
+"""
+import argparse
+import time
+import cv2
+import numpy as np
+import detection
+from services.stations import StationManager
+from services.violation import PPEViolationDetector
+from benchmarks.synthetic import make_people, make_ppe
+
+def _outlined_text(frame, text, org, color, thickness, outline):
+    cv2.putText(frame, text, org, cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), outline, cv2.LINE_AA)
+    cv2.putText(frame, text, org, cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, thickness, cv2.LINE_AA)
+
+def previous_annotation(frame, people, ids, ppe_boxes, ppe_classes, violations, stations):
+    """The drawing done per frame before sprite labels and the station overlay"""
+    frame = frame.copy()
+    for (x1, y1, x2, y2), track_id in zip(people, ids):
+        cv2.rectangle(frame, (x1, y1), (x2, y2), detection.class_colors["person"], 2)
+        _outlined_text(frame, f"ID: {track_id}", (x1, y1 - 10), (255, 255, 255), 1, 3)
+    for (x1, y1, x2, y2), class_id in zip(ppe_boxes, ppe_classes):
+        class_name = detection.ppe_class_names[class_id]
+        cv2.rectangle(frame, (x1, y1), (x2, y2), detection.class_colors.get(class_name, (255, 255, 255)), 2)
+        _outlined_text(frame, class_name, (x1, y1 - 10), (255, 255, 255), 1, 3)
+    for (x1, y1, x2, y2), text in zip(people, violations):
+        if text:
+            _outlined_text(frame, text, (x1, y1 + 20), (206, 32, 41), 2, 4)
+    for name, polygon in zip(stations.station_names, stations.polygons):
+        points = np.array(polygon, dtype=np.int32)
+        cv2.polylines(frame, [points], True, (0, 255, 255), 2)
+        x1, y1 = points.min(axis=0)
+        cv2.putText(frame, name, (int(x1), int(y1) - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
+    return frame
+
+def current_annotation(frame, people, ids, ppe_boxes, ppe_classes, violations, stations, detector):
+    detection.draw_person_boxes(frame, people, ids, True)
+    detection.draw_ppe_boxes(frame, ppe_boxes, ppe_classes, True, True)
+    for (x1, y1, x2, y2), text in zip(people, violations):
+        if text:
+            detector.labels.draw(frame, text, (x1, y1 + 20))
+    return stations.draw_stations(frame)
+
+def make_stations(count, width=1280, height=720, rng=None):
+    rng = rng or np.random.default_rng(2)
+    stations = StationManager()
+    for _ in range(count):
+        cx, cy = rng.integers(100, width - 100), rng.integers(100, height - 100)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, 6))
+        radius = rng.integers(40, 100, 6)
+        stations.add_station(np.stack([cx + radius * np.cos(angles), cy + radius * np.sin(angles)], axis=1))
+    return stations
+
+def time_it(func, repeats):
+    func()  # First call builds the caches
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=200, help="Timed calls per configuration")
+    args = parser.parse_args()
+    repeats = args.repeats
+
+    frame = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+    detector = PPEViolationDetector(None)
+    print(f"{'people':>6} {'ppe':>5} {'stations':>8} {'before ms':>10} {'after ms':>9} {'speedup':>8}")
+    for count, station_count in ((10, 4), (50, 8), (100, 16), (200, 32)):
+        people = [tuple(int(v) for v in box) for box in make_people(count)]
+        ids = list(range(1, count + 1))
+        boxes, classes = make_ppe(np.array(people))
+        ppe_boxes = [tuple(int(v) for v in box) for box in boxes]
+        violations = ["NO HELMET | NO VEST" if i % 3 == 0 else "" for i in range(count)]
+        stations = make_stations(station_count)
+
+        before = time_it(lambda: previous_annotation(
+            frame, people, ids, ppe_boxes, classes, violations, stations), repeats)
+        # Drawing is in place now; repeated draws on one frame cost the same
+        target = frame.copy()
+        after = time_it(lambda: current_annotation(
+            target, people, ids, ppe_boxes, classes, violations, stations, detector), repeats)
+        print(f"{count:>6} {len(ppe_boxes):>5} {station_count:>8} {before:>10.2f} {after:>9.2f} "
+              f"{before / after:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
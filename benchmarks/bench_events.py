@@ -0,0 +1,60 @@
+"""Cost of recording tracking events to the SQLite store from the frame loop.
+
+    python -m benchmarks.bench_events --frames 3600 --people 30
+
+Runs PeopleTracker.update with --people people changing station often (tens of
+thousands of events per simulated hour) with and without an EventStore,
+then waits for the background writer to drain.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from services.events import EventStore
+from services.tracking import PeopleTracker
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def run_updates(event_store, frames=3600, people=30):
+    rng = random.Random(1)
+    clock = FakeClock()
+    tracker = PeopleTracker(clock=clock, event_store=event_store, stream="bench")
+    stations = ["Station 1", "Station 2", "Station 3", None]
+
+    start = time.perf_counter()
+    for frame in range(frames):
+        clock.now = float(frame)
+        ids = list(range(frame // 60, frame // 60 + people))
+        tracker.update(ids, [rng.choice(stations) for _ in ids])
+    elapsed = time.perf_counter() - start
+    tracker.close()
+    return elapsed / frames * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=3600, help="Tracker updates, one per simulated second")
+    parser.add_argument("--people", type=int, default=30)
+    args = parser.parse_args()
+
+    baseline = run_updates(None, frames=args.frames, people=args.people)
+    with tempfile.TemporaryDirectory() as folder:
+        # The loop below runs far faster than real time, so give the queue
+        # room for the whole burst instead of measuring the drop policy
+        store = EventStore(os.path.join(folder, "events.db"), max_queue=500000)
+        with_store = run_updates(store, frames=args.frames, people=args.people)
+        drain_start = time.perf_counter()
+        store.close()
+        drain = time.perf_counter() - drain_start
+
+    print(f"update without store: {baseline:.3f} ms/frame")
+    print(f"update with store:    {with_store:.3f} ms/frame")
+    print(f"events written: {store.written}, dropped: {store.dropped}, final drain {drain:.2f}s")
+
+if __name__ == "__main__":
+    main()
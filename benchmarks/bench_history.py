@@ -0,0 +1,75 @@
+"""History table refresh cost: full rebuild vs the tracker's change feed.
+
+    python -m benchmarks.bench_history --tracks 200,1000,5000
+
+A PeopleTracker holds the given number of tracks, of which --visible are
+seen on every frame (the rest wait for their timeout). Once a second the
+history table is refreshed, either as before (every row formatted by
+get_history_table_data and re-inserted) or through HistoryModel, which
+applies only the changed tracks and formats the --rows rows in view.
+Tk is not needed: the cost of the Treeview calls is counted as items
+inserted or rewritten per refresh. The live rows are checked against
+get_history_table_data.
+"""
+import argparse
+import time
+import numpy as np
+from services.tracking import PeopleTracker
+from benchmarks.bench_ppe_state import FakeClock
+
+def make_tracker(count, visible, stations, rng, clock):
+    tracker = PeopleTracker(clock=clock, timeout=1e9)
+    ids = np.arange(1, count + 1)
+    for start in range(0, count, visible):
+        clock.now += 1 / 30
+        tracker.update(ids[start:start + visible], rng.choice(stations, len(ids[start:start + visible])))
+    return tracker
+
+def main():
+    # Imported here so the module loads only when the benchmark runs (it needs tkinter)
+    from history_view import HistoryModel
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", default="200,1000,5000")
+    parser.add_argument("--visible", type=int, default=30, help="Tracks seen on every frame")
+    parser.add_argument("--rows", type=int, default=25, help="Table rows in view")
+    parser.add_argument("--refreshes", type=int, default=20)
+    args = parser.parse_args()
+
+    stations = np.array(["Station 1", "Station 2", None], dtype=object)
+    print(f"{'tracks':>6} {'refresh':>11} {'ms/refresh':>10} {'items/refresh':>13}")
+    for count in (int(value) for value in args.tracks.split(",")):
+        for incremental in (False, True):
+            rng = np.random.default_rng(0)
+            clock = FakeClock()
+            tracker = make_tracker(count, args.visible, stations, rng, clock)
+            model = HistoryModel(clock=clock)
+            model.update(tracker)
+            shown = [None] * args.rows
+            elapsed = 0.0
+            items = 0
+            for _ in range(args.refreshes):
+                for _ in range(30):  # One second of frames
+                    clock.now += 1 / 30
+                    tracker.update(rng.choice(count, args.visible, replace=False) + 1,
+                                   rng.choice(stations, args.visible))
+                start = time.perf_counter()
+                if incremental:
+                    model.update(tracker)
+                    for slot in range(min(args.rows, len(model))):
+                        values = model.row(slot)
+                        if values != shown[slot]:
+                            shown[slot] = values
+                            items += 1
+                else:
+                    rows = tracker.get_history_table_data()
+                    items += len(rows)
+                elapsed += time.perf_counter() - start
+            model.update(tracker)
+            full = sorted(tracker.get_history_table_data())
+            assert [model.row(i) for i in range(len(model))] == full, "live rows differ"
+            print(f"{count:>6} {'incremental' if incremental else 'full':>11} "
+                  f"{elapsed / args.refreshes * 1000:>10.3f} {items / args.refreshes:>13.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Live view cost on the frame loop and delivery to fast and slow viewers.
+
+    python -m benchmarks.bench_live_view --viewers 4 --seconds 5
+
+A frame loop publishes 1280x720 frames at 30 fps to a LiveView on a free
+local port while --viewers MJPEG clients read as fast as they can, one slow
+client reads at --slow-kbps, and one WebSocket client reads the counts (one
+message per published frame) and the violation events. Reported: the time
+publish() takes in the frame loop (p50/p99/max, without viewers and with them),
+JPEG encodes against frames delivered (each frame is encoded once however
+many viewers there are), and frames or messages per second each client got.
+"""
+import argparse
+import base64
+import os
+import socket
+import struct
+import threading
+import time
+import numpy as np
+from services.live_view import LiveView
+
+def mjpeg_client(port, stats, stop, kbps=None):
+    sock = socket.create_connection(("127.0.0.1", port))
+    if kbps:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16384)
+    stream = sock.makefile("rb")
+    sock.sendall(b"GET /stream.mjpg HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    while stream.readline() not in (b"\r\n", b""):
+        pass  # Response headers
+    try:
+        while not stop.is_set():
+            if stream.readline() != b"--frame\r\n":
+                break
+            length = 0
+            for line in iter(stream.readline, b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            if kbps:
+                # Take the frame in small pieces at the given rate
+                for _ in range(0, length, 4096):
+                    stream.read(min(4096, length))
+                    time.sleep(4096 * 8 / (kbps * 1000))
+                    length -= 4096
+                stream.read(max(length, 0))
+            else:
+                stream.read(length)
+            stream.readline()
+            stats["frames"] += 1
+    finally:
+        sock.close()
+
+def websocket_client(port, stats, stop):
+    sock = socket.create_connection(("127.0.0.1", port))
+    key = base64.b64encode(os.urandom(16)).decode()
+    sock.sendall(f"GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                 f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode())
+    stream = sock.makefile("rb")
+    while stream.readline() not in (b"\r\n", b""):
+        pass
+    try:
+        while not stop.is_set():
+            head = stream.read(2)
+            if len(head) < 2:
+                break
+            length = head[1] & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", stream.read(2))[0]
+            payload = stream.read(length)
+            stats["violations" if b'"violation"' in payload else "messages"] += 1
+    finally:
+        sock.close()
+
+def run(args, viewers):
+    view = LiveView(port=0, fps=args.fps)
+    view.start()
+    stop = threading.Event()
+    clients = []
+    for name, target, kwargs in ([(f"fast-{i}", mjpeg_client, {}) for i in range(viewers)] +
+                                 ([("slow", mjpeg_client, {"kbps": args.slow_kbps})] if viewers else []) +
+                                 ([("websocket", websocket_client, {})] if viewers else [])):
+        stats = {"frames": 0, "messages": 0, "violations": 0}
+        thread = threading.Thread(target=target, args=(view.port, stats, stop), kwargs=kwargs, daemon=True)
+        thread.start()
+        clients.append((name, stats))
+    time.sleep(0.5)  # Let the clients connect
+
+    rng = np.random.default_rng(0)
+    # Noise compresses badly, so the JPEGs are large and slow clients fall behind
+    frames = [rng.integers(0, 256, (720, 1280, 3), dtype=np.uint8) for _ in range(4)]
+    timings = []
+    start = time.perf_counter()
+    n = 0
+    while time.perf_counter() - start < args.seconds:
+        begin = time.perf_counter()
+        view.publish(frames[n % len(frames)], stream="bench", people=n % 7, stations={"Station 1": n % 3})
+        if n % 30 == 0:
+            view.violation(n, "helmet", stream="bench")
+        timings.append((time.perf_counter() - begin) * 1000)
+        n += 1
+        time.sleep(max(0.0, start + n / 30 - time.perf_counter()))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    view.stop()
+    return np.array(timings), view, [(name, stats, elapsed) for name, stats in clients]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--viewers", type=int, default=4, help="Fast MJPEG clients")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--fps", type=float, default=15.0, help="Live view frame rate")
+    parser.add_argument("--slow-kbps", type=float, default=4000.0, help="Read rate of the slow client")
+    args = parser.parse_args()
+
+    for viewers in (0, args.viewers):
+        timings, view, clients = run(args, viewers)
+        print(f"{viewers} fast viewers: publish p50 {np.percentile(timings, 50):.3f} ms, "
+              f"p99 {np.percentile(timings, 99):.3f} ms, max {timings.max():.3f} ms | "
+              f"encoded {view.encoded} frames, skipped by viewers {view.frames_dropped}, "
+              f"messages dropped {view.messages_dropped}")
+        for name, stats, elapsed in clients:
+            if name == "websocket":
+                print(f"    {name:<10} {stats['messages'] / elapsed:6.1f} counts/s, {stats['violations']} violations")
+            else:
+                print(f"    {name:<10} {stats['frames'] / elapsed:6.1f} frames/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Cost of the per-frame metrics on the frame loop, metrics on vs off.
+
+    python -m benchmarks.bench_metrics --people 20 --blocks 20
+
+Runs the frame component of benchmarks.run (FrameProcessor.process with the
+stub engine and tracker) and reports three things: the histogram and counter
+updates made per frame, what one update costs, and blocks of frames timed
+alternately with the updates on and with them turned into no-ops, so drift
+in the machine's speed hits both sides alike. The updates per frame times
+their cost is the overhead estimate, which does not depend on timing noise;
+the script exits non-zero if it reaches --budget percent of a frame. Capture
+and display add two more histogram updates per frame on their own threads,
+which are counted in the estimate.
+"""
+import argparse
+import sys
+import time
+import numpy as np
+from benchmarks.run import Workload, setup
+from services.metrics import Counter, Histogram, registry
+
+def metric_calls(enabled, calls):
+    """Switch the updates on or off; while on they are also counted in calls"""
+    for metric in registry.metrics.values():
+        if isinstance(metric, Histogram):
+            original = Histogram.observe.__get__(metric)
+            name = "observe"
+        elif isinstance(metric, Counter):
+            original = Counter.inc.__get__(metric)
+            name = "inc"
+        else:
+            continue
+        if not enabled:
+            setattr(metric, name, lambda *args: None)
+        elif calls is None:
+            metric.__dict__.pop(name, None)  # Back to the plain method
+        else:
+            def counted(*args, original=original):
+                calls[0] += 1
+                original(*args)
+            setattr(metric, name, counted)
+
+def update_cost(repeats=200000):
+    """Seconds per histogram observe() and per counter inc()"""
+    histogram = Histogram("bench_seconds", "", "stage")
+    counter = Counter("bench_total", "")
+    start = time.perf_counter()
+    for _ in range(repeats):
+        histogram.observe("stage", 0.001)
+    observe = (time.perf_counter() - start) / repeats
+    start = time.perf_counter()
+    for _ in range(repeats):
+        counter.inc()
+    return observe, (time.perf_counter() - start) / repeats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--people", type=int, default=20, help="People per frame")
+    parser.add_argument("--stations", type=int, default=6)
+    parser.add_argument("--blocks", type=int, default=20, help="On/off block pairs")
+    parser.add_argument("--block-frames", type=int, default=100)
+    parser.add_argument("--interval", type=int, default=3, help="Frames between inferences")
+    parser.add_argument("--budget", type=float, default=1.0, help="Allowed overhead, percent of a frame")
+    args = parser.parse_args()
+    # The fields benchmarks.run's setup() reads
+    args.frames, args.warmup, args.seed, args.ppe = args.block_frames, 0, 0, None
+    args.ppe_mode, args.engine, args.backend, args.headless = "frame", "stub", "torch", False
+
+    workload = Workload(args)
+    step = setup("frame", workload, args)
+    for i in range(args.block_frames):
+        step(i)  # Warm up the caches and the tracker
+
+    calls = [0]
+    metric_calls(True, calls)
+    for i in range(args.block_frames):
+        step(i)
+    per_frame = calls[0] / args.block_frames + 2  # Plus capture and display
+
+    times = {True: [], False: []}
+    for block in range(args.blocks * 2):
+        enabled = block % 2 == 0
+        metric_calls(enabled, None)
+        for i in range(args.block_frames):
+            start = time.perf_counter_ns()
+            step(i)
+            times[enabled].append(time.perf_counter_ns() - start)
+    metric_calls(True, None)
+
+    observe, inc = update_cost()
+    frame_on = float(np.median(times[True])) / 1e9
+    frame_off = float(np.median(times[False])) / 1e9
+    # Counters are the cheaper call; counting every update at the histogram cost is the upper bound
+    overhead = per_frame * observe / frame_off * 100
+    print(f"metric updates per frame: {per_frame:.1f} (observe {observe * 1e6:.2f} us, inc {inc * 1e6:.2f} us)")
+    print(f"frame p50 with metrics {frame_on * 1000:.3f} ms, without {frame_off * 1000:.3f} ms "
+          f"({(frame_on - frame_off) / frame_off * 100:+.1f}%, timing noise included)")
+    print(f"estimated overhead: {per_frame * observe * 1e6:.1f} us per frame, {overhead:.2f}% "
+          f"(budget {args.budget:.1f}%)")
+    if overhead >= args.budget:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
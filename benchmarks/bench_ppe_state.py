@@ -0,0 +1,164 @@
+"""PPE model work and violation alert latency, with and without the per-track PPE state.
+
+    python -m benchmarks.bench_ppe_state --people 30 --seconds 60
+
+A synthetic scene runs at 30 fps with inference every --interval frames. The
+stub engine returns the scene's true PPE for the whole frame or for each person
+crop, and counts the images the PPE model would have seen. Part way through,
+some people who wore all their PPE take off their helmet; the alert latency is
+the time from then until their violation alert (the detector's threshold plus
+however late the change was noticed). The people lacking PPE from the start
+should all be alerted on, and nobody else. "every frame" is the previous
+behaviour: PPE on every inference frame and violation timers from the raw boxes.
+"""
+import argparse
+import time
+import numpy as np
+import detection
+from services.motion import MotionGate
+from services.ppe_state import PPEStateCache
+from services.violation import PPEViolationDetector
+from benchmarks.synthetic import SyntheticScene
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class EveryFrame(PPEStateCache):
+    """Checks everyone on every inference frame, least recently checked first"""
+    def due(self, track_ids):
+        self.plans += 1
+        return sorted(range(len(track_ids)), key=lambda i: self._checked_at(track_ids[i]))
+
+    def _checked_at(self, track_id):
+        track = self.tracks.get(int(track_id))
+        return -1.0 if track is None or track.checked_at is None else track.checked_at
+
+class ScenePipeline(detection.DetectionPipeline):
+    """Tracks come straight from the scene, so no tracker is needed"""
+    def __init__(self, scene, **kwargs):
+        super().__init__(**kwargs)
+        self.scene = scene
+
+    def track(self, frame, person_dets):
+        people, ids, _, _ = self.scene.current
+        rows = np.zeros((len(people), 8), np.float32)
+        rows[:, :4] = people
+        rows[:, 4] = ids
+        return rows
+
+class SceneEngine:
+    """Returns the scene's true PPE and counts the images the PPE model gets"""
+    def __init__(self, scene, frame):
+        self.scene = scene
+        self.frame = frame
+        self.ppe_images = 0
+
+    def is_ready(self):
+        return True
+
+    def detect_people(self, frames, imgsz=320):
+        return [None for _ in frames]
+
+    def detect_ppe(self, images, imgsz=320):
+        self.ppe_images += len(images)
+        _, _, boxes, classes = self.scene.current
+        results = []
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        for image in images:
+            # Crops are views of the frame, their origin follows from the memory offset
+            offset = image.__array_interface__['data'][0] - self.frame.__array_interface__['data'][0]
+            y0, rest = divmod(offset, self.frame.strides[0])
+            x0 = rest // self.frame.strides[1]
+            inside = (centers[:, 0] >= x0) & (centers[:, 0] < x0 + image.shape[1]) & \
+                     (centers[:, 1] >= y0) & (centers[:, 1] < y0 + image.shape[0])
+            results.append(detection._Detections(
+                (boxes[inside] - np.array([x0, y0, x0, y0])).astype(np.float32),
+                np.full(int(inside.sum()), 0.8, np.float32), classes[inside].astype(np.float32)))
+        return results
+
+class QuietDetector(PPEViolationDetector):
+    def _send_violation_alert(self, track_id, ppe_type):
+        pass
+
+def run(args, mode, cached):
+    clock = FakeClock()
+    scene = SyntheticScene(args.people, rng=np.random.default_rng(args.seed))
+    frame = np.zeros((720, 1280, 3), np.uint8)
+    engine = SceneEngine(scene, frame)
+    scheduler = detection.InferenceScheduler(engine)
+    state = PPEStateCache(clock=clock) if cached else EveryFrame(clock=clock)
+    pipeline = scheduler.register(ScenePipeline(
+        scene, gate=MotionGate(min_interval=args.interval, max_interval=args.interval),
+        ppe_mode=mode, max_crops=args.max_crops, ppe_state=state))
+
+    alerts = {}
+    detector = QuietDetector(None, on_violation=lambda track_id, ppe_type: alerts.setdefault(track_id, clock.now),
+                             clock=clock)
+    state.regions = detector.ppe_regions
+
+    # People wearing both items from the start, some of whom take off their helmet
+    wearing = np.flatnonzero(scene.helmet & scene.vest)
+    removers = wearing[:args.removals]
+    removed_at = args.seconds / 3
+
+    inference_frames = 0
+    elapsed = 0.0
+    for n in range(int(args.seconds * 30)):
+        clock.now = n / 30
+        if clock.now >= removed_at:
+            scene.helmet[removers] = False
+        scene.step()
+        scene.current = scene.frame_detections()
+
+        start = time.perf_counter()
+        due = pipeline.gate.should_run(frame)
+        inference_frames += due
+        if due:
+            result = scheduler.run_batch([(pipeline, frame, False, False, False)], checked=True)[0]
+        else:
+            result = pipeline.render_cached(frame, False, False, False)
+        _, _, boxes, ids, ppe = result
+        ppe_boxes, ppe_classes = ppe if ppe else ([], [])
+        detector.update(boxes, ids, ppe_boxes, ppe_classes,
+                        missing_since=state.status(ids) if cached else None)
+        elapsed += time.perf_counter() - start
+
+    latencies = [alerts[track_id] - removed_at for track_id in scene.ids[removers] if track_id in alerts]
+    violators = set(scene.ids[~(scene.helmet & scene.vest)]) - set(scene.ids[removers])
+    compliant = set(scene.ids) - violators - set(scene.ids[removers])
+    return {
+        "ppe_images": engine.ppe_images / max(inference_frames, 1),
+        "frame_ms": elapsed / (args.seconds * 30) * 1000,
+        "latency": latencies,
+        "missed": len(removers) - len(latencies),
+        "violators": f"{len(violators & set(alerts))}/{len(violators)}",
+        "false_alerts": len(compliant & set(alerts))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--people", type=int, default=30)
+    parser.add_argument("--seconds", type=float, default=60.0, help="Scene length at 30 fps")
+    parser.add_argument("--interval", type=int, default=3, help="Frames between inferences")
+    parser.add_argument("--max-crops", type=int, default=4)
+    parser.add_argument("--removals", type=int, default=5, help="People who take off their helmet")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'mode':<6} {'ppe checks':<11} {'PPE images/inf':>14} {'py ms/frame':>11} "
+          f"{'removal alert s (mean/max)':>27} {'missed':>6} {'violators alerted':>17} {'false alerts':>12}")
+    for mode in ("frame", "crops"):
+        for cached in (False, True):
+            result = run(args, mode, cached)
+            latency = result["latency"]
+            latency_text = f"{np.mean(latency):.2f} / {np.max(latency):.2f}" if latency else "-"
+            print(f"{mode:<6} {'state cache' if cached else 'every frame':<11} {result['ppe_images']:>14.2f} "
+                  f"{result['frame_ms']:>11.3f} {latency_text:>27} {result['missed']:>6} "
+                  f"{result['violators']:>17} {result['false_alerts']:>12}")
+
+if __name__ == "__main__":
+    main()
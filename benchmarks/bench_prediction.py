@@ -0,0 +1,83 @@
+"""Person box accuracy on frames without inference: cached boxes vs constant-velocity prediction.
+
+    python -m benchmarks.bench_prediction --people 20 --seconds 30
+
+People walk across a synthetic scene at 30 fps. Every --interval frames the
+pipeline gets the true boxes plus tracker-like jitter; on the frames between,
+render_cached either repeats the last boxes (as before) or extrapolates them.
+Reported against the true boxes of every skipped frame: mean IoU, mean center
+error in pixels and the share of people assigned to the wrong station, for a
+range of inference intervals.
+"""
+import argparse
+import time
+import numpy as np
+import detection
+from benchmarks.bench_annotation import make_stations
+from benchmarks.synthetic import SyntheticScene
+
+def iou(a, b):
+    x1 = np.maximum(a[:, 0], b[:, 0])
+    y1 = np.maximum(a[:, 1], b[:, 1])
+    x2 = np.minimum(a[:, 2], b[:, 2])
+    y2 = np.minimum(a[:, 3], b[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = lambda box: (box[:, 2] - box[:, 0]) * (box[:, 3] - box[:, 1])
+    return inter / np.maximum(area(a) + area(b) - inter, 1)
+
+def run(args, interval, predict):
+    rng = np.random.default_rng(args.seed)
+    scene = SyntheticScene(args.people, rng=np.random.default_rng(args.seed))
+    stations = make_stations(args.stations, rng=np.random.default_rng(args.seed))
+    stations.set_frame_size(1280, 720)
+    pipeline = detection.DetectionPipeline(name="bench", predict_boxes=predict)
+    frame = np.zeros((720, 1280, 3), np.uint8)
+    no_ppe = detection._Detections(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.float32))
+
+    ious = []
+    errors = []
+    wrong_station = 0
+    checked = 0
+    elapsed = 0.0
+    for n in range(int(args.seconds * 30)):
+        scene.step()
+        truth = scene.boxes.copy()
+        if n % interval == 0:
+            tracks = np.zeros((len(truth), 8), np.float32)
+            tracks[:, :4] = truth + rng.normal(0, args.jitter, truth.shape)
+            tracks[:, 4] = scene.ids
+            pipeline.apply(frame, tracks, no_ppe, False, False, False)
+            continue
+
+        start = time.perf_counter()
+        _, _, boxes, ids, _ = pipeline.render_cached(frame, False, False, False)
+        elapsed += time.perf_counter() - start
+        boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+        ious.append(iou(boxes, truth).mean())
+        errors.append(np.hypot(*((boxes[:, :2] + boxes[:, 2:]) / 2 - (truth[:, :2] + truth[:, 2:]) / 2).T).mean())
+        expected = stations.lookup((truth[:, :2] + truth[:, 2:]) // 2)
+        wrong_station += int((stations.lookup((boxes[:, :2] + boxes[:, 2:]) // 2) != expected).sum())
+        checked += len(boxes)
+    skipped = max(len(ious), 1)
+    return np.mean(ious), np.mean(errors), wrong_station / max(checked, 1) * 100, elapsed / skipped * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--people", type=int, default=20)
+    parser.add_argument("--stations", type=int, default=6)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--jitter", type=float, default=2.0, help="Tracker box noise, pixels (std)")
+    parser.add_argument("--intervals", default="2,3,5,8", help="Frames between inferences")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'interval':>8} {'boxes':>9} {'mean IoU':>9} {'center err px':>14} {'wrong station %':>16} "
+          f"{'ms/frame':>9}")
+    for interval in (int(value) for value in args.intervals.split(",")):
+        for predict in (False, True):
+            mean_iou, error, wrong, ms = run(args, interval, predict)
+            print(f"{interval:>8} {'predicted' if predict else 'cached':>9} {mean_iou:>9.3f} {error:>14.1f} "
+                  f"{wrong:>16.2f} {ms:>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Distant-worker recall and model cost of tiled inference, with a resolution-aware stub model.
+
+    python -m benchmarks.bench_tiling --frames 50
+
+A 1920x1080 scene has people close to the camera and small ones on the far
+side (the top band of the frame). The stub model finds a person only when the
+part of them inside its input is at least --min-pixels tall after scaling to
+the model input size, and returns that part as the box (like a real detector
+cutting a person at a tile edge) after its own NMS. Each tiled configuration
+goes through the scheduler's tile batching and cross-tile merge. Recall is
+measured against the true boxes (IoU >= 0.5), duplicates are extra boxes on
+an already found person, and the cost is the model input pixels per frame
+relative to one 320 px pass.
+"""
+import argparse
+import time
+import numpy as np
+import detection
+from services.tiling import Tiler, merge_detections
+
+class ResolutionStub:
+    """Finds the people big enough in the model input, boxes clipped to the input"""
+    def __init__(self, min_pixels):
+        self.min_pixels = min_pixels
+        self.frame = None
+        self.people = None
+        self.input_pixels = 0
+
+    def is_ready(self):
+        return True
+
+    def detect_people(self, images, imgsz=320):
+        results = []
+        for image in images:
+            self.input_pixels += imgsz * imgsz
+            offset = image.__array_interface__['data'][0] - self.frame.__array_interface__['data'][0]
+            y0, rest = divmod(offset, self.frame.strides[0])
+            x0 = rest // self.frame.strides[1]
+            height, width = image.shape[:2]
+            scale = imgsz / max(height, width)  # Letterboxed to imgsz
+            boxes = self.people - np.array([x0, y0, x0, y0])
+            visible = boxes.copy()
+            np.clip(visible[:, 0::2], 0, width, out=visible[:, 0::2])
+            np.clip(visible[:, 1::2], 0, height, out=visible[:, 1::2])
+            visible_height = visible[:, 3] - visible[:, 1]
+            visible_share = (visible[:, 2] - visible[:, 0]) * visible_height / \
+                np.maximum((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]), 1)
+            found = (visible_height * scale >= self.min_pixels) & (visible_share >= 0.3)
+            xyxy = visible[found].astype(np.float32)
+            conf = (0.5 + 0.4 * visible_share[found]).astype(np.float32)
+            cls = np.zeros(len(xyxy), np.float32)
+            keep = merge_detections(xyxy, conf, cls)  # The model's own NMS
+            results.append(detection._Detections(xyxy[keep], conf[keep], cls[keep]))
+        return results
+
+def make_scene(rng, near, far, width=1920, height=1080, band=300):
+    """Near people 150-400 px tall anywhere, far people 16-40 px tall in the top band"""
+    def people(count, low, high, y_max):
+        h = rng.uniform(low, high, count)
+        w = h / rng.uniform(2.0, 3.0, count)
+        x1 = rng.uniform(0, width - w)
+        y1 = rng.uniform(0, np.maximum(y_max - h, 1))
+        return np.stack([x1, y1, x1 + w, y1 + h], axis=1)
+    return np.concatenate([people(near, 150, 400, height), people(far, 16, 40, band)]), near
+
+def match(found, truth):
+    """(people found, duplicate boxes) at IoU >= 0.5"""
+    if not len(found) or not len(truth):
+        return 0, 0
+    x1 = np.maximum(found[:, None, 0], truth[None, :, 0])
+    y1 = np.maximum(found[:, None, 1], truth[None, :, 1])
+    x2 = np.minimum(found[:, None, 2], truth[None, :, 2])
+    y2 = np.minimum(found[:, None, 3], truth[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = lambda b: (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    iou = inter / (area(found)[:, None] + area(truth)[None, :] - inter)
+    best = iou.argmax(axis=1)
+    hits = iou.max(axis=1) >= 0.5
+    matched = len(set(best[hits].tolist()))
+    return matched, int(hits.sum()) - matched
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--near", type=int, default=8)
+    parser.add_argument("--far", type=int, default=12)
+    parser.add_argument("--min-pixels", type=float, default=12.0, help="Smallest person height the model finds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    frame = np.zeros((1080, 1920, 3), np.uint8)
+    band = {"rect": [0, 0, 1920, 300], "tile_size": 320, "stride": 240}
+    configs = [
+        ("whole frame 320", None, 320),
+        ("whole frame 640", None, 640),
+        ("tiles everywhere 320/240", Tiler(), 320),
+        ("tiles on far band 320/240", Tiler(regions=[band]), 320),
+        ("far band 480/400", Tiler(regions=[dict(band, tile_size=480, stride=400)]), 320),
+        ("tiles everywhere, no whole", Tiler(full_frame=False), 320),
+        ("far band only, no whole", Tiler(regions=[band], full_frame=False), 320),
+        # No region inside the frame: must fall back to the whole-frame pass
+        ("no tiles, no whole frame", Tiler(regions=[{"rect": [4000, 4000, 5000, 5000]}], full_frame=False), 320),
+    ]
+
+    print(f"{'configuration':<28} {'tiles':>5} {'near recall':>11} {'far recall':>10} {'duplicates':>10} "
+          f"{'model cost':>10} {'merge ms':>8}")
+    for name, tiler, imgsz in configs:
+        rng = np.random.default_rng(args.seed)
+        stub = ResolutionStub(args.min_pixels)
+        stub.frame = frame
+        scheduler = detection.InferenceScheduler(stub)
+        pipeline = detection.DetectionPipeline(name="bench")
+        pipeline.tiler = tiler
+        found = {"near": 0, "far": 0, "duplicates": 0}
+        totals = {"near": 0, "far": 0}
+        elapsed = 0.0
+        for _ in range(args.frames):
+            stub.people, near = make_scene(rng, args.near, args.far)
+            if tiler is None:
+                dets = stub.detect_people([frame], imgsz=imgsz)[0]
+            else:
+                start = time.perf_counter()
+                dets = scheduler._detect(stub.detect_people, [(pipeline, frame)], [0])[0]
+                elapsed += time.perf_counter() - start
+            for part, truth in (("near", stub.people[:near]), ("far", stub.people[near:])):
+                hits, duplicates = match(dets.xyxy, truth)
+                found[part] += hits
+                found["duplicates"] += duplicates
+                totals[part] += len(truth)
+        tiles = len(tiler.tiles(1920, 1080)) if tiler else 0
+        cost = stub.input_pixels / args.frames / (320 * 320)
+        # Includes the stub's own time, the merge is a small part of it
+        merge_ms = elapsed / args.frames * 1000 if tiler else 0.0
+        print(f"{name:<28} {tiles:>5} {found['near'] / max(totals['near'], 1):>11.2f} "
+              f"{found['far'] / max(totals['far'], 1):>10.2f} {found['duplicates']:>10} {cost:>9.1f}x "
+              f"{merge_ms:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""PeopleTracker memory over a simulated multi-day run.
+
+    python -m benchmarks.bench_tracker_memory --days 3
+
+A fake clock drives one update per simulated second. Workers come and go
+(a new track ID roughly every visit) and move between stations, so the
+old dict-per-track history with an unbounded station_history list would
+keep growing. A few permanent workers never leave the frame, which is the
+case where the station history of a single track used to grow without
+limit. The change feed remembers dropped track IDs only for
+removed_window seconds, so its tombstones do not pile up either (with a
+fixed 4096-entry cap they reached about 570 KiB by day 3). Memory should
+stay flat, around 75 KiB, after the first timeout window.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from services.tracking import PeopleTracker
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def simulate(days, people=20, permanent=2, stations=6, visit_seconds=600, report_hours=6):
+    rng = random.Random(0)
+    clock = FakeClock()
+    tracker = PeopleTracker(clock=clock)
+    station_names = [f"Station {i + 1}" for i in range(stations)] + [None]
+
+    next_id = 0
+    active = {}  # {track_id: (leave_time, station)}
+    for _ in range(permanent):
+        active[next_id] = (float("inf"), rng.choice(station_names))
+        next_id += 1
+    tracemalloc.start()
+    start = time.perf_counter()
+    print(f"{'hours':>6} {'tracks':>7} {'memory KiB':>11} {'peak KiB':>9}")
+
+    for second in range(int(days * 86400)):
+        clock.now = float(second)
+
+        # Replace workers whose visit ended (the tracker sees a new ID)
+        for track_id in [tid for tid, (leave, _) in active.items() if leave <= second]:
+            del active[track_id]
+        while len(active) < people:
+            active[next_id] = (second + rng.randint(visit_seconds // 2, visit_seconds * 2),
+                               rng.choice(station_names))
+            next_id += 1
+
+        # Some people change station every second
+        for track_id in list(active):
+            if rng.random() < 0.03:
+                active[track_id] = (active[track_id][0], rng.choice(station_names))
+
+        ids = list(active)
+        tracker.update(ids, [active[tid][1] for tid in ids])
+
+        if second % (report_hours * 3600) == 0:
+            current, peak = tracemalloc.get_traced_memory()
+            print(f"{second / 3600:>6.0f} {len(tracker.history):>7} {current / 1024:>11.1f} {peak / 1024:>9.1f}")
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{days * 24:>6.0f} {len(tracker.history):>7} {current / 1024:>11.1f} {peak / 1024:>9.1f}")
+    print(f"{next_id} track IDs seen, {time.perf_counter() - start:.1f}s wall time")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=float, default=3)
+    parser.add_argument("--people", type=int, default=20)
+    parser.add_argument("--permanent", type=int, default=2, help="Workers that never leave")
+    args = parser.parse_args()
+    simulate(args.days, people=args.people, permanent=args.permanent)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""PPE-to-person association: previous nested loop vs the NumPy matrix.
+
+    python -m benchmarks.bench_violation --people 10,50,100,200
+"""
+import argparse
+import time
+import numpy as np
+from services.violation import PPEViolationDetector
+from benchmarks.synthetic import make_people, make_ppe
+
+def _boxes_overlap(box1, box2):
+    x1_1, y1_1, x2_1, y2_1 = box1
+    x1_2, y1_2, x2_2, y2_2 = box2
+    if x1_1 > x2_2 or x1_2 > x2_1:
+        return False
+    if y1_1 > y2_2 or y1_2 > y2_1:
+        return False
+    return True
+
+def nested_loop_match(person_boxes, ppe_boxes, ppe_classes):
+    """The per-pair Python loop PPEViolationDetector.update used before"""
+    helmets = []
+    vests = []
+    for person_box in person_boxes:
+        has_helmet = False
+        has_vest = False
+        for j, ppe_box in enumerate(ppe_boxes):
+            if _boxes_overlap(person_box, ppe_box):
+                if ppe_classes[j] == 0:
+                    has_helmet = True
+                elif ppe_classes[j] == 1:
+                    has_vest = True
+        helmets.append(has_helmet)
+        vests.append(has_vest)
+    return helmets, vests
+
+def time_it(func, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--people", default="10,50,100,200", help="Comma separated people per frame")
+    args = parser.parse_args()
+
+    overlap_only = PPEViolationDetector(None, helmet_region=None)
+    print(f"{'people':>6} {'ppe':>5} {'loop ms':>9} {'numpy ms':>9} {'speedup':>8}")
+    for count in (int(value) for value in args.people.split(",")):
+        people = make_people(count)
+        boxes, classes = make_ppe(people)
+        person_list = [box for box in people]
+        ppe_list = [box for box in boxes]
+
+        # Same answer as the old loop when no region rule is set
+        worn = overlap_only.match_ppe(person_list, ppe_list, classes)
+        helmets, vests = nested_loop_match(person_list, ppe_list, classes)
+        assert list(worn[0]) == helmets and list(worn[1]) == vests
+
+        repeats = 20 if count >= 100 else 100
+        loop_ms = time_it(lambda: nested_loop_match(person_list, ppe_list, classes), repeats)
+        numpy_ms = time_it(lambda: overlap_only.match_ppe(person_list, ppe_list, classes), repeats)
+        print(f"{count:>6} {len(boxes):>5} {loop_ms:>9.2f} {numpy_ms:>9.3f} {loop_ms / numpy_ms:>7.0f}x")
+
+if __name__ == "__main__":
+    main()
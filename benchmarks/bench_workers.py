@@ -0,0 +1,105 @@
+"""Multi-camera inference throughput with the models in 0..N worker processes.
+
+    python -m benchmarks.bench_workers --cameras 8 --workers 0,1,2,4 --model-ms 20
+
+Each step runs the person and the PPE model over one 1280x720 frame from
+every camera, as the scheduler does on a multi-camera batch. The models are
+replaced by BusyEngine, which keeps a core busy for --model-ms per 320 px
+input (scaled with the input area, like the real models pinned to one torch
+thread) and returns a box computed from the image content, so the results of
+every configuration are checked against the in-process run. Workers 0 is the
+in-process engine; --model-ms 0 measures the cost of handing frames to the
+workers and reading the results back.
+"""
+import argparse
+import os
+import time
+import numpy as np
+import detection
+from services.workers import InferencePool
+
+class BusyEngine:
+    """Stand-in for DetectionEngine that burns CPU time instead of running models"""
+    def __init__(self, person_weights=None, ppe_weights=None, backend="torch", calibration_dir=None):
+        self.backend = backend
+        self.ms = float(os.environ.get("SAFESCAN_BENCH_MODEL_MS", "20"))  # Also reaches the workers
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+
+    def warmup(self):
+        pass
+
+    def is_ready(self):
+        return True
+
+    def _detect(self, images, imgsz):
+        results = []
+        for image in images:
+            end = time.process_time() + self.ms / 1000 * (imgsz / 320) ** 2
+            while time.process_time() < end:
+                pass
+            # One box that depends on the pixels, so a mixed-up result shows
+            x, y = float(image[0, :, 0].mean()), float(image[:, 0, 1].mean())
+            results.append(detection._Detections(
+                np.array([[x, y, x + image.shape[1] / 4, y + image.shape[0] / 4]], np.float32),
+                np.array([image[0, 0, 2] / 255], np.float32), np.zeros(1, np.float32)))
+        return results
+
+    def detect_people(self, frames, imgsz=320):
+        return self._detect(frames, imgsz)
+
+    def detect_ppe(self, images, imgsz=320):
+        return self._detect(images, imgsz)
+
+def run(engine, frames, steps):
+    results = []
+    start = time.perf_counter()
+    for step in range(steps):
+        batch = frames[step % len(frames)]
+        results.append((engine.detect_people(batch), engine.detect_ppe(batch)))
+    return time.perf_counter() - start, results
+
+def same(a, b):
+    return all(np.array_equal(x.xyxy, y.xyxy) and np.array_equal(x.conf, y.conf)
+               for (people_a, ppe_a), (people_b, ppe_b) in zip(a, b)
+               for x, y in zip(people_a + ppe_a, people_b + ppe_b))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cameras", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=30, help="Batches (one frame per camera each)")
+    parser.add_argument("--workers", default="0,1,2,4", help="Worker counts, 0 = in process")
+    parser.add_argument("--model-ms", type=float, default=20.0, help="CPU time per 320 px model input")
+    args = parser.parse_args()
+
+    os.environ["SAFESCAN_BENCH_MODEL_MS"] = str(args.model_ms)
+    rng = np.random.default_rng(0)
+    frames = [[rng.integers(0, 256, (720, 1280, 3), dtype=np.uint8) for _ in range(args.cameras)]
+              for _ in range(4)]
+
+    print(f"{os.cpu_count()} CPUs, {args.cameras} cameras, {args.model_ms:.0f} ms per model input")
+    print(f"{'workers':>7} {'frames/s':>9} {'speedup':>8} {'ms/batch':>9} {'startup s':>9} {'results':>8}")
+    baseline = None
+    for count in (int(value) for value in args.workers.split(",")):
+        start = time.perf_counter()
+        if count:
+            engine = InferencePool(count, engine="benchmarks.bench_workers:BusyEngine")
+            engine.warmup()
+        else:
+            engine = BusyEngine()
+        startup = time.perf_counter() - start
+        try:
+            run(engine, frames, 2)  # First slot writes and page faults
+            elapsed, results = run(engine, frames, args.steps)
+        finally:
+            if count:
+                engine.close()
+        rate = args.steps * args.cameras / elapsed
+        if baseline is None:
+            baseline = (rate, results)
+        check = "same" if same(results, baseline[1]) else "DIFFER"
+        print(f"{count:>7} {rate:>9.1f} {rate / baseline[0]:>7.2f}x {elapsed / args.steps * 1000:>9.1f} "
+              f"{startup:>9.2f} {check:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Benchmark harness for the per-frame hot paths, on synthetic frames and detections.
+
+    python -m benchmarks.run --people 50 --stations 8 --output before.json
+    python -m benchmarks.run --people 50 --stations 8 --compare before.json
+
+Components:
+    detection   InferenceScheduler.run_batch with the stub engine and tracker
+                (crop selection, PPE state and drawing; the models and
+                BYTETracker are not run)
+    tracking    PeopleTracker.update
+    violation   PPEViolationDetector.update
+    stations    StationManager.lookup + count_people_in_stations
+    annotation  Box, label, violation and station drawing on a 1280x720 frame
+    frame       FrameProcessor.process end to end with the stub engine and tracker
+
+Every component is timed per call (throughput, p50, p99) and run a second
+time under tracemalloc for its peak memory, so the timings are not slowed
+by tracing. The table goes to stderr and the JSON results to stdout or
+--output; --compare prints the change against an earlier results file.
+--engine models uses the real DetectionEngine and tracker instead of the
+stubs, which needs torch and ultralytics.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import detection
+from processing import FrameProcessor
+from services.motion import MotionGate
+from services.tracking import PeopleTracker
+from services.violation import PPEViolationDetector
+from benchmarks.bench_annotation import make_stations
+from benchmarks.synthetic import SyntheticScene
+
+COMPONENTS = ("detection", "tracking", "violation", "stations", "annotation", "frame")
+
+class StubEngine:
+    """Stands in for DetectionEngine, returning the scene's detections for the current frame"""
+    def __init__(self):
+        self.people = None
+        self.ids = None
+        self.ppe = None
+
+    def set_frame(self, people, ids, ppe_boxes, ppe_classes):
+        self.ids = ids
+        self.people = detection._Detections(people.astype(np.float32), np.full(len(people), 0.9, np.float32),
+                                            np.zeros(len(people), np.float32))
+        self.ppe = detection._Detections(ppe_boxes.astype(np.float32), np.full(len(ppe_boxes), 0.8, np.float32),
+                                         ppe_classes.astype(np.float32))
+
+    def is_ready(self):
+        return True
+
+    def detect_people(self, frames, imgsz=320):
+        return [self.people for _ in frames]
+
+    def detect_ppe(self, images, imgsz=320):
+        if imgsz == 320:
+            return [self.ppe for _ in images]
+        # Person crops: one helmet near the top of each crop
+        return [detection._Detections(
+            np.array([[image.shape[1] * 0.3, 0, image.shape[1] * 0.7, image.shape[0] * 0.15]], np.float32),
+            np.array([0.8], np.float32), np.zeros(1, np.float32)) for image in images]
+
+class StubTracker:
+    """Stands in for BYTETracker: the stub engine's people keep the scene's IDs"""
+    def __init__(self, engine):
+        self.engine = engine
+
+    def update(self, dets, frame):
+        ids = self.engine.ids[:len(dets)]
+        return np.column_stack([dets.xyxy, ids, dets.conf, dets.cls, np.arange(len(dets))]).astype(np.float32)
+
+class Workload:
+    """Precomputed synthetic frames so generating them is never timed"""
+    def __init__(self, args):
+        scene = SyntheticScene(args.people, rng=np.random.default_rng(args.seed), ppe=args.ppe)
+        self.frames = []
+        for _ in range(args.frames + args.warmup):
+            scene.step()
+            self.frames.append(scene.frame_detections())
+        # Drawing happens in place, the same image is reused for every call
+        self.image = np.random.default_rng(args.seed).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+        self.args = args
+
+    def stations(self):
+        stations = make_stations(self.args.stations, rng=np.random.default_rng(self.args.seed))
+        stations.set_frame_size(1280, 720)
+        return stations
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_engine(args):
+    if args.engine == "models":
+        engine = detection.DetectionEngine(backend=args.backend)
+        engine.warmup()
+        return engine
+    return StubEngine()
+
+def make_pipeline(args, engine):
+    interval = args.interval
+    return detection.DetectionPipeline(
+        name="bench",
+        gate=MotionGate(min_interval=interval, max_interval=interval),
+        ppe_mode=args.ppe_mode,
+        tracker_factory=(lambda config: StubTracker(engine)) if isinstance(engine, StubEngine) else None
+    )
+
+def setup(component, workload, args):
+    """Returns a step(i) callable that runs the component on synthetic frame i"""
+    frames = workload.frames
+    settings = {"people": True, "helmets": True, "vests": True}
+
+    if component == "detection":
+        engine = make_engine(args)
+        scheduler = detection.InferenceScheduler(engine)
+        pipeline = scheduler.register(make_pipeline(args, engine))
+
+        def step(i):
+            if isinstance(engine, StubEngine):
+                engine.set_frame(*frames[i])
+            scheduler.run_batch([(pipeline, workload.image, True, True, True)])
+        return step
+
+    if component == "tracking":
+        clock = FakeClock()
+        tracker = PeopleTracker(clock=clock)
+        stations = workload.stations()
+        names = [stations.names_for(stations.lookup((people[:, :2] + people[:, 2:]) // 2))
+                 for people, *_ in frames]
+
+        def step(i):
+            clock.now = i / 30
+            tracker.update(frames[i][1], names[i])
+        return step
+
+    if component == "violation":
+        detector = PPEViolationDetector(None)
+
+        def step(i):
+            people, ids, ppe_boxes, ppe_classes = frames[i]
+            detector.update(people, ids, ppe_boxes, ppe_classes)
+        return step
+
+    if component == "stations":
+        stations = workload.stations()
+        positions = [(people[:, :2] + people[:, 2:]) // 2 for people, *_ in frames]
+
+        def step(i):
+            stations.count_people_in_stations(station_indices=stations.lookup(positions[i]))
+        return step
+
+    if component == "annotation":
+        stations = workload.stations()
+        detector = PPEViolationDetector(None)
+        image = workload.image
+
+        def step(i):
+            people, ids, ppe_boxes, ppe_classes = frames[i]
+            detection.draw_person_boxes(image, people, ids, True)
+            detection.draw_ppe_boxes(image, ppe_boxes, ppe_classes, True, True)
+            detector.draw_violation_indicators(image, people, ids)
+            stations.draw_stations(image)
+        return step
+
+    if component == "frame":
+        engine = make_engine(args)
+        scheduler = detection.InferenceScheduler(engine)
+        pipeline = scheduler.register(make_pipeline(args, engine))
+        processor = FrameProcessor(PeopleTracker(), workload.stations(), PPEViolationDetector(None),
+                                   pipeline=pipeline, scheduler=scheduler)
+
+        def step(i):
+            if isinstance(engine, StubEngine):
+                engine.set_frame(*frames[i])
+            processor.process(workload.image, settings, annotate=not args.headless)
+        return step
+
+    raise ValueError(f"Unknown component {component}")
+
+def run_component(component, workload, args):
+    # Timing pass
+    step = setup(component, workload, args)
+    for i in range(args.warmup):
+        step(i)
+    latencies = np.empty(args.frames)
+    start = time.perf_counter()
+    for n, i in enumerate(range(args.warmup, args.warmup + args.frames)):
+        t0 = time.perf_counter_ns()
+        step(i)
+        latencies[n] = time.perf_counter_ns() - t0
+    elapsed = time.perf_counter() - start
+
+    # Memory pass on fresh state, traced
+    step = setup(component, workload, args)
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for i in range(args.warmup + args.frames):
+        step(i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies /= 1e6
+    return {
+        "calls": args.frames,
+        "throughput_per_s": round(args.frames / elapsed, 1),
+        "mean_ms": round(float(latencies.mean()), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+        "peak_kib": round((peak - baseline) / 1024, 1)
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('commit')})", file=sys.stderr)
+    print(f"{'component':<12} {'p50 before':>11} {'p50 now':>9} {'change':>8} {'p99 before':>11} {'p99 now':>9}",
+          file=sys.stderr)
+    for component, now in results["results"].items():
+        before = baseline["results"].get(component)
+        if not before or "p50_ms" not in before or "p50_ms" not in now:
+            continue
+        change = (now["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0.0
+        print(f"{component:<12} {before['p50_ms']:>11.3f} {now['p50_ms']:>9.3f} {change:>+7.1f}% "
+              f"{before['p99_ms']:>11.3f} {now['p99_ms']:>9.3f}", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--components", default=",".join(COMPONENTS),
+                        help=f"Comma separated subset of {', '.join(COMPONENTS)}")
+    parser.add_argument("--people", type=int, default=20, help="People per frame")
+    parser.add_argument("--ppe", type=int, help="Helmet and vest boxes per frame (default about 80%% of 2 per person)")
+    parser.add_argument("--stations", type=int, default=6)
+    parser.add_argument("--frames", type=int, default=300, help="Timed calls per component")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--interval", type=int, default=1, help="Frames between inferences (1 = every frame)")
+    parser.add_argument("--ppe-mode", choices=["frame", "crops"], default="frame")
+    parser.add_argument("--engine", choices=["stub", "models"], default="stub",
+                        help="stub returns synthetic detections, models runs the real YOLO models")
+    parser.add_argument("--backend", default="torch", help="Backend for --engine models")
+    parser.add_argument("--headless", action="store_true", help="No drawing in the frame component")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--compare", help="Earlier JSON results to compare against")
+    args = parser.parse_args(argv)
+    if args.ppe is not None and not 0 <= args.ppe <= 2 * args.people:
+        parser.error(f"--ppe must be between 0 and {2 * args.people} for {args.people} people")
+
+    workload = Workload(args)
+    ppe_per_frame = float(np.mean([len(boxes) for _, _, boxes, _ in workload.frames]))
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor()
+        },
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "workload": {"ppe_per_frame": round(ppe_per_frame, 1)},
+        "results": {}
+    }
+
+    print(f"{'component':<12} {'calls/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'peak KiB':>9}", file=sys.stderr)
+    for component in args.components.split(","):
+        component = component.strip()
+        try:
+            result = run_component(component, workload, args)
+        except ImportError as e:
+            # e.g. --engine models without torch and ultralytics
+            results["results"][component] = {"skipped": str(e)}
+            print(f"{component:<12} skipped: {str(e)}", file=sys.stderr)
+            continue
+        results["results"][component] = result
+        print(f"{component:<12} {result['throughput_per_s']:>9.1f} {result['p50_ms']:>8.3f} "
+              f"{result['p99_ms']:>8.3f} {result['peak_kib']:>9.1f}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
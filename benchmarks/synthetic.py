@@ -0,0 +1,94 @@
+"""Synthetic detections for benchmarks, so no camera or model is needed"""
+import numpy as np
+
+def make_people(count, width=1280, height=720, rng=None):
+    """Random person boxes (N, 4) as int xyxy inside the frame"""
+    rng = rng or np.random.default_rng(0)
+    w = rng.integers(30, 120, count)
+    h = (w * rng.uniform(2.0, 3.0, count)).astype(int)
+    x1 = rng.integers(0, width - 120, count)
+    y1 = rng.integers(0, max(1, height - 360), count)
+    return np.stack([x1, y1, x1 + w, np.minimum(y1 + h, height - 1)], axis=1)
+
+def make_ppe(people, helmet_rate=0.8, vest_rate=0.8, rng=None):
+    """Helmet/vest boxes placed on a share of the people, returns (boxes, class_ids)"""
+    rng = rng or np.random.default_rng(1)
+    boxes = []
+    classes = []
+    for x1, y1, x2, y2 in people:
+        w, h = x2 - x1, y2 - y1
+        if rng.random() < helmet_rate:
+            boxes.append((x1 + w // 4, y1, x2 - w // 4, y1 + h // 6))
+            classes.append(0)
+        if rng.random() < vest_rate:
+            boxes.append((x1, y1 + h // 4, x2, y1 + h // 2))
+            classes.append(1)
+    return np.array(boxes, dtype=int).reshape(-1, 4), np.array(classes, dtype=int)
+
+class SyntheticCapture:
+    """Stands in for cv2.VideoCapture: read() returns count noisy frames.
+
+    Like OpenCV, read(image) decodes into image when it has the right shape
+    and allocates a new array otherwise.
+    """
+    def __init__(self, count, width=1920, height=1080, rng=None):
+        rng = rng or np.random.default_rng(3)
+        self.frames = [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(4)]
+        self.count = count
+        self.position = 0
+
+    def read(self, image=None):
+        if self.position >= self.count:
+            return False, image
+        source = self.frames[self.position % len(self.frames)]
+        self.position += 1
+        if image is not None and image.shape == source.shape:
+            np.copyto(image, source)
+            return True, image
+        return True, source.copy()
+
+    def release(self):
+        pass
+
+class SyntheticScene:
+    """People walking across the frame with stable IDs and per-person PPE.
+
+    frame_detections() returns, for one frame, the person boxes (N, 4),
+    their IDs and the PPE boxes and class IDs, as the detector and tracker
+    would report them. ppe is the number of helmet and vest boxes per frame,
+    at most two per person; by default about one person in five skips the
+    helmet or vest.
+    """
+    def __init__(self, people, width=1280, height=720, rng=None, ppe=None):
+        self.rng = rng or np.random.default_rng(4)
+        self.width = width
+        self.height = height
+        self.boxes = make_people(people, width, height, self.rng).astype(np.float64)
+        self.velocity = self.rng.uniform(-4, 4, (people, 2))
+        self.ids = np.arange(1, people + 1)
+        self.helmet = self.rng.random(people) > 0.2
+        self.vest = self.rng.random(people) > 0.2
+        if ppe is not None:
+            if not 0 <= ppe <= 2 * people:
+                raise ValueError(f"ppe must be between 0 and {2 * people} for {people} people")
+            # The same people keep the same items on every frame
+            worn = np.zeros(2 * people, dtype=bool)
+            worn[self.rng.permutation(2 * people)[:ppe]] = True
+            self.helmet, self.vest = worn[0::2], worn[1::2]
+
+    def step(self):
+        self.boxes += np.tile(self.velocity, 2)
+        # Turn around at the frame edges
+        out_x = (self.boxes[:, 0] < 0) | (self.boxes[:, 2] >= self.width)
+        out_y = (self.boxes[:, 1] < 0) | (self.boxes[:, 3] >= self.height)
+        self.velocity[out_x, 0] *= -1
+        self.velocity[out_y, 1] *= -1
+        self.boxes[out_x, 0::2] += self.velocity[out_x, 0:1]
+        self.boxes[out_y, 1::2] += self.velocity[out_y, 1:2]
+
+    def frame_detections(self):
+        people = self.boxes.astype(int)
+        ppe_boxes, ppe_classes = make_ppe(people, helmet_rate=1.0, vest_rate=1.0, rng=self.rng)
+        # make_ppe emits helmet then vest per person; drop the ones this person skips
+        keep = np.stack([self.helmet, self.vest], axis=1).reshape(-1)
+        return people, self.ids.copy(), ppe_boxes[keep], ppe_classes[keep]
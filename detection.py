@@ -1,15 +1,14 @@
-from ultralytics import YOLO
+from threading import Thread, Lock, Event
+import numpy as np
 import cv2
 import yaml
-import torch
-
-# Configure PyTorch for optimal CPU performance
-torch.set_num_threads(1)  # Reduce CPU thrashing
-torch.set_flush_denormal(True)  # Improve float32 performance
-
-# Load models with explicit CPU device
-person_model = YOLO("yolov8m.pt").to('cpu')  # Standard COCO model for person detection
-ppe_model = YOLO("best.pt").to('cpu')        # Custom model for PPE detection
+import time
+from services.motion import MotionGate, BoxPredictor
+from services.backends import resolve_weights
+from services.overlay import LabelSprites, draw_box
+from services.metrics import stage_seconds, inferences_skipped, frames_processed, ppe_checks, ppe_checks_reused
+from services.ppe_state import PPEStateCache
+from services.tiling import merge_detections
 
 # Load class names from YAML (for PPE only)
 with open("data.yaml", "r") as f:
@@ -23,14 +22,8 @@ class_colors = {
     "person": (1, 255, 31)            # Blue
 }
 
-# Detection cache for frame skipping
-detection_cache = {
-    'person_boxes': [],
-    'person_ids': [],
-    'ppe_boxes': None,
-    'frame_count': 0,
-    'last_full_frame': None
-}
+# White labels with a black outline, drawn from cached sprites
+labels = LabelSprites()
 
 def draw_person_boxes(frame, boxes, ids, draw_person):
     person_count = 0
@@ -39,17 +32,10 @@ def draw_person_boxes(frame, boxes, ids, draw_person):
         if draw_person:
             # Draw person bounding box
             color = class_colors.get("person", (255, 255, 255))
-            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+            draw_box(frame, x1, y1, x2, y2, color)
             
             # Draw ID text with background for visibility
-            cv2.putText(
-                frame, f"ID: {track_id}", (x1, y1 - 10),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 3, cv2.LINE_AA
-            )
-            cv2.putText(
-                frame, f"ID: {track_id}", (x1, y1 - 10),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1, cv2.LINE_AA
-            )
+            labels.draw(frame, f"ID: {track_id}", (x1, y1 - 10))
         person_count += 1
     return person_count
 
@@ -72,121 +58,524 @@ def draw_ppe_boxes(frame, boxes, class_ids, draw_helmet, draw_vest):
             
         # Draw PPE bounding box
         color = class_colors.get(class_name, (255, 255, 255))
-        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        draw_box(frame, x1, y1, x2, y2, color)
         
         # Add label for PPE items
-        label = f"{class_name}"
-        cv2.putText(
-            frame, label, (x1, y1 - 10),
-            cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 3, cv2.LINE_AA
-        )
-        cv2.putText(
-            frame, label, (x1, y1 - 10),
-            cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1, cv2.LINE_AA
+        labels.draw(frame, class_name, (x1, y1 - 10))
+
+class _Detections:
+    """Array-backed detections in the shape BYTETracker.update expects"""
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    @property
+    def xywh(self):
+        xywh = self.xyxy.copy()
+        xywh[:, 2:] -= xywh[:, :2]
+        xywh[:, :2] += xywh[:, 2:] / 2
+        return xywh
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __getitem__(self, idx):
+        return _Detections(self.xyxy[idx], self.conf[idx], self.cls[idx])
+
+def _create_tracker(tracker_config="bytetrack.yaml"):
+    """Build a standalone tracker so every stream keeps its own track IDs"""
+    from ultralytics.trackers.track import TRACKER_MAP
+    from ultralytics.utils import IterableSimpleNamespace
+    from ultralytics.utils.checks import check_yaml
+
+    with open(check_yaml(tracker_config), "r") as f:
+        cfg = IterableSimpleNamespace(**yaml.safe_load(f))
+    return TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=30)
+
+def _to_detections(result):
+    """Convert one ultralytics result into plain numpy arrays"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return _Detections(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.float32))
+    return _Detections(
+        boxes.xyxy.cpu().numpy(),
+        boxes.conf.cpu().numpy(),
+        boxes.cls.cpu().numpy()
+    )
+
+class DetectionEngine:
+    """Owns the YOLO models. Loading is deferred until first use or warmup.
+
+    torch and ultralytics are imported inside load(), so importing this module is
+    cheap and the capture/UI can come up while the models load in the background.
+    """
+    def __init__(self, person_weights="yolov8m.pt", ppe_weights="best.pt", backend="torch",
+                 calibration_dir=None):
+        self.person_weights = person_weights
+        self.ppe_weights = ppe_weights
+        self.backend = backend  # See services.backends.BACKENDS
+        self.calibration_dir = calibration_dir  # Frames for INT8 calibration
+        self.person_model = None
+        self.ppe_model = None
+        self.ready = Event()  # Set once models are loaded and warmed up
+        self.error = None
+        self.load_lock = Lock()
+        self.created_at = time.perf_counter()
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.ready_time = None
+
+    def load(self):
+        """Import torch/ultralytics and load both models (no-op if already loaded)"""
+        with self.load_lock:
+            if self.person_model is not None:
+                return
+            start = time.perf_counter()
+            import torch
+            from ultralytics import YOLO
+
+            # Configure PyTorch for optimal CPU performance
+            torch.set_num_threads(1)  # Reduce CPU thrashing
+            torch.set_flush_denormal(True)  # Improve float32 performance
+
+            if self.backend == "torch":
+                # Load models with explicit CPU device
+                person_model = YOLO(self.person_weights).to('cpu')  # Standard COCO model for person detection
+                self.ppe_model = YOLO(self.ppe_weights).to('cpu')   # Custom model for PPE detection
+            else:
+                # Exported once and cached on disk, then run through the CPU runtime
+                person_model = YOLO(resolve_weights(
+                    self.person_weights, self.backend, calibration_dir=self.calibration_dir), task="detect")
+                self.ppe_model = YOLO(resolve_weights(
+                    self.ppe_weights, self.backend, calibration_dir=self.calibration_dir), task="detect")
+            self.person_model = person_model
+            self.load_seconds = time.perf_counter() - start
+
+    def warmup(self):
+        """Load the models and run one dummy inference, then flag the engine ready"""
+        self.load()
+        start = time.perf_counter()
+        dummy_frame = np.zeros((320, 320, 3), dtype=np.uint8)
+        self.detect_batch([dummy_frame])
+        self.warmup_seconds = time.perf_counter() - start
+        self.ready_time = time.perf_counter()
+        self.ready.set()
+        print(
+            f"Models warmed up (load {self.load_seconds:.1f}s, warmup {self.warmup_seconds:.1f}s, "
+            f"ready {self.cold_start_seconds():.1f}s after start)"
         )
 
-def run_detection(frame, draw_person=True, draw_helmet=True, draw_vest=True):
-    global detection_cache
-    # Initialize default return values
-    person_count = 0
-    person_boxes = []
-    person_ids = []
-    ppe_boxes_data = None
-    
-    # Only process every 3rd frame but use cached results for others
-    if detection_cache['frame_count'] % 3 != 0:
-        detection_cache['frame_count'] += 1
-        
-        # Create fresh frame with cached detections
-        output_frame = frame.copy()
-        person_count = draw_person_boxes(output_frame, 
-                                      detection_cache['person_boxes'], 
-                                      detection_cache['person_ids'], 
-                                      draw_person)
-        
-        # Handle PPE drawing with cache
-        if detection_cache['ppe_boxes']:
-            draw_ppe_boxes(output_frame, 
-                         detection_cache['ppe_boxes'][0], 
-                         detection_cache['ppe_boxes'][1], 
-                         draw_helmet, 
-                         draw_vest)
-            ppe_boxes_data = detection_cache['ppe_boxes']
-        
+    def start_warmup(self):
+        """Warm up on a background thread; callers poll is_ready()"""
+        def _warmup_thread():
+            try:
+                self.warmup()
+            except Exception as e:
+                self.error = e
+                print(f"Model loading failed: {str(e)}")
+
+        thread = Thread(target=_warmup_thread, daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self):
+        return self.ready.is_set()
+
+    def cold_start_seconds(self):
+        """Seconds from engine creation until it reported ready (None while loading)"""
+        if self.ready_time is None:
+            return None
+        return self.ready_time - self.created_at
+
+    def detect_people(self, frames, imgsz=320):
+        """Person detections for a batch of frames or tiles (tracking happens per stream)"""
+        import torch
+
+        self.load()
+        with torch.no_grad():
+            person_results = self.person_model.predict(
+                frames,
+                conf=0.4,
+                classes=[0],  # 0 is person class in COCO
+                verbose=False,
+                device="cpu",
+                imgsz=imgsz,
+                half=False
+            )
+        return [_to_detections(r) for r in person_results]
+
+    def detect_ppe(self, images, imgsz=320):
+        """PPE detections for a batch of whole frames or person crops"""
+        import torch
+
+        self.load()
+        with torch.no_grad():
+            ppe_results = self.ppe_model(
+                images,
+                conf=0.4,
+                verbose=False,
+                device="cpu",
+                imgsz=imgsz,
+                half=False
+            )
+        return [_to_detections(r) for r in ppe_results]
+
+    def detect_batch(self, frames):
+        """Run both models once over a list of frames, returns (person_dets, ppe_dets) lists"""
+        return self.detect_people(frames), self.detect_ppe(frames)
+
+class DetectionPipeline:
+    """Detection state for one camera stream: frame cache and tracker.
+
+    ppe_mode selects how PPE is detected:
+      "frame" - the PPE model sees the whole frame (downscaled to 320 px)
+      "crops" - the PPE model sees each tracked person box, padded and cropped
+                from the full-resolution frame, so distant helmets and vests keep
+                their pixels. At most max_crops people are cropped per inference
+                frame (most urgent first, see below).
+
+    Either way the PPE model only runs for people whose PPE state is not yet
+    settled (ppe_state, a services.ppe_state.PPEStateCache): new tracks,
+    uncertain or expired ones and a periodic re-verification sample. In "frame"
+    mode one whole-frame pass checks everyone, so it is skipped when nobody is
+    due. People not checked reuse their last PPE boxes, re-projected onto their
+    current box.
+
+    tiler (a services.tiling.Tiler, None by default) adds full-resolution
+    tiles over the whole frame or chosen regions to both models, for people
+    too small to survive the downscale to 320 px.
+
+    tracker_factory builds the tracker from tracker_config on the first
+    inference frame; the default is an ultralytics BYTETracker/BOTSORT.
+
+    On frames without inference the person boxes are extrapolated by a
+    constant-velocity filter per track (predictor, a services.motion.BoxPredictor)
+    instead of repeating the last tracked boxes, and the PPE boxes follow them.
+    Set predict_boxes to False to draw the cached boxes unchanged.
+    """
+    def __init__(self, name="default", gate=None, tracker_config="bytetrack.yaml",
+                 ppe_mode="frame", max_crops=4, crop_padding=0.15, ppe_state=None, predict_boxes=True,
+                 tracker_factory=None):
+        self.name = name
+        self.gate = gate or MotionGate()  # Decides which frames get inference
+        self.tracker_config = tracker_config
+        self.tracker_factory = tracker_factory or _create_tracker
+        self.ppe_mode = ppe_mode
+        self.max_crops = max_crops
+        self.crop_padding = crop_padding
+        self.tracker = None  # Created on first inference frame
+        self.tiler = None    # Optional services.tiling.Tiler
+        self.ppe_state = ppe_state or PPEStateCache()
+        self.predict_boxes = predict_boxes
+        self.predictor = BoxPredictor()
+        self.cache = {
+            'person_boxes': [],
+            'person_ids': [],
+            'ppe_boxes': None,
+            'frame_count': 0
+        }
+
+    def is_due(self, frame):
+        """Whether this frame needs model inference (call once per frame)"""
+        return self.gate.should_run(frame)
+
+    def reset(self):
+        """Drop cached detections and track IDs (e.g. after a camera reconnect)"""
+        self.tracker = None
+        self.ppe_state.reset()
+        self.predictor.reset()
+        self.gate.reset()
+        self.cache = {
+            'person_boxes': [],
+            'person_ids': [],
+            'ppe_boxes': None,
+            'frame_count': 0
+        }
+
+    def render_cached(self, frame, draw_person=True, draw_helmet=True, draw_vest=True):
+        """Draw the last detections, moved to this frame, on a frame that skipped inference"""
+        self.cache['frame_count'] += 1
+        person_boxes = self.cache['person_boxes']
+        person_ids = self.cache['person_ids']
+        ppe_boxes_data = self.cache['ppe_boxes']
+
+        if self.predict_boxes and person_boxes:
+            height, width = frame.shape[:2]
+            person_boxes = [box for box in self.predictor.predict(
+                person_ids, person_boxes, self.cache['frame_count'], (width, height))]
+            boxes, class_ids = self.ppe_state.project(person_boxes, person_ids)
+            ppe_boxes_data = (boxes.astype(int), class_ids.astype(int)) if len(boxes) else None
+
+        # Draw straight onto this frame. It is a pooled CaptureStage buffer: the
+        # caller owns it until it calls release() after display, so it must not
+        # release it (or let a LatestSlot drop it) before run_batch returns
+        output_frame = frame
+        person_count = draw_person_boxes(output_frame, person_boxes, person_ids, draw_person)
+        if ppe_boxes_data:
+            draw_ppe_boxes(output_frame, ppe_boxes_data[0], ppe_boxes_data[1], draw_helmet, draw_vest)
+
         return (
             output_frame,
             person_count,
-            detection_cache['person_boxes'],
-            detection_cache['person_ids'],
+            person_boxes,
+            person_ids,
             ppe_boxes_data
         )
-    
-    # Actual processing for this frame
-    with torch.no_grad():
-        # Person detection with tracking
-        person_results = person_model.track(
-            frame,
-            persist=True,
-            tracker="bytetrack.yaml",
-            conf=0.4,
-            classes=[0],  # 0 is person class in COCO
-            verbose=False,
-            device="cpu",
-            imgsz=320,
-            half=False
-        )
-        
-        # PPE detection
-        ppe_results = ppe_model(
-            frame,
-            conf=0.4,
-            verbose=False,
-            device="cpu",
-            imgsz=320,
-            half=False
+
+    def track(self, frame, person_dets):
+        """Update this stream's tracker, returns rows of [x1, y1, x2, y2, id, score, cls, idx]"""
+        if self.tracker is None:
+            self.tracker = self.tracker_factory(self.tracker_config)
+        tracks = self.tracker.update(person_dets, frame)
+        return tracks.reshape(-1, 8) if len(tracks) else np.zeros((0, 8), np.float32)
+
+    def ppe_checks(self, tracks):
+        """Rows of tracks whose PPE the model checks this frame (call once per inference frame)"""
+        track_ids = tracks[:, 4].astype(int)
+        self.ppe_state.sync(track_ids)
+        due = self.ppe_state.due(track_ids)
+        if self.ppe_mode == "crops":
+            return due[:self.max_crops]
+        # A whole-frame pass checks everyone at once
+        return list(range(len(tracks))) if due else []
+
+    def select_crops(self, frame, tracks, rows):
+        """Cut the padded boxes of the given tracked people from the frame.
+
+        Returns (crops, origins) where origins holds (row, x0, y0) per crop.
+        """
+        height, width = frame.shape[:2]
+        crops = []
+        origins = []
+        for i in rows:
+            x1, y1, x2, y2 = tracks[i, :4]
+            pad_x = (x2 - x1) * self.crop_padding
+            pad_y = (y2 - y1) * self.crop_padding
+            x0 = int(max(0, x1 - pad_x))
+            y0 = int(max(0, y1 - pad_y))
+            x3 = int(min(width, x2 + pad_x))
+            y3 = int(min(height, y2 + pad_y))
+            if x3 - x0 < 2 or y3 - y0 < 2:
+                continue
+            crops.append(frame[y0:y3, x0:x3])  # View, no copy
+            origins.append((i, x0, y0))
+        return crops, origins
+
+    def merge_crops(self, tracks, origins, crop_dets):
+        """Record the crop detections in the PPE state, returns PPE boxes for every tracked person"""
+        for (i, x0, y0), dets in zip(origins, crop_dets):
+            self.ppe_state.observe(tracks[i:i + 1, 4].astype(int), tracks[i:i + 1, :4],
+                                   dets.xyxy + np.array([x0, y0, x0, y0], np.float32), dets.cls)
+        return self.cached_ppe(tracks)
+
+    def merge_frame(self, tracks, ppe_dets):
+        """Record a whole-frame PPE pass in the PPE state (None when it was skipped)"""
+        if ppe_dets is None:
+            return self.cached_ppe(tracks)
+        self.ppe_state.observe(tracks[:, 4].astype(int), tracks[:, :4], ppe_dets.xyxy, ppe_dets.cls)
+        return ppe_dets
+
+    def cached_ppe(self, tracks):
+        """Everyone's PPE boxes from their last check, moved onto their current boxes"""
+        xyxy, cls = self.ppe_state.project(tracks[:, :4], tracks[:, 4].astype(int))
+        return _Detections(xyxy, np.ones(len(xyxy), np.float32), cls)
+
+    def apply(self, frame, tracks, ppe_dets, draw_person=True, draw_helmet=True, draw_vest=True):
+        """Draw and cache fresh tracks and PPE detections for this frame"""
+        person_count = 0
+        person_boxes = []
+        person_ids = []
+        ppe_boxes_data = None
+
+        # Process person detections
+        if len(tracks):
+            boxes = tracks[:, :4].astype(int)
+            track_ids = tracks[:, 4].astype(int)
+
+            person_boxes = [box for box in boxes]
+            person_ids = [tid for tid in track_ids]
+            person_count = len(person_boxes)
+
+            # Draw person boxes
+            draw_person_boxes(frame, person_boxes, person_ids, draw_person)
+
+        # Process PPE detections
+        if len(ppe_dets):
+            boxes = ppe_dets.xyxy.astype(int)
+            class_ids = ppe_dets.cls.astype(int)
+            ppe_boxes_data = (boxes, class_ids)
+            # Draw PPE boxes
+            draw_ppe_boxes(frame, boxes, class_ids, draw_helmet, draw_vest)
+
+        # Update cache and the motion filters
+        frame_count = self.cache['frame_count'] + 1
+        self.predictor.update(tracks[:, 4], tracks[:, :4], frame_count)
+        self.cache = {
+            'person_boxes': person_boxes,
+            'person_ids': person_ids,
+            'ppe_boxes': ppe_boxes_data,
+            'frame_count': frame_count
+        }
+        # Always return 5 values
+        return (
+            frame,          # Processed frame with drawings
+            person_count,   # Number of people detected
+            person_boxes,   # List of person bounding boxes
+            person_ids,     # List of tracking IDs
+            ppe_boxes_data  # Tuple of (ppe_boxes, ppe_classes) or None
         )
-    
-    # Process person detections
-    if person_results[0].boxes.id is not None:
-        boxes = person_results[0].boxes.xyxy.cpu().numpy().astype(int)
-        track_ids = person_results[0].boxes.id.cpu().numpy().astype(int)
-        
-        person_boxes = [box for box in boxes]
-        person_ids = [tid for tid in track_ids]
-        person_count = len(person_boxes)
-        
-        # Draw person boxes
-        draw_person_boxes(frame, person_boxes, person_ids, draw_person)
-    
-    # Process PPE detections
-    if ppe_results[0].boxes is not None:
-        boxes = ppe_results[0].boxes.xyxy.cpu().numpy().astype(int)
-        class_ids = ppe_results[0].boxes.cls.cpu().numpy().astype(int)
-        ppe_boxes_data = (boxes, class_ids)        
-        # Draw PPE boxes
-        draw_ppe_boxes(frame, boxes, class_ids, draw_helmet, draw_vest)
-    
-    # Update cache
-    detection_cache = {
-        'person_boxes': person_boxes,
-        'person_ids': person_ids,
-        'ppe_boxes': ppe_boxes_data,
-        'frame_count': detection_cache['frame_count'] + 1,
-        'last_full_frame': frame.copy()
-    }   
-    # Always return 5 values
-    return (
-        frame,          # Processed frame with drawings
-        person_count,   # Number of people detected
-        person_boxes,   # List of person bounding boxes
-        person_ids,     # List of tracking IDs
-        ppe_boxes_data  # Tuple of (ppe_boxes, ppe_classes) or None
-    )
-# Warm up models on startup
-def warmup_models():
-    dummy_frame = torch.zeros((320, 320, 3), dtype=torch.uint8).numpy()
-    run_detection(dummy_frame)
-    print("Models warmed up")
-
-# Perform warmup
-warmup_models()
\ No newline at end of file
+
+class InferenceScheduler:
+    """Gathers the frames due from every stream into one batched model call.
+
+    The frame loop calls run_batch() with one request per stream, from a
+    single thread. Until the engine reports ready, frames are passed through
+    undetected.
+
+    With the default crop_imgsz of 160, four person crops cost about the same
+    PPE model input as one 320 px whole frame. Frames without people, or whose
+    people all have a settled PPE state, skip the PPE model entirely.
+    """
+    def __init__(self, engine, crop_imgsz=160):
+        self.engine = engine
+        self.crop_imgsz = crop_imgsz  # PPE input size for person crops
+        self.pipelines = []
+
+    def register(self, pipeline):
+        """Add a stream's pipeline, returns it"""
+        self.pipelines.append(pipeline)
+        return pipeline
+
+    def run_batch(self, requests, checked=False):
+        """Process [(pipeline, frame, draw_person, draw_helmet, draw_vest), ...] in order.
+
+        checked=True means the caller already asked each pipeline's is_due() for
+        this frame (a gate must only be asked once per frame).
+        """
+        frames_processed.inc(len(requests))
+        if not self.engine.is_ready():
+            # Models still loading: show raw frames so the station is not blind
+            inferences_skipped.inc(len(requests))
+            return [(frame, 0, [], [], None) for _, frame, *_ in requests]
+
+        results = [None] * len(requests)
+        due = []
+        start = time.perf_counter()
+        for i, (pipeline, frame, *flags) in enumerate(requests):
+            if checked or pipeline.is_due(frame):
+                due.append(i)
+            else:
+                results[i] = pipeline.render_cached(frame, *flags)
+        if len(due) < len(requests):
+            inferences_skipped.inc(len(requests) - len(due))
+            stage_seconds.observe("drawing", time.perf_counter() - start)
+
+        if due:
+            start = time.perf_counter()
+            person_dets = self._detect(self.engine.detect_people, requests, due)
+            now = time.perf_counter()
+            stage_seconds.observe("person_inference", now - start)
+
+            # Track first, so the PPE model only runs for people whose PPE state needs it
+            tracks = {}
+            checks = {}
+            for i, dets in zip(due, person_dets):
+                pipeline, frame = requests[i][:2]
+                tracks[i] = pipeline.track(frame, dets)
+                checks[i] = pipeline.ppe_checks(tracks[i])
+                ppe_checks.inc(len(checks[i]))
+                ppe_checks_reused.inc(len(tracks[i]) - len(checks[i]))
+            start, now = now, time.perf_counter()
+            stage_seconds.observe("tracking", now - start)
+
+            # Whole-frame PPE for the "frame" mode streams with someone due, one batch
+            ppe_dets = {}
+            frame_mode = [i for i in due if requests[i][0].ppe_mode != "crops"]
+            ppe_indices = [i for i in frame_mode if checks[i]]
+            fresh = {}
+            if ppe_indices:
+                fresh = dict(zip(ppe_indices, self._detect(self.engine.detect_ppe, requests, ppe_indices)))
+            for i in frame_mode:
+                ppe_dets[i] = requests[i][0].merge_frame(tracks[i], fresh.get(i))
+            if ppe_indices:
+                start, now = now, time.perf_counter()
+                stage_seconds.observe("ppe_inference", now - start)
+
+            # Person crops from every "crops" mode stream, one batch
+            crop_mode = [i for i in due if requests[i][0].ppe_mode == "crops"]
+            crops = []
+            owners = []
+            for i in crop_mode:
+                pipeline, frame = requests[i][:2]
+                stream_crops, origins = pipeline.select_crops(frame, tracks[i], checks[i])
+                crops.extend(stream_crops)
+                owners.append((i, origins))
+            crop_dets = self.engine.detect_ppe(crops, imgsz=self.crop_imgsz) if crops else []
+            offset = 0
+            for i, origins in owners:
+                ppe_dets[i] = requests[i][0].merge_crops(
+                    tracks[i], origins, crop_dets[offset:offset + len(origins)])
+                offset += len(origins)
+            if crop_mode:
+                start, now = now, time.perf_counter()
+                stage_seconds.observe("ppe_inference", now - start)
+
+            for i in due:
+                pipeline, frame, *flags = requests[i]
+                results[i] = pipeline.apply(frame, tracks[i], ppe_dets[i], *flags)
+            stage_seconds.observe("drawing", time.perf_counter() - now)
+        return results
+
+    def _detect(self, detect, requests, indices):
+        """detect() over the frames of these requests and their tiles, one model call per input size.
+
+        Returns one _Detections per request, tile detections merged in frame coordinates.
+        """
+        inputs = {}  # {imgsz: [(request index, tile or None, image)]}
+        for i in indices:
+            pipeline, frame = requests[i][:2]
+            tiler = pipeline.tiler
+            tiles = tiler.tiles(frame.shape[1], frame.shape[0]) if tiler is not None else []
+            # No tiles (no stations drawn yet, regions outside the frame): whole frame only
+            if tiler is None or tiler.full_frame or not tiles:
+                inputs.setdefault(320, []).append((i, None, frame))
+            for tile in tiles:
+                x0, y0, x1, y1, size = tile
+                inputs.setdefault(size, []).append((i, tile, frame[y0:y1, x0:x1]))  # View, no copy
+
+        parts = {i: [] for i in indices}
+        for imgsz, items in inputs.items():
+            for (i, tile, _), dets in zip(items, detect([image for *_, image in items], imgsz=imgsz)):
+                if tile is not None and len(dets):
+                    frame = requests[i][1]
+                    x0, y0 = tile[:2]
+                    dets = dets[~requests[i][0].tiler.cut_off(dets.xyxy, tile, frame.shape[1], frame.shape[0])]
+                    dets = _Detections(dets.xyxy + np.array([x0, y0, x0, y0], np.float32), dets.conf, dets.cls)
+                parts[i].append(dets)
+
+        results = []
+        for i in indices:
+            if len(parts[i]) == 1:
+                results.append(parts[i][0])
+                continue
+            xyxy = np.concatenate([dets.xyxy for dets in parts[i]]).reshape(-1, 4)
+            conf = np.concatenate([dets.conf for dets in parts[i]])
+            cls = np.concatenate([dets.cls for dets in parts[i]])
+            tiler = requests[i][0].tiler
+            keep = merge_detections(xyxy, conf, cls, tiler.iou)
+            results.append(_Detections(xyxy[keep], conf[keep], cls[keep]))
+        return results
+
+# Shared engine (models load on first use or start_warmup()) and the
+# default stream of single-camera callers
+engine = DetectionEngine()
+default_pipeline = DetectionPipeline()
+scheduler = InferenceScheduler(engine)
+scheduler.register(default_pipeline)
+
+def use_engine(new_engine):
+    """Replace the shared engine (e.g. with a services.workers.InferencePool) before warmup"""
+    global engine
+    engine = new_engine
+    scheduler.engine = new_engine
@@ -4,14 +4,28 @@ from tkinter import ttk
 from PIL import Image, ImageTk
 import detection
 from services.tracking import PeopleTracker
+from services.events import EventStore
 from services.email import EmailService
 from services.stations import StationManager
 from services.config import ConfigManager
 from services.violation import PPEViolationDetector
+from services.recorder import ClipRecorder
+from services.motion import MotionGate
+from services.tiling import Tiler
+from services.workers import InferencePool
+from services.live_view import LiveView
+from processing import FrameProcessor
+from history_view import HistoryModel, VirtualTable
+from services.capture import CaptureStage
+from services.buffers import LatestSlot
+from services.metrics import StageLatency, MetricsServer, registry, stage_seconds, register_pipeline_counters
+from services.profiling import ProfileControl
 from threading import Thread, Lock
-from queue import Queue
 import time
 
+startup_time = time.perf_counter()  # For cold start measurement
+first_frame_shown = False
+
 cap = cv2.VideoCapture(1) 
 
 # Set desired resolution (optional)
@@ -51,49 +65,79 @@ last_detection_result = None
 last_person_count = 0
 last_people_boxes = []
 last_person_ids = []
-TARGET_FPS = 15
-FRAME_SKIP = 3  # Must match detection.py's skip value
-MAX_QUEUE_SIZE = 2  # Number of frames to buffer
-frame_queue = Queue(maxsize=2)  # Small buffer to prevent memory buildup
+TARGET_FPS = 30  # Display polling rate, frames are only converted when new
+LATENCY_REPORT_INTERVAL = 10  # Seconds between latency reports
+HISTORY_REFRESH_MS = 1000  # Live history table refresh from the tracker's change feed
 processing_lock = Lock()
 last_processed_frame = None
 processor_running = True
 
-# Tracking history variables
-tracker = PeopleTracker()
-
 # Drawing variables
 station_manager = StationManager()
-rectangle_start = None
 
 from services.config import ConfigManager
 config = ConfigManager()
 settings = config.load()
 
+# Tracking history variables (events are also kept on disk for shift reports)
+event_store = EventStore(settings["events_db"]) if settings["events_db"] else None
+tracker = PeopleTracker(event_store=event_store)
+
 # Initialize UI variables
 people_detect = tk.BooleanVar(value=settings["people"])
 helmets_detect = tk.BooleanVar(value=settings["helmets"])
 vests_detect = tk.BooleanVar(value=settings["vests"])
+
+# Inference backend (exported models are cached in models/), optionally in worker processes
+if settings["inference_workers"]:
+    detection.use_engine(InferencePool(settings["inference_workers"]))
+detection.engine.backend = settings["inference_backend"]
+detection.engine.calibration_dir = settings["calibration_frames"]
+
+# PPE inference mode for the camera stream
+detection.default_pipeline.ppe_mode = settings["ppe_mode"]
+detection.default_pipeline.max_crops = settings["max_crops"]
+detection.default_pipeline.predict_boxes = settings["predict_boxes"]
+if settings["tiling"]:
+    detection.default_pipeline.tiler = Tiler(
+        regions=settings["tile_regions"],
+        tile_size=settings["tile_size"],
+        stride=settings["tile_stride"],
+        full_frame=settings["tile_full_frame"],
+        stations=station_manager
+    )
+detection.default_pipeline.gate = MotionGate(
+    min_interval=settings["min_inference_interval"],
+    max_interval=settings["max_inference_interval"],
+    threshold=settings["motion_threshold"]
+)
 critical_var = tk.BooleanVar(value=False)
 
 
 # Function definitions
 
 def save_settings():
+    # The processing thread reads the published snapshot, never the Tk variables
     config.save({
         "people": people_detect.get(),
         "helmets": helmets_detect.get(),
         "vests": vests_detect.get(),
     })
-    print("Settings saved.")
 
 def update_station_display():
     station_display.config(state="normal")
     station_display.delete(1.0, tk.END)
-    if station_manager.rectangles:
-        station_display.insert(tk.END, f"{len(station_manager.rectangles)} stations active")
+    if station_manager.polygons:
+        station_display.insert(tk.END, f"{len(station_manager.polygons)} stations active")
     else:
         station_display.insert(tk.END, "Draw stations to begin tracking")
+    if station_selection_enabled.get():
+        # Stations used to be two-click rectangles; say how polygons are finished
+        corners = len(station_manager.pending_points)
+        station_display.insert(tk.END, "\n\nLeft-click the station corners, then right-click to finish "
+                                       "(2 corners make a rectangle).")
+        if corners:
+            station_display.insert(tk.END, f"\n{corners} corner(s) placed")
     station_display.config(state="disabled")
 
 def toggle_station_selection():
@@ -114,127 +158,170 @@ def record_click(event):
     if not station_selection_enabled.get():
         return
     
-    if station_manager.rectangle_start is None:  # Use the manager's variable
-        station_manager.rectangle_start = (event.x, event.y)
-    else:
-        rectangle_end = (event.x, event.y)
-        station_manager.add_station(station_manager.rectangle_start, rectangle_end)
-        station_manager.rectangle_start = None  # Reset
+    # Left clicks add polygon corners, a right click closes the polygon
+    # (two corners make a rectangle)
+    station_manager.add_point((event.x, event.y))
+    update_station_display()
+
+def finish_station(event):
+    if not station_selection_enabled.get():
+        return
+
+    station_manager.finish_polygon()
+    update_station_display()
 
 def show_history_window():
     history_window = tk.Toplevel(root)
     history_window.title("Tracking History")
     history_window.geometry("800x600")
+
+    # Filters: live tracks in memory, or stored events by time range/station/track
+    filter_frame = tk.Frame(history_window)
+    filter_frame.pack(fill="x", padx=5, pady=5)
+
+    source_var = tk.StringVar(value="Live")
+    ttk.Combobox(filter_frame, textvariable=source_var, values=("Live", "Stored"),
+                 state="readonly" if event_store else "disabled", width=8).pack(side="left", padx=2)
+    tk.Label(filter_frame, text="Last minutes:", font=font_style).pack(side="left", padx=2)
+    minutes_var = tk.StringVar(value="480")
+    tk.Entry(filter_frame, textvariable=minutes_var, width=6).pack(side="left", padx=2)
+    tk.Label(filter_frame, text="Station:", font=font_style).pack(side="left", padx=2)
+    station_var = tk.StringVar(value="All")
+    ttk.Combobox(filter_frame, textvariable=station_var, values=["All"] + station_manager.station_names,
+                 state="readonly", width=12).pack(side="left", padx=2)
+    tk.Label(filter_frame, text="Track ID:", font=font_style).pack(side="left", padx=2)
+    track_var = tk.StringVar(value="")
+    tk.Entry(filter_frame, textvariable=track_var, width=6).pack(side="left", padx=2)
     
-    # Create table
+    # Only the rows in view exist in the table; live rows follow the tracker's change feed
     columns = ("ID", "Total Time", "Current Station", "Time in Station")
-    history_table = ttk.Treeview(history_window, columns=columns, show="headings")
-    
-    for col in columns:
-        history_table.heading(col, text=col)
-        history_table.column(col, width=150, anchor="center")
-    
+    history_table = VirtualTable(history_window, columns)
     history_table.pack(fill="both", expand=True)
-    
-    # Add scrollbar
-    scrollbar = ttk.Scrollbar(history_window, orient="vertical", command=history_table.yview)
-    scrollbar.pack(side="right", fill="y")
-    history_table.configure(yscrollcommand=scrollbar.set)
-    
+    live_rows = HistoryModel()
+    showing = {"live": True}
+
     # Refresh button
     def refresh_table():
-        history_table.delete(*history_table.get_children())
-        for row in tracker.get_history_table_data():
-            history_table.insert("", "end", values=row)
-    
+        station = None if station_var.get() == "All" else station_var.get()
+        track_id = int(track_var.get()) if track_var.get().strip().isdigit() else None
+        showing["live"] = source_var.get() != "Stored" or not event_store
+        if not showing["live"]:
+            # Completed visits from the event store, via the indexed columns
+            minutes = float(minutes_var.get()) if minutes_var.get().strip() else 0
+            rows = [
+                (f"{time.strftime('%m-%d %H:%M', time.localtime(run_id))} #{tid}" if run_id else tid,
+                 visits, name, f"{seconds:.1f}s")
+                for _, run_id, tid, name, visits, seconds in event_store.dwell_report(
+                    start=time.time() - minutes * 60 if minutes > 0 else None,
+                    station=station,
+                    track_id=track_id
+                )
+            ]
+            history_table.headings(("Run / ID", "Visits", "Station", "Time in Station"))
+            history_table.show(len(rows), rows.__getitem__)
+        else:
+            live_rows.set_filters(station, track_id)
+            live_rows.update(tracker)
+            history_table.headings(columns)
+            history_table.show(len(live_rows), live_rows.row)
+
+    def auto_refresh():
+        if not history_window.winfo_exists():
+            return
+        if showing["live"]:
+            live_rows.update(tracker)
+            history_table.show(len(live_rows), live_rows.row)  # Visible rows only, unchanged ones skipped
+        showing["after_id"] = history_window.after(HISTORY_REFRESH_MS, auto_refresh)
+
+    def stop_refresh(event):
+        # <Destroy> also fires for every child widget; only the window itself ends the refresh
+        if event.widget is history_window and showing.get("after_id"):
+            history_window.after_cancel(showing.pop("after_id"))
+    history_window.bind("<Destroy>", stop_refresh)
+
     refresh_btn = tk.Button(history_window, text="Refresh", command=refresh_table)
     refresh_btn.pack(pady=10)
-    
+
     # Initial data load
     refresh_table()
+    showing["after_id"] = history_window.after(HISTORY_REFRESH_MS, auto_refresh)
     
 def video_processing_thread():
-    global processor_running, last_processed_frame, last_people_boxes
+    """Inference stage: takes the newest captured frame, publishes the annotated result"""
+    global processor_running, last_processed_frame
     
     while processor_running:
         try:
-            ret, frame = cap.read()
-            if not ret:
+            packet = capture_stage.slot.get(timeout=0.5)
+            if packet is None:
                 continue
-                
-            frame = cv2.resize(frame, (video_width, video_height))
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Get detection results - now properly handles all 5 return values
+
+            inference_start = time.perf_counter()
+            settings = config.snapshot
+
+            # Detection, tracking, violation checks and station overlay
             try:
-                processed_frame, person_count, people_boxes, person_ids, ppe_data = detection.run_detection(
-                    frame,
-                    people_detect.get(),
-                    helmets_detect.get(),
-                    vests_detect.get()
-                )
+                processed_frame, people_boxes, person_ids = frame_processor.process(packet['frame'], settings)
             except ValueError as e:
                 print(f"Detection returned wrong number of values: {e}")
                 continue
 
-                
-            # Update tracking and violation detection
-            last_people_boxes = [(int((x1 + x2) // 2), int((y1 + y2) // 2)) 
-                               for (x1, y1, x2, y2) in people_boxes]
-            
-            tracker.update(
-                last_people_boxes,
-                person_ids,
-                [(start, end) for start, end in station_manager.rectangles],
-                station_manager.station_names
-            )
-            
-            # Check for PPE violations if detection is enabled
-            if people_detect.get() and (helmets_detect.get() or vests_detect.get()):
-                ppe_boxes = ppe_data[0] if ppe_data else None
-                ppe_classes = ppe_data[1] if ppe_data else None
-                
-                violation_detector.update(
-                    people_boxes,
-                    person_ids,
-                    ppe_boxes,
-                    ppe_classes,
-                    helmets_detect.get(),
-                    vests_detect.get()
-                )
-                
-                # Add visual indicators
-                processed_frame = violation_detector.draw_violation_indicators(
-                    processed_frame,
-                    people_boxes,
-                    person_ids
-                )
-            
-            # Add stations to the frame
-            processed_frame = station_manager.draw_stations(processed_frame)
-            
-            # Update global variables
-            last_people_boxes = people_boxes
-                        
-            if frame_queue.qsize() < 2:
-                frame_queue.put(processed_frame)
-                
-            time.sleep(0.01)
+            if recorder:
+                recorder.add_frame(processed_frame)
+            if live_view:
+                live_view.publish(processed_frame, people=len(people_boxes),
+                                  stations=frame_processor.station_summary())
+
+            packet['frame'] = processed_frame
+            packet['people_boxes'] = people_boxes
+            packet['station_text'] = frame_processor.station_text
+            packet['inference_start'] = inference_start
+            packet['inference_end'] = time.perf_counter()
+            render_slot.put(packet)
             
         except Exception as e:
             print(f"Processing error: {str(e)}")
             continue
             
 def update_frame():
+    global first_frame_shown, last_people_boxes, last_latency_report
     try:
-        if not frame_queue.empty():
-            frame = frame_queue.get_nowait()
+        packet = render_slot.get_nowait()
+        if packet is not None:
+            frame = packet['frame']
+            last_people_boxes = packet['people_boxes']
+
+            if not first_frame_shown:
+                first_frame_shown = True
+                print(f"First frame displayed {time.perf_counter() - startup_time:.1f}s after start")
+
+            # Raw frames are shown until the models are ready, or for good if they failed
+            if detection.engine.is_ready():
+                root.title("SafeScan")
+            elif detection.engine.error is not None:
+                root.title("SafeScan (models failed to load, no detection)")
+            else:
+                root.title("SafeScan (loading models...)")
             
             # Update video display
             img = Image.fromarray(frame)
             imgtk = ImageTk.PhotoImage(image=img)
             video_label.imgtk = imgtk
             video_label.config(image=imgtk)
+            capture_stage.release(frame)  # Tk holds its own copy now
+
+            # Per-stage latency, from frame capture until it is on screen
+            displayed_at = time.perf_counter()
+            stage_latency.add("capture", (packet['ready_at'] - packet['captured_at']) * 1000)
+            stage_latency.add("queue", (packet['inference_start'] - packet['ready_at']) * 1000)
+            stage_latency.add("inference", (packet['inference_end'] - packet['inference_start']) * 1000)
+            stage_latency.add("display", (displayed_at - packet['inference_end']) * 1000)
+            stage_seconds.observe("display", displayed_at - packet['inference_end'])
+            stage_latency.add("glass-to-glass", (displayed_at - packet['captured_at']) * 1000)
+            if displayed_at - last_latency_report >= LATENCY_REPORT_INTERVAL:
+                last_latency_report = displayed_at
+                print(f"Latency: {stage_latency.summary()} | dropped frames: "
+                      f"capture {capture_stage.slot.dropped}, render {render_slot.dropped}")
             people_count_label.config(text=f"👥 People Count: {len(last_people_boxes)}")
             
             # Critical operation logic
@@ -261,14 +348,8 @@ def update_frame():
                     bg="blue"
                 )
             
-            # Update station counts - Fixed version
-            if hasattr(station_manager, 'rectangles') and station_manager.rectangles:
-                # Convert bounding boxes to center points
-                people_positions = [(int((x1 + x2) // 2), int((y1 + y2) // 2)) 
-                                  for (x1, y1, x2, y2) in last_people_boxes]
-                counts_text = station_manager.get_station_counts_text(people_positions)
-            else:
-                counts_text = "Draw stations to begin tracking"
+            # Station counts come from the same lookup the tracker used
+            counts_text = packet['station_text']
                 
             station_display.config(state="normal")
             station_display.delete(1.0, tk.END)
@@ -420,18 +501,77 @@ email_service = EmailService(
     status_label=email_status_label  # Pass the label for automatic updates
 )
 
+# Evidence clips around violations, recorded from the annotated (RGB) frames
+recorder = ClipRecorder(
+    out_dir=settings["clips_dir"],
+    pre_seconds=settings["clip_pre_seconds"],
+    post_seconds=settings["clip_post_seconds"],
+    fps=settings["clip_fps"],
+    memory_mb=settings["clip_memory_mb"],
+    rgb=True
+) if settings["clips_dir"] else None
+
+# Local MJPEG/WebSocket view of the annotated video (frames here are RGB)
+live_view = LiveView(
+    port=settings["live_view_port"],
+    fps=settings["live_view_fps"],
+    quality=settings["live_view_quality"],
+    rgb=True
+) if settings["live_view_port"] else None
+
+def on_violation(track_id, ppe_type):
+    if recorder:
+        recorder.trigger(track_id, ppe_type)
+    if live_view:
+        live_view.violation(track_id, ppe_type)
+
 # PPE Violation Detector
-violation_detector = PPEViolationDetector(email_service)
+violation_detector = PPEViolationDetector(
+    email_service,
+    helmet_region=settings["helmet_region"],
+    vest_region=settings["vest_region"],
+    on_violation=on_violation
+)
+
+# Shared per-frame processing (same code path as the headless runner)
+frame_processor = FrameProcessor(tracker, station_manager, violation_detector)
+
+# Load and warm up models in the background while raw frames are displayed
+detection.engine.start_warmup()
+
+# Pipeline stages: capture -> inference -> render, joined by latest-wins slots
+capture_stage = CaptureStage(cap, size=(video_width, video_height), rgb=True)
+render_slot = LatestSlot(on_drop=lambda packet: capture_stage.release(packet['frame']))
+stage_latency = StageLatency(["capture", "queue", "inference", "display", "glass-to-glass"])
+last_latency_report = time.perf_counter()
+capture_stage.start()
 
 processor_running = True
 processing_thread = Thread(target=video_processing_thread, daemon=True)
 processing_thread.start()
 
+# On-demand profiling of the processing thread (signal or POST to the metrics endpoint)
+profiler = ProfileControl(processing_thread, out_dir=settings["profiles_dir"], watches={
+    "tracker.history": lambda: len(tracker.history),
+    "violation_timers": lambda: len(violation_detector.violation_timers),
+    "sent_alerts": lambda: len(violation_detector.sent_alerts)
+})
+profiler.install_signals()
+
+# Local Prometheus endpoint with the per-stage histograms and counters
+register_pipeline_counters([capture_stage.slot, render_slot], email_service)
+metrics_server = MetricsServer(registry, port=settings["metrics_port"], routes=profiler.http_routes())
+if settings["metrics_port"]:
+    metrics_server.start()
+if live_view:
+    live_view.start()
+
 def cleanup():
     global processor_running
     
-    # Signal thread to stop
+    # Signal threads to stop
     processor_running = False
+    capture_stage.stop()
     
     # Wait for thread to finish (with timeout)
     if processing_thread.is_alive():
@@ -439,12 +579,31 @@ def cleanup():
     
     # Release video capture
     cap.release()
+
+    # Close open station visits and flush queued events to disk
+    tracker.close()
+    if event_store:
+        event_store.close()
+
+    # Hand the last clips to the encoder and free the frame ring
+    if recorder:
+        recorder.close()
+
+    # Give queued alerts a moment to go out
+    email_service.close(timeout=1.0)
+    metrics_server.stop()
+    if live_view:
+        live_view.stop()
+    config.close()  # Write a checkbox change still waiting to be saved
+    if settings["inference_workers"]:
+        detection.engine.close()
     
     # Destroy window
     root.destroy()
 
 # Event binding
 video_label.bind("<Button-1>", record_click)
+video_label.bind("<Button-3>", finish_station)
 
 root.protocol("WM_DELETE_WINDOW", cleanup)
 
@@ -0,0 +1,143 @@
+"""Tracking history table for the desktop window.
+
+HistoryModel keeps the live history rows keyed by track ID, sorted, and is
+updated from PeopleTracker.changes_since(), so a refresh only touches the
+tracks that changed. VirtualTable shows a list of rows in a ttk.Treeview
+that only ever holds the rows that fit on screen: scrolling moves a window
+over the list and rewrites those few items, so neither the strings nor the
+Treeview items of off-screen rows exist.
+"""
+import bisect
+import time
+import tkinter as tk
+from tkinter import ttk
+
+class HistoryModel:
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.rows = {}   # {track_id: (total_time, station, station_time, station_since)}
+        self.order = []  # Sorted track IDs passing the filters
+        self.version = 0
+        self.station = None  # Filters, None = all
+        self.track_id = None
+
+    def set_filters(self, station=None, track_id=None):
+        self.station = station
+        self.track_id = track_id
+        self.order = sorted(track_id for track_id, row in self.rows.items() if self._matches(track_id, row))
+
+    def _matches(self, track_id, row):
+        return (self.station is None or (row[1] or "None") == self.station) and \
+               (self.track_id is None or track_id == self.track_id)
+
+    def update(self, tracker):
+        """Apply the tracker's changes since the last call, returns True if any rows changed"""
+        self.version, rows, removed, reset = tracker.changes_since(self.version)
+        if reset:
+            self.rows.clear()
+            self.order = []
+        for track_id in removed:
+            if self.rows.pop(track_id, None) is not None:
+                self._hide(track_id)
+        for track_id, *row in rows:
+            self.rows[track_id] = row
+            if self._matches(track_id, row):
+                index = bisect.bisect_left(self.order, track_id)
+                if index == len(self.order) or self.order[index] != track_id:
+                    self.order.insert(index, track_id)
+            else:
+                self._hide(track_id)
+        return bool(reset or rows or removed)
+
+    def _hide(self, track_id):
+        index = bisect.bisect_left(self.order, track_id)
+        if index < len(self.order) and self.order[index] == track_id:
+            del self.order[index]
+
+    def __len__(self):
+        return len(self.order)
+
+    def row(self, index):
+        """Formatted values of the row at this position, station time counted up to now"""
+        track_id = self.order[index]
+        total_time, station, station_time, station_since = self.rows[track_id]
+        if station_since is not None:
+            station_time += self.clock() - station_since
+        return track_id, f"{total_time:.1f}s", station or "None", f"{station_time:.1f}s"
+
+class VirtualTable:
+    """Treeview with one item per visible row, filled from row(index) for the rows in view"""
+    def __init__(self, parent, columns, row_height=20):
+        self.columns = columns
+        self.row_height = row_height
+        self.frame = tk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=columns, show="headings", selectmode="none")
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=150, anchor="center")
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+        ttk.Style(parent).configure("Treeview", rowheight=row_height)
+
+        self.count = 0
+        self.row = None
+        self.offset = 0       # Index of the first row in view
+        self.items = []       # Treeview items, one per visible row
+        self.shown = []       # Values each item shows, to skip unchanged rows
+        self.tree.bind("<Configure>", self._resize)
+        for widget in (self.tree, self.scrollbar):
+            widget.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1))
+            widget.bind("<Button-4>", lambda event: self.scroll(-1))
+            widget.bind("<Button-5>", lambda event: self.scroll(1))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def headings(self, headings):
+        for col, heading in zip(self.columns, headings):
+            self.tree.heading(col, text=heading)
+
+    def show(self, count, row):
+        """Display count rows, row(index) giving the values of each"""
+        self.count = count
+        self.row = row
+        self.render()
+
+    def render(self):
+        self.offset = max(0, min(self.offset, self.count - len(self.items)))
+        for slot, item in enumerate(self.items):
+            index = self.offset + slot
+            values = self.row(index) if index < self.count else ()
+            if values != self.shown[slot]:
+                self.tree.item(item, values=values)
+                self.shown[slot] = values
+        if self.count > len(self.items):
+            self.scrollbar.set(self.offset / self.count, (self.offset + len(self.items)) / self.count)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll(self, rows):
+        self.offset += rows
+        self.render()
+
+    def yview(self, action, value, unit=None):
+        if action == "moveto":
+            self.offset = int(round(float(value) * self.count))
+        elif unit == "pages":
+            self.offset += int(value) * max(1, len(self.items) - 1)
+        else:
+            self.offset += int(value)
+        self.render()
+
+    def _resize(self, event):
+        # Header row plus as many full rows as fit
+        visible = max(1, (event.height - self.row_height - 4) // self.row_height)
+        while len(self.items) < visible:
+            self.items.append(self.tree.insert("", "end", values=()))
+            self.shown.append(())
+        while len(self.items) > visible:
+            self.tree.delete(self.items.pop())
+            self.shown.pop()
+        if self.row is not None:
+            self.render()
@@ -0,0 +1,97 @@
+import time
+import detection
+from services.metrics import stage_seconds
+
+class FrameProcessor:
+    """Per-stream processing step shared by the desktop window and the headless runner.
+
+    Runs detection for one frame, then feeds the results to the people tracker,
+    the PPE violation detector (from the pipeline's per-track PPE state) and
+    the station overlay.
+    """
+    def __init__(self, tracker, station_manager, violation_detector, pipeline=None, scheduler=None):
+        self.tracker = tracker
+        self.station_manager = station_manager
+        self.violation_detector = violation_detector
+        self.pipeline = pipeline or detection.default_pipeline
+        self.scheduler = scheduler or detection.scheduler
+        # The PPE state decides what counts as worn with the detector's region rules
+        self.pipeline.ppe_state.regions = violation_detector.ppe_regions
+        self.station_counts = []  # People per station in the last frame
+        self.station_text = station_manager.format_counts([])
+
+    def station_summary(self):
+        """{station name: people} for the last frame"""
+        return dict(zip(self.station_manager.station_names, self.station_counts))
+
+    def detection_request(self, frame, settings, annotate=True):
+        """Build the scheduler request for this stream"""
+        return (
+            self.pipeline,
+            frame,
+            settings["people"] and annotate,
+            settings["helmets"] and annotate,
+            settings["vests"] and annotate
+        )
+
+    def process(self, frame, settings, annotate=True):
+        """Detect and post-process a single frame"""
+        result = self.scheduler.run_batch([self.detection_request(frame, settings, annotate)])[0]
+        return self.handle_detection(result, settings, annotate)
+
+    def handle_detection(self, result, settings, annotate=True):
+        """Update tracking and violations from a run_batch result.
+
+        Returns (processed_frame, people_boxes, person_ids).
+        """
+        processed_frame, person_count, people_boxes, person_ids, ppe_data = result
+
+        # Update tracking and violation detection
+        people_positions = [(int((x1 + x2) // 2), int((y1 + y2) // 2))
+                            for (x1, y1, x2, y2) in people_boxes]
+
+        # One station lookup per frame, shared by tracking and station counts
+        start = time.perf_counter()
+        height, width = processed_frame.shape[:2]
+        self.station_manager.set_frame_size(width, height)
+        station_indices = self.station_manager.lookup(people_positions)
+        self.station_counts, self.station_text = self.station_manager.count_people_in_stations(
+            station_indices=station_indices)
+        now = time.perf_counter()
+        stage_seconds.observe("stations", now - start)
+
+        self.tracker.update(person_ids, self.station_manager.names_for(station_indices))
+        start, now = now, time.perf_counter()
+        stage_seconds.observe("tracking", now - start)
+
+        # Check for PPE violations if detection is enabled
+        if settings["people"] and (settings["helmets"] or settings["vests"]):
+            ppe_boxes = ppe_data[0] if ppe_data else []
+            ppe_classes = ppe_data[1] if ppe_data else []
+
+            self.violation_detector.update(
+                people_boxes,
+                person_ids,
+                ppe_boxes,
+                ppe_classes,
+                settings["helmets"],
+                settings["vests"],
+                missing_since=self.pipeline.ppe_state.status(person_ids)
+            )
+            start, now = now, time.perf_counter()
+            stage_seconds.observe("violation", now - start)
+
+            # Add visual indicators
+            if annotate:
+                processed_frame = self.violation_detector.draw_violation_indicators(
+                    processed_frame,
+                    people_boxes,
+                    person_ids
+                )
+
+        # Add stations to the frame
+        if annotate:
+            processed_frame = self.station_manager.draw_stations(processed_frame)
+            stage_seconds.observe("drawing", time.perf_counter() - now)
+
+        return processed_frame, people_boxes, person_ids
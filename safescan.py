@@ -0,0 +1,430 @@
+"""Headless SafeScan runner.
+
+Usage:
+    python -m safescan run --source 0
+    python -m safescan run --source rtsp://camera-1/stream --source rtsp://camera-2/stream
+    python -m safescan report --hours 8 --station "Station 1"
+    python -m safescan compare-backends --frames samples/ --backend onnx --backend onnx-int8
+
+Runs the same detection, tracking, station and PPE violation logic as the
+desktop window, without importing tkinter or PIL.
+"""
+import argparse
+import os
+import time
+import cv2
+import threading
+from threading import Condition
+import detection
+from processing import FrameProcessor
+from services.tracking import PeopleTracker
+from services.stations import StationManager
+from services.config import ConfigManager
+from services.violation import PPEViolationDetector
+from services.email import EmailService
+from services.metrics import (RollingStats, RateMeter, StageLatency, MetricsServer, registry,
+                              register_pipeline_counters)
+from services.backends import BACKENDS, load_frames, match_detections
+from services.capture import CaptureStage
+from services.events import EventStore
+from services.motion import MotionGate
+from services.tiling import Tiler
+from services.recorder import ClipRecorder
+from services.workers import InferencePool
+from services.live_view import LiveView
+from services.profiling import ProfileControl
+
+def parse_source(source):
+    """Camera indices are given as integers, everything else is a path or URL"""
+    return int(source) if source.isdigit() else source
+
+def open_capture(source, width, height):
+    cap = cv2.VideoCapture(parse_source(source))
+    if width and height:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    if not cap.isOpened():
+        raise SystemExit(f"Error: Could not open source {source}")
+    return cap
+
+def create_email_service():
+    """Email alerts are enabled only when SMTP credentials are in the environment.
+
+    SAFESCAN_SMTP_HOST/PORT/SSL point at another server, e.g. a local
+    debugging server (SSL=0) which needs no password.
+    """
+    sender = os.environ.get("SAFESCAN_SMTP_SENDER")
+    receiver = os.environ.get("SAFESCAN_SMTP_RECEIVER")
+    password = os.environ.get("SAFESCAN_SMTP_PASSWORD")
+    host = os.environ.get("SAFESCAN_SMTP_HOST", "smtp.gmail.com")
+    port = int(os.environ.get("SAFESCAN_SMTP_PORT", "465"))
+    use_ssl = os.environ.get("SAFESCAN_SMTP_SSL", "1") != "0"
+    if sender and receiver and (password or host != "smtp.gmail.com"):
+        return EmailService(sender=sender, receiver=receiver, password=password,
+                            smtp_host=host, smtp_port=port, use_ssl=use_ssl)
+    return None
+
+def create_tiler(settings, station_manager):
+    return Tiler(
+        regions=settings["tile_regions"],
+        tile_size=settings["tile_size"],
+        stride=settings["tile_stride"],
+        full_frame=settings["tile_full_frame"],
+        stations=station_manager
+    )
+
+# Settings that take effect when settings.json changes while running; the
+# detection toggles are read from the snapshot on every frame
+LIVE_SETTINGS = {"people", "helmets", "vests", "ppe_mode", "max_crops", "predict_boxes",
+                 "min_inference_interval", "max_inference_interval", "motion_threshold"}
+
+def _option(value, setting):
+    """Command line value if given (0 included), else the setting"""
+    return setting if value is None else value
+
+def apply_settings(streams, settings, args):
+    """Per-stream detection settings, command line options taking precedence.
+
+    Runs on the frame loop thread between batches, never while run_batch uses the pipelines.
+    """
+    for stream in streams:
+        pipeline = stream['processor'].pipeline
+        pipeline.ppe_mode = _option(args.ppe_mode, settings["ppe_mode"])
+        pipeline.max_crops = _option(args.max_crops, settings["max_crops"])
+        pipeline.predict_boxes = settings["predict_boxes"]
+        gate = pipeline.gate
+        gate.min_interval = max(1, _option(args.min_interval, settings["min_inference_interval"]))
+        gate.max_interval = max(gate.min_interval, _option(args.max_interval, settings["max_inference_interval"]))
+        gate.threshold = settings["motion_threshold"]
+
+def violation_handler(name, recorder, live_view):
+    """on_violation callback: record a clip and tell the live view clients"""
+    def on_violation(track_id, ppe_type):
+        if recorder:
+            recorder.trigger(track_id, ppe_type)
+        if live_view:
+            live_view.violation(track_id, ppe_type, stream=name)
+    return on_violation
+
+def run(args):
+    start_time = time.perf_counter()
+    config = ConfigManager()
+    settings = config.load()
+    workers = settings["inference_workers"] if args.workers is None else args.workers
+    if workers:
+        detection.use_engine(InferencePool(workers))
+    detection.engine.backend = args.backend or settings["inference_backend"]
+    detection.engine.calibration_dir = settings["calibration_frames"]
+
+    # Capture comes up immediately; models load in the background
+    detection.engine.start_warmup()
+
+    email_service = create_email_service()
+    events_path = settings["events_db"] if args.events is None else args.events
+    event_store = EventStore(events_path) if events_path else None
+    clips_dir = settings["clips_dir"] if args.clips is None else args.clips
+    live_view_port = settings["live_view_port"] if args.live_view_port is None else args.live_view_port
+    live_view = LiveView(port=live_view_port, fps=settings["live_view_fps"],
+                         quality=settings["live_view_quality"]) if live_view_port else None
+
+    streams = []
+    frames_ready = Condition()  # Shared by every capture slot
+    for index, source in enumerate(args.source):
+        station_manager = StationManager()
+        station_manager.load()
+        pipeline = detection.default_pipeline if index == 0 else \
+            detection.scheduler.register(detection.DetectionPipeline(name=f"stream-{index}"))
+        pipeline.tiler = create_tiler(settings, station_manager) if args.tiling or settings["tiling"] else None
+        pipeline.gate = MotionGate()
+        live = isinstance(parse_source(source), int) or "://" in source
+        capture = CaptureStage(open_capture(source, args.width, args.height), live=live, condition=frames_ready)
+        recorder = ClipRecorder(
+            out_dir=os.path.join(clips_dir, f"stream-{index}"),
+            pre_seconds=settings["clip_pre_seconds"],
+            post_seconds=settings["clip_post_seconds"],
+            fps=settings["clip_fps"],
+            memory_mb=settings["clip_memory_mb"]
+        ) if clips_dir else None
+        streams.append({
+            'source': source,
+            'capture': capture,
+            'processor': FrameProcessor(
+                PeopleTracker(event_store=event_store, stream=source),
+                station_manager,
+                PPEViolationDetector(
+                    email_service,
+                    helmet_region=settings["helmet_region"],
+                    vest_region=settings["vest_region"],
+                    on_violation=violation_handler(f"stream-{index}", recorder, live_view)
+                ),
+                pipeline=pipeline
+            ),
+            'name': f"stream-{index}",
+            'recorder': recorder,
+            'people': 0
+        })
+
+    all_streams = list(streams)  # streams loses sources as they end
+    apply_settings(all_streams, settings, args)
+
+    # The watcher thread only notes what changed; the frame loop applies it
+    # between batches, so a pipeline never changes mode inside run_batch
+    reloaded = {"changed": set()}
+    reload_lock = threading.Lock()
+
+    def settings_changed(snapshot, changed):
+        with reload_lock:
+            reloaded["changed"].update(changed)
+    config.watch(settings_changed)
+    register_pipeline_counters([s['capture'].slot for s in all_streams], email_service)
+    metrics_port = settings["metrics_port"] if args.metrics_port is None else args.metrics_port
+    # The frame loop runs on this (main) thread; profile it on demand
+    watches = {}
+    for stream in all_streams:
+        watches[f"{stream['source']} tracker.history"] = stream['processor'].tracker.history.__len__
+        watches[f"{stream['source']} violation_timers"] = \
+            stream['processor'].violation_detector.violation_timers.__len__
+    profiler = ProfileControl(threading.main_thread(), out_dir=settings["profiles_dir"], watches=watches)
+    profiler.install_signals()
+    metrics_server = MetricsServer(registry, port=metrics_port, routes=profiler.http_routes())
+    if metrics_port:
+        metrics_server.start()
+    if live_view:
+        live_view.start()
+    fps = RateMeter()
+    stage_latency = StageLatency(["capture", "queue", "inference", "total"])
+    frames_done = 0
+    engine_was_ready = False
+    last_report = time.perf_counter()
+    print(f"Running on {len(streams)} source(s), press Ctrl+C to stop")
+    for stream in streams:
+        stream['capture'].start()
+
+    try:
+        while streams:
+            if detection.engine.error is not None and not args.without_detection:
+                raise SystemExit(f"Models failed to load: {str(detection.engine.error)} "
+                                 f"(pass --without-detection to keep running without them)")
+            with reload_lock:
+                changed, reloaded["changed"] = reloaded["changed"], set()
+            if changed:
+                apply_settings(all_streams, config.snapshot, args)
+                print(f"Settings reloaded: {', '.join(sorted(changed))}")
+                restart = sorted(key for key in changed if key not in LIVE_SETTINGS)
+                if restart:
+                    print(f"Restart to apply: {', '.join(restart)}")
+
+            # Wait until at least one source has a new frame
+            with frames_ready:
+                frames_ready.wait_for(
+                    lambda: any(s['capture'].slot.has_item() or s['capture'].slot.closed for s in streams),
+                    timeout=0.5
+                )
+
+            # Take the newest frame from every stream, then detect them as one batch
+            packets = []
+            for stream in list(streams):
+                packet = stream['capture'].slot.get_nowait()
+                if packet is not None:
+                    packets.append((stream, packet))
+                elif stream['capture'].ended:
+                    print(f"Source {stream['source']} ended")
+                    stream['capture'].stop()
+                    stream['capture'].cap.release()
+                    streams.remove(stream)
+
+            if not packets:
+                continue
+
+            if frames_done == 0:
+                print(f"First frame captured {time.perf_counter() - start_time:.1f}s after start")
+            if not engine_was_ready and detection.engine.is_ready():
+                engine_was_ready = True
+                print(f"Detection ready {time.perf_counter() - start_time:.1f}s after start")
+
+            inference_start = time.perf_counter()
+            settings = config.snapshot  # Same settings for the whole batch, even if the file changes
+            requests = [stream['processor'].detection_request(packet['frame'], settings, args.annotate)
+                        for stream, packet in packets]
+            results = detection.scheduler.run_batch(requests)
+            for (stream, _), result in zip(packets, results):
+                frame, people_boxes, _ = stream['processor'].handle_detection(result, settings, args.annotate)
+                stream['people'] = len(people_boxes)
+                if live_view:
+                    live_view.publish(frame, stream=stream['name'], people=len(people_boxes),
+                                      stations=stream['processor'].station_summary())
+                if stream['recorder']:
+                    stream['recorder'].add_frame(frame)
+                stream['capture'].release(frame)
+            inference_end = time.perf_counter()
+
+            for _, packet in packets:
+                stage_latency.add("capture", (packet['ready_at'] - packet['captured_at']) * 1000)
+                stage_latency.add("queue", (inference_start - packet['ready_at']) * 1000)
+                stage_latency.add("inference", (inference_end - inference_start) * 1000)
+                stage_latency.add("total", (inference_end - packet['captured_at']) * 1000)
+
+            fps.tick(len(packets))
+            frames_done += len(packets)
+
+            now = time.perf_counter()
+            if now - last_report >= args.stats_interval:
+                people = ", ".join(f"{s['source']}={s['people']}" for s in streams)
+                dropped = sum(s['capture'].slot.dropped for s in streams)
+                print(f"FPS: {fps.rate():.1f} | {stage_latency.summary()} | dropped: {dropped} | people: {people}")
+                fps.reset()
+                last_report = now
+
+            if args.max_frames and frames_done >= args.max_frames:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for stream in all_streams:
+            stream['capture'].stop()
+            stream['capture'].cap.release()
+            stream['processor'].tracker.close()
+            if stream['recorder']:
+                stream['recorder'].close()
+        if event_store:
+            event_store.close()
+        if email_service:
+            email_service.close()
+        metrics_server.stop()
+        if live_view:
+            live_view.stop()
+        config.close()
+        if workers:
+            detection.engine.close()
+
+def report(args):
+    """Dwell time per track and station from the event store"""
+    path = args.events or ConfigManager().load()["events_db"]
+    if not path:
+        raise SystemExit("No event store configured: pass --events or set events_db in settings.json")
+    if not os.path.exists(path):
+        raise SystemExit(f"No event store found at {path}")
+    store = EventStore(path)
+    try:
+        end = time.time()
+        rows = store.dwell_report(
+            start=end - args.hours * 3600 if args.hours else None,
+            end=end,
+            station=args.station,
+            track_id=args.track,
+            stream=args.stream
+        )
+    finally:
+        store.close()
+
+    print(f"{'stream':<20} {'run started':<19} {'track':>6} {'station':<15} {'visits':>6} {'dwell':>10}")
+    for stream, run_id, track_id, station, visits, seconds in rows:
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run_id)) if run_id else "-"
+        print(f"{stream:<20} {started:<19} {track_id:>6} {station:<15} {visits:>6} {seconds:>9.1f}s")
+    print(f"{len(rows)} track/station pairs")
+
+def compare_backends(args):
+    """Speed and accuracy of each backend against the torch models on local frames"""
+    frames = load_frames(args.frames, args.limit)
+    if not frames:
+        raise SystemExit(f"No .jpg/.png frames found in {args.frames}")
+    calibration_dir = args.calibration or ConfigManager().load()["calibration_frames"]
+
+    reference = None
+    print(f"{'backend':<10} {'ms/frame p50':>12} {'p99':>8} {'person P/R':>12} {'ppe P/R':>12} {'mean IoU':>9}")
+    for backend in ["torch"] + [b for b in args.backend if b != "torch"]:
+        engine = detection.DetectionEngine(backend=backend, calibration_dir=calibration_dir)
+        engine.warmup()
+
+        timings = RollingStats(len(frames))
+        outputs = []
+        for frame in frames:
+            start = time.perf_counter()
+            person = engine.detect_people([frame])[0]
+            ppe = engine.detect_ppe([frame])[0]
+            timings.add((time.perf_counter() - start) * 1000)
+            outputs.append((person, ppe))
+
+        if reference is None:
+            reference = outputs
+        scores = []
+        ious = []
+        for kind in range(2):
+            matched = expected = found = 0
+            for ref, out in zip(reference, outputs):
+                m, r, c, iou = match_detections(ref[kind], out[kind])
+                matched += m
+                expected += r
+                found += c
+                if m:
+                    ious.append(iou)
+            precision = matched / found if found else 1.0
+            recall = matched / expected if expected else 1.0
+            scores.append(f"{precision:.2f}/{recall:.2f}")
+        mean_iou = sum(ious) / len(ious) if ious else 0.0
+        print(f"{backend:<10} {timings.percentile(50):>12.1f} {timings.percentile(99):>8.1f} "
+              f"{scores[0]:>12} {scores[1]:>12} {mean_iou:>9.3f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="safescan", description="SafeScan PPE and station monitoring")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run detection without the desktop window")
+    run_parser.add_argument("--source", action="append", required=True,
+                            help="Camera index, video file or stream URL (repeat for several cameras)")
+    run_parser.add_argument("--width", type=int, default=1280)
+    run_parser.add_argument("--height", type=int, default=720)
+    run_parser.add_argument("--stats-interval", type=float, default=5.0,
+                            help="Seconds between FPS/latency reports")
+    run_parser.add_argument("--max-frames", type=int, default=0,
+                            help="Stop after this many frames (0 = run until interrupted)")
+    run_parser.add_argument("--annotate", action="store_true",
+                            help="Draw boxes and stations on frames (off by default when headless)")
+    run_parser.add_argument("--ppe-mode", choices=["frame", "crops"],
+                            help="Run PPE detection on the whole frame or on tracked person crops")
+    run_parser.add_argument("--max-crops", type=int,
+                            help="Maximum person crops per inference frame in crops mode")
+    run_parser.add_argument("--tiling", action="store_true",
+                            help="Add full-resolution tiles for distant workers (regions from settings.json)")
+    run_parser.add_argument("--min-interval", type=int,
+                            help="Minimum frames between inferences while there is motion")
+    run_parser.add_argument("--max-interval", type=int,
+                            help="Maximum frames between inferences on a static scene")
+    run_parser.add_argument("--without-detection", action="store_true",
+                            help="Keep running (capture, clips, live view) if the models fail to load")
+    run_parser.add_argument("--backend", choices=BACKENDS,
+                            help="Inference backend (exported models are cached in models/)")
+    run_parser.add_argument("--workers", type=int,
+                            help="Model worker processes (default from settings.json, 0 = in this process)")
+    run_parser.add_argument("--events",
+                            help="SQLite event store path, e.g. safescan_events.db (default from settings.json: off)")
+    run_parser.add_argument("--clips",
+                            help="Violation clip folder, e.g. clips (default from settings.json: off)")
+    run_parser.add_argument("--metrics-port", type=int,
+                            help="Prometheus metrics port on 127.0.0.1, e.g. 9108 (default from settings.json: off)")
+    run_parser.add_argument("--live-view-port", type=int,
+                            help="MJPEG/WebSocket live view port on 127.0.0.1, e.g. 8091 (default from settings.json: off)")
+    run_parser.set_defaults(func=run)
+
+    report_parser = commands.add_parser("report", help="Dwell time report from the event store")
+    report_parser.add_argument("--events", help="SQLite event store path (default from settings.json)")
+    report_parser.add_argument("--hours", type=float, default=8, help="Time range ending now (0 = all)")
+    report_parser.add_argument("--station", help="Only this station")
+    report_parser.add_argument("--track", type=int, help="Only this track ID")
+    report_parser.add_argument("--stream", help="Only this source")
+    report_parser.set_defaults(func=report)
+
+    compare_parser = commands.add_parser("compare-backends",
+                                         help="Compare backend speed and accuracy against torch")
+    compare_parser.add_argument("--frames", required=True, help="Folder of .jpg/.png test frames")
+    compare_parser.add_argument("--backend", action="append", choices=BACKENDS,
+                                default=[], help="Backend to compare (repeatable)")
+    compare_parser.add_argument("--calibration", help="Calibration frame folder for onnx-int8")
+    compare_parser.add_argument("--limit", type=int, default=100, help="Maximum frames to use")
+    compare_parser.set_defaults(func=compare_backends)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
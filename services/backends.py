@@ -0,0 +1,162 @@
+"""CPU inference backends for the YOLO models.
+
+"torch"     - the .pt weights through PyTorch (default)
+"onnx"      - exported once to ONNX, run through ONNX Runtime
+"onnx-int8" - the ONNX export quantized to INT8 with static calibration
+              on a local folder of frames
+"openvino"  - exported once to OpenVINO IR
+
+Exported files are cached next to the weights in models/ and rebuilt only
+when the .pt file is newer than the export. ultralytics loads every format
+through the same YOLO() API, so boxes, class IDs and the tracker inputs
+built from them have the same shape whatever the backend.
+"""
+import os
+import glob
+import shutil
+import cv2
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "onnx-int8", "openvino")
+MODELS_DIR = "models"
+
+def resolve_weights(weights, backend="torch", imgsz=320, calibration_dir=None, models_dir=MODELS_DIR):
+    """Return the path YOLO() should load for this backend, exporting if needed"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+    if backend == "torch":
+        return weights
+
+    name = os.path.splitext(os.path.basename(weights))[0]
+    os.makedirs(models_dir, exist_ok=True)
+
+    if backend == "openvino":
+        target = os.path.join(models_dir, f"{name}-{imgsz}_openvino_model")
+        if _is_stale(target, weights):
+            exported = _export(weights, "openvino", imgsz)
+            _replace(exported, target)
+        return target
+
+    onnx_path = os.path.join(models_dir, f"{name}-{imgsz}.onnx")
+    if _is_stale(onnx_path, weights):
+        exported = _export(weights, "onnx", imgsz)
+        _replace(exported, onnx_path)
+    if backend == "onnx":
+        return onnx_path
+
+    int8_path = os.path.join(models_dir, f"{name}-{imgsz}-int8.onnx")
+    if _is_stale(int8_path, onnx_path):
+        quantize_int8(onnx_path, int8_path, calibration_dir, imgsz)
+    return int8_path
+
+def _is_stale(target, source):
+    return not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source)
+
+def _replace(source, target):
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    elif os.path.exists(target):
+        os.remove(target)
+    shutil.move(source, target)
+
+def _export(weights, export_format, imgsz):
+    """Export with ultralytics; dynamic axes keep batching and crop sizes working"""
+    from ultralytics import YOLO
+
+    print(f"Exporting {weights} to {export_format} (one time)...")
+    return YOLO(weights).export(format=export_format, imgsz=imgsz, dynamic=True, half=False, device="cpu")
+
+def letterbox(frame, imgsz):
+    """Same preprocessing as ultralytics: resize keeping aspect, pad to a square"""
+    height, width = frame.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top = (imgsz - new_h) // 2
+    left = (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    return canvas
+
+def load_frames(folder, limit=None):
+    """Read .jpg/.png frames from a folder in name order"""
+    paths = sorted(
+        path for pattern in ("*.jpg", "*.jpeg", "*.png")
+        for path in glob.glob(os.path.join(folder, pattern))
+    )
+    if limit:
+        paths = paths[:limit]
+    frames = [cv2.imread(path) for path in paths]
+    return [frame for frame in frames if frame is not None]
+
+class FrameCalibrationReader:
+    """Feeds letterboxed local frames to ONNX Runtime static quantization"""
+    def __init__(self, input_name, frames, imgsz):
+        self.input_name = input_name
+        self.frames = iter(frames)
+        self.imgsz = imgsz
+
+    def get_next(self):
+        frame = next(self.frames, None)
+        if frame is None:
+            return None
+        image = letterbox(frame, self.imgsz)[:, :, ::-1]  # BGR to RGB like ultralytics
+        tensor = np.ascontiguousarray(image.transpose(2, 0, 1), dtype=np.float32)[None] / 255.0
+        return {self.input_name: tensor}
+
+    def rewind(self):
+        pass
+
+def quantize_int8(onnx_path, output_path, calibration_dir, imgsz=320, max_frames=200):
+    """Static INT8 quantization calibrated on frames from the site's own cameras"""
+    import onnxruntime
+    from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+
+    if not calibration_dir or not os.path.isdir(calibration_dir):
+        raise ValueError("INT8 backend needs a calibration folder of frames (calibration_frames setting)")
+    frames = load_frames(calibration_dir, max_frames)
+    if not frames:
+        raise ValueError(f"No .jpg/.png frames found in {calibration_dir}")
+
+    input_name = onnxruntime.InferenceSession(
+        onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    reader = FrameCalibrationReader(input_name, frames, imgsz)
+
+    print(f"Quantizing {onnx_path} to INT8 with {len(frames)} calibration frames...")
+    quantize_static(
+        onnx_path,
+        output_path,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True
+    )
+    return output_path
+
+def box_iou(boxes1, boxes2):
+    """Pairwise IoU matrix between two (N, 4) xyxy arrays"""
+    if not len(boxes1) or not len(boxes2):
+        return np.zeros((len(boxes1), len(boxes2)), np.float32)
+    top_left = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    bottom_right = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area1 = np.prod(boxes1[:, 2:] - boxes1[:, :2], axis=1)
+    area2 = np.prod(boxes2[:, 2:] - boxes2[:, :2], axis=1)
+    return inter / np.maximum(area1[:, None] + area2[None, :] - inter, 1e-9)
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """Greedy same-class matching, returns (matched, reference count, candidate count, mean IoU)"""
+    ious = box_iou(reference.xyxy, candidate.xyxy)
+    if ious.size:
+        ious[reference.cls[:, None] != candidate.cls[None, :]] = 0
+    matched = []
+    for i in np.argsort(-reference.conf):
+        if not ious.shape[1]:
+            break
+        j = int(np.argmax(ious[i]))
+        if ious[i, j] >= iou_threshold:
+            matched.append(ious[i, j])
+            ious[:, j] = 0  # Each candidate box matches once
+    mean_iou = float(np.mean(matched)) if matched else 0.0
+    return len(matched), len(reference), len(candidate), mean_iou
@@ -0,0 +1,57 @@
+from threading import Condition
+
+class LatestSlot:
+    """Single-item hand-off between pipeline stages where the newest item wins.
+
+    put() never blocks by default: an item that was not picked up yet is
+    replaced and counted as dropped, so a slow consumer always gets the most
+    recent frame instead of a stale backlog. Several slots can share one
+    Condition so a consumer can wait on all of them at once. on_drop is
+    called with every replaced item, e.g. to recycle its frame buffer.
+    """
+    def __init__(self, condition=None, on_drop=None):
+        self.condition = condition or Condition()
+        self.on_drop = on_drop
+        self.item = None
+        self.closed = False
+        self.dropped = 0  # Items replaced before anyone read them
+
+    def put(self, item, block=False):
+        """Publish an item; with block=True wait for the previous one to be taken"""
+        with self.condition:
+            if block:
+                while self.item is not None and not self.closed:
+                    self.condition.wait()
+            elif self.item is not None:
+                self.dropped += 1
+                if self.on_drop is not None:
+                    self.on_drop(self.item)
+            self.item = item
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        """Wait for an item and take it; returns None on timeout or when closed and empty"""
+        with self.condition:
+            if self.item is None and not self.closed:
+                self.condition.wait_for(lambda: self.item is not None or self.closed, timeout)
+            return self._take()
+
+    def get_nowait(self):
+        with self.condition:
+            return self._take()
+
+    def has_item(self):
+        return self.item is not None
+
+    def close(self):
+        """Wake up waiting consumers and producers; get() returns None once empty"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def _take(self):
+        item = self.item
+        if item is not None:
+            self.item = None
+            self.condition.notify_all()  # Wakes a producer blocked in put(block=True)
+        return item
@@ -0,0 +1,106 @@
+import time
+from collections import deque
+from threading import Thread
+import cv2
+import numpy as np
+from services.buffers import LatestSlot
+from services.metrics import stage_seconds
+
+class CaptureStage:
+    """Reads frames from a cv2.VideoCapture on its own thread.
+
+    Each frame is published to a LatestSlot as a packet dict:
+        {'frame': array, 'captured_at': perf_counter time, 'ready_at': ...}
+    Live sources never wait for the consumer (old frames are dropped). File
+    sources are read at the consumer's pace so no frames are skipped.
+
+    Frames are decoded, resized and converted into preallocated buffers from
+    a small pool. The consumer owns a packet's frame (detection draws on it
+    in place) until it hands it back with release(); frames dropped by the
+    slot go back automatically. A frame that is never released is simply
+    replaced by a new buffer, so the pool can run short but never block.
+    """
+    def __init__(self, cap, size=None, rgb=False, live=True, condition=None, pool_size=4):
+        self.cap = cap
+        self.size = size  # (width, height) to resize to, None to keep the source size
+        self.rgb = rgb    # Convert BGR to RGB for display toolkits
+        self.live = live
+        self.pool_size = pool_size
+        self.free = deque()  # Output buffers ready for reuse
+        self.allocated = 0   # Output buffers created, stays at the pool size in steady state
+        self.slot = LatestSlot(condition, on_drop=lambda packet: self.release(packet['frame']))
+        self.running = False
+        self.ended = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.slot.close()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+
+    def release(self, frame):
+        """Give a packet's frame back for reuse once nothing reads it any more"""
+        if frame is not None and len(self.free) < self.pool_size:
+            self.free.append(frame)
+
+    def _acquire(self, shape):
+        while self.free:
+            buffer = self.free.popleft()
+            if buffer.shape == shape:
+                return buffer
+        self.allocated += 1
+        return np.empty(shape, dtype=np.uint8)
+
+    def _loop(self):
+        raw = None      # Decoder output, only used when the frame is resized or converted
+        resized = None  # Resize output when a color conversion follows
+        direct = False  # Decode straight into the output buffer
+        shape = None
+        raw_shape = None
+
+        while self.running:
+            read_start = time.perf_counter()
+            ret, frame = self.cap.read(self._acquire(shape) if direct else raw)
+            captured_at = time.perf_counter()
+            if not ret:
+                if direct and frame is not None:
+                    self.release(frame)
+                if not self.live:
+                    self.ended = True
+                    self.slot.close()
+                    return
+                time.sleep(0.01)
+                continue
+
+            if shape is None or frame.shape != raw_shape:
+                # First frame (or the source changed size): work out the buffers once
+                raw_shape = frame.shape
+                resize = self.size is not None and (frame.shape[1], frame.shape[0]) != self.size
+                width, height = self.size if resize else (frame.shape[1], frame.shape[0])
+                shape = (height, width, 3)
+                direct = not resize and not self.rgb
+                resized = np.empty(shape, dtype=np.uint8) if resize and self.rgb else None
+
+            stage_seconds.observe("capture", captured_at - read_start)
+            if not direct:
+                raw = frame
+                if resized is not None:
+                    cv2.resize(raw, self.size, dst=resized)
+                    frame = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=self._acquire(shape))
+                elif self.rgb:
+                    frame = cv2.cvtColor(raw, cv2.COLOR_BGR2RGB, dst=self._acquire(shape))
+                else:
+                    frame = cv2.resize(raw, self.size, dst=self._acquire(shape))
+                stage_seconds.observe("preprocess", time.perf_counter() - captured_at)
+
+            self.slot.put({
+                'frame': frame,
+                'captured_at': captured_at,
+                'ready_at': time.perf_counter()
+            }, block=not self.live)
@@ -1,28 +1,162 @@
 import json
 import os
-from typing import Dict, Any
+import tempfile
+import threading
+from types import MappingProxyType
+from typing import Dict, Any, Mapping
 
 class ConfigManager:
-    def __init__(self, config_file="settings.json"):
+    """Settings file access and the current settings snapshot.
+
+    snapshot is a read-only mapping that is replaced as a whole, never changed
+    in place, so a worker thread can read it at any time without a lock or a
+    call into the UI toolkit; publish() swaps in a new one. save() publishes
+    the changes and writes the file save_delay seconds later, once for a burst
+    of changes, through a temporary file renamed over the old one. watch()
+    reloads the file when someone else changes it.
+    """
+    def __init__(self, config_file="settings.json", save_delay=1.0):
         self.config_file = config_file
+        self.save_delay = save_delay
         self.defaults = {
             "people": True,
             "helmets": True,
-            "vests": True
+            "vests": True,
+            "ppe_mode": "frame",  # "frame" or "crops" (PPE model on person crops)
+            "max_crops": 4,       # Person crops per inference frame in "crops" mode
+            "predict_boxes": True,  # Move boxes with each person's velocity between inferences
+            "tiling": False,      # Full-resolution tiles for small, distant people (more CPU)
+            "tile_size": 320,     # Tile side in pixels, also the model input size
+            "tile_stride": 240,   # Step between tiles, tile_size - tile_stride is the overlap
+            # [{"station": "Station 1"} or {"rect": [x1, y1, x2, y2]}, each with optional
+            # "tile_size" and "stride"]; empty tiles the whole frame
+            "tile_regions": [],
+            "tile_full_frame": True,  # Keep the downscaled whole-frame pass for people near the camera
+            "min_inference_interval": 2,   # Frames between inferences while there is motion
+            "max_inference_interval": 10,  # Frames between inferences on a static scene
+            "motion_threshold": 0.005,     # Changed fraction of the frame that counts as motion
+            "inference_backend": "torch",  # torch, onnx, onnx-int8 or openvino
+            "calibration_frames": "calibration",  # Folder of frames for onnx-int8 calibration
+            "inference_workers": 0,        # Model worker processes (0 = run the models in this process)
+            "helmet_region": [0.0, 0.34],  # Band of the person box height a helmet must be in
+            "vest_region": None,           # None = any overlap with the person box
+            "events_db": "",               # SQLite tracking event store path ("" = off)
+            "clips_dir": "",               # Violation clips folder ("" = no recording)
+            "clip_pre_seconds": 5,         # Seconds recorded before and after a violation
+            "clip_post_seconds": 5,
+            "clip_fps": 8,
+            "clip_memory_mb": 256,         # Frame ring budget
+            "metrics_port": 0,             # Prometheus endpoint on 127.0.0.1, e.g. 9108 (0 = off)
+            "live_view_port": 0,           # MJPEG/WebSocket live view on 127.0.0.1, e.g. 8091 (0 = off)
+            "live_view_fps": 10,           # Frames per second per stream sent to live view viewers
+            "live_view_quality": 80,       # JPEG quality of the live view
+            "profiles_dir": "profiles"     # Reports from on-demand CPU and memory profiling
         }
+        self.snapshot = MappingProxyType(dict(self.defaults))
+        self.lock = threading.Lock()
+        self.save_timer = None
+        self.file_stamp = None  # (mtime_ns, size) of the file as last loaded or written
+        self.watcher = None
+        self.stop_watching = threading.Event()
 
     def load(self) -> Dict[str, Any]:
-        """Load settings from JSON file or return defaults"""
-        if os.path.exists(self.config_file):
-            with open(self.config_file, "r") as f:
-                return {**self.defaults, **json.load(f)}
-        return self.defaults
-
-    def save(self, settings: Dict[str, Any]):
-        """Save settings to JSON file (only non-default values)"""
-        with open(self.config_file, "w") as f:
-            json.dump(
-                {k: v for k, v in settings.items() if v != self.defaults.get(k)},
-                f,
-                indent=2
-            )
\ No newline at end of file
+        """Load settings from JSON file or return defaults, and publish them"""
+        settings = dict(self.defaults)
+        # Under the lock, so a save cannot replace the file between the stamp and the read
+        with self.lock:
+            stamp = self._stamp()
+            if stamp is not None:
+                with open(self.config_file, "r") as f:
+                    loaded = json.load(f)
+                if not isinstance(loaded, dict):
+                    raise ValueError(f"expected a JSON object, got {type(loaded).__name__}")
+                settings.update(loaded)
+                self.file_stamp = stamp
+            self.snapshot = MappingProxyType(settings)
+        return dict(settings)
+
+    def publish(self, changes: Mapping[str, Any]) -> Mapping[str, Any]:
+        """Replace the snapshot with one including these changes"""
+        with self.lock:
+            self.snapshot = MappingProxyType({**self.snapshot, **changes})
+            return self.snapshot
+
+    def save(self, settings: Mapping[str, Any]):
+        """Publish settings and write them to the JSON file after save_delay (only non-default values)"""
+        self.publish(settings)
+        with self.lock:
+            if self.save_timer is None:
+                self.save_timer = threading.Timer(self.save_delay, self.flush)
+                self.save_timer.daemon = True
+                self.save_timer.start()
+
+    def flush(self):
+        """Write a pending save now"""
+        with self.lock:
+            if self.save_timer is None:
+                return
+            self.save_timer.cancel()
+            self.save_timer = None
+            settings = self.snapshot
+            folder = os.path.dirname(os.path.abspath(self.config_file))
+            # Readers see the old file or the new one, never a half-written one
+            fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".settings-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(
+                        {k: v for k, v in settings.items() if v != self.defaults.get(k)},
+                        f,
+                        indent=2
+                    )
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.config_file)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            self.file_stamp = self._stamp()  # Our own write is not a change to reload
+
+    def watch(self, on_change, interval=1.0):
+        """Reload the file when it changes on disk and call on_change(snapshot, changed_keys)"""
+        def _watch():
+            while not self.stop_watching.wait(interval):
+                with self.lock:
+                    # flush() updates file_stamp under the lock, so our own writes never show up here
+                    stamp = self._stamp()
+                    if stamp is None or stamp == self.file_stamp:
+                        continue
+                    old = self.snapshot
+                try:
+                    self.load()
+                except Exception as e:
+                    with self.lock:
+                        self.file_stamp = stamp  # Wait for the next change
+                    print(f"Settings not reloaded, {self.config_file} is invalid: {str(e)}")
+                    continue
+                changed = sorted(k for k in self.snapshot if self.snapshot[k] != old.get(k))
+                if changed:
+                    try:
+                        on_change(self.snapshot, changed)
+                    except Exception as e:
+                        # A bad value must not stop later reloads
+                        print(f"Error applying reloaded settings {changed}: {str(e)}")
+
+        self.stop_watching.clear()
+        self.watcher = threading.Thread(target=_watch, daemon=True)
+        self.watcher.start()
+        return self.watcher
+
+    def close(self):
+        """Stop watching and write any pending save"""
+        self.stop_watching.set()
+        if self.watcher is not None:
+            self.watcher.join(timeout=1.0)
+            self.watcher = None
+        self.flush()
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
\ No newline at end of file
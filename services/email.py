@@ -1,44 +1,184 @@
 import threading
 import smtplib
 import ssl
+import time
+from queue import Queue, Empty, Full
 from email.message import EmailMessage
-from tkinter import Label
 
 class EmailService:
-    def __init__(self, sender, receiver, password, status_label=None):
+    """Queued alert delivery over one reused SMTP connection.
+
+    send_alert() only enqueues. A single worker thread owns the connection,
+    logs in once and reconnects with exponential backoff when it drops. The
+    first alert after a quiet period goes out at once; alerts arriving within
+    digest_window seconds of the last email are collected and sent together
+    as one digest message.
+
+    The server is pluggable: pass smtp_host/smtp_port/use_ssl, or an
+    smtp_factory returning an smtplib.SMTP-like object (e.g. for a local
+    debugging server in tests). Without a password no login is attempted.
+
+    Permanent failures (rejected login, refused recipients, 5xx replies) drop
+    the message at once; other failures drop it after max_attempts tries.
+    The worker only sets status; the status label, if any, is updated from
+    the Tk thread that created the service, which polls it.
+    """
+    def __init__(self, sender, receiver, password, status_label=None, smtp_host="smtp.gmail.com",
+                 smtp_port=465, use_ssl=True, smtp_factory=None, digest_window=60.0, max_queue=100,
+                 max_backoff=300.0, max_attempts=5):
         self.sender = sender
         self.receiver = receiver
         self.password = password
         self.status_label = status_label
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.use_ssl = use_ssl
+        self.smtp_factory = smtp_factory or self._default_factory
+        self.digest_window = digest_window
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.queue = Queue(maxsize=max_queue)
+        self.queued = 0   # Alerts accepted by send_alert()
+        self.dropped = 0  # Alerts rejected because the queue was full
+        self.sent = 0     # Emails delivered (a digest counts once)
+        self.failed = 0   # Emails given up on
+        self.status = ("", "black", 0.0)  # (message, color, set at), read by the Tk thread
+        self.shown = None
+        self.connection = None
+        self.last_sent = 0.0
+        self.running = True
+        self.worker = threading.Thread(target=self._worker_loop, daemon=True)
+        self.worker.start()
+        if self.status_label:
+            self.status_label.after(250, self._poll_status)
+
+    def _default_factory(self):
+        if self.use_ssl:
+            context = ssl.create_default_context()
+            return smtplib.SMTP_SSL(self.smtp_host, self.smtp_port, context=context, timeout=30)
+        return smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=30)
 
     def _update_status(self, message, color):
-        if self.status_label:
+        # Called from the worker: only publish, the Tk thread shows it
+        self.status = (message, color, time.time())
+
+    def _poll_status(self):
+        """Show the latest status on the label, cleared after 3 s (runs on the Tk thread)"""
+        message, color, since = self.status
+        if message and time.time() - since > 3.0:
+            message, color = "", "black"
+        if (message, color) != self.shown:
+            self.shown = (message, color)
             self.status_label.config(text=message, fg=color)
-            self.status_label.master.update_idletasks()
+        if self.running:
+            self.status_label.after(250, self._poll_status)
 
     def send_alert(self, subject, body):
-        """Thread-safe email sending with UI updates"""
-        def _send_thread():
+        """Queue an alert for the worker; never blocks the caller"""
+        try:
+            self.queue.put_nowait((time.time(), subject, body))
+            self.queued += 1
+        except Full:
+            self.dropped += 1
+            print(f"Alert queue full, dropped: {subject}")
+
+    def pending(self):
+        """Alerts waiting to be sent"""
+        return self.queue.qsize()
+
+    def close(self, timeout=5.0):
+        """Send what is queued (best effort) and close the connection"""
+        self.running = False
+        try:
+            self.queue.put_nowait((None, None, None))  # Wake the worker
+        except Full:
+            pass  # Worker is busy with queued alerts anyway
+        self.worker.join(timeout=timeout)
+
+    def _worker_loop(self):
+        while self.running or not self.queue.empty():
+            try:
+                alert = self.queue.get(timeout=30.0)
+            except Empty:
+                self._disconnect()  # Do not hold an idle connection open
+                continue
+            if alert[1] is None:
+                continue
+
+            # Group the alerts that arrive while we are inside the digest window
+            alerts = [alert]
+            window_end = self.last_sent + self.digest_window
+            while True:
+                # When closing, take what is queued without waiting
+                remaining = window_end - time.time() if self.running else 0
+                try:
+                    alert = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except Empty:
+                    break
+                if alert[1] is None:
+                    break
+                alerts.append(alert)
+
+            self._deliver(self._build_message(alerts))
+        self._disconnect()
+
+    def _build_message(self, alerts):
+        msg = EmailMessage()
+        if len(alerts) == 1:
+            _, subject, body = alerts[0]
+        else:
+            subject = f"PPE Violation Digest - {len(alerts)} alerts"
+            body = "\n".join(
+                f"[{time.strftime('%H:%M:%S', time.localtime(ts))}] {alert_subject}: {alert_body}"
+                for ts, alert_subject, alert_body in alerts
+            )
+        msg.set_content(body)
+        msg["Subject"] = subject
+        msg["From"] = self.sender
+        msg["To"] = self.receiver
+        return msg
+
+    def _connect(self):
+        if self.connection is None:
+            connection = self.smtp_factory()
+            if self.password:
+                connection.login(self.sender, self.password)
+            self.connection = connection
+        return self.connection
+
+    def _disconnect(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except Exception:
+                pass
+            self.connection = None
+
+    @staticmethod
+    def _permanent(error):
+        """Failures that retrying cannot fix"""
+        if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused)):
+            return True
+        return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+    def _deliver(self, msg):
+        """Send over the shared connection, reconnecting with backoff on failure"""
+        backoff = 1.0
+        for attempt in range(1, self.max_attempts + 1):
             try:
                 self._update_status("Sending...", "blue")
-                
-                msg = EmailMessage()
-                msg.set_content(body)
-                msg["Subject"] = subject
-                msg["From"] = self.sender
-                msg["To"] = self.receiver
-
-                context = ssl.create_default_context()
-                with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as server:
-                    server.login(self.sender, self.password)
-                    server.send_message(msg)
-                
+                self._connect().send_message(msg)
+                self.sent += 1
+                self.last_sent = time.time()
                 self._update_status("Email sent!", "green")
-                print(f"Email sent")
+                print("Email sent")
+                return
             except Exception as e:
+                self._disconnect()
                 self._update_status(f"Failed: {str(e)}", "red")
-            finally:
-                if self.status_label:
-                    self.status_label.after(3000, lambda: self._update_status("", "black"))
-
-        threading.Thread(target=_send_thread, daemon=True).start()
\ No newline at end of file
+                if self._permanent(e) or not self.running or attempt == self.max_attempts:
+                    self.failed += 1
+                    print(f"Email dropped after {attempt} attempt(s): {msg['Subject']}: {e}")
+                    return
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
@@ -0,0 +1,141 @@
+import sqlite3
+from collections import deque
+from threading import Thread, Event
+
+class EventStore:
+    """Append-only SQLite store of tracking events (WAL mode).
+
+    record() only appends the event to a bounded deque (no lock); a background
+    thread drains it in batches, one transaction per batch, so the frame loop
+    never waits on disk. Readers open their own connection, which WAL
+    allows while the writer is busy.
+
+    Event kinds: 'appear' / 'disappear' (track visibility, duration = time
+    visible) and 'enter' / 'exit' (station visits, duration on exit).
+
+    The tracker numbers tracks from 1 again on every start, so each event
+    carries the run_id of the tracker that wrote it (its start timestamp)
+    and reports keep tracks of different runs apart.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY,
+            ts REAL NOT NULL,
+            stream TEXT NOT NULL,
+            track_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            station TEXT,
+            duration REAL,
+            run_id REAL
+        );
+        CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+        CREATE INDEX IF NOT EXISTS events_station_ts ON events (station, ts);
+        CREATE INDEX IF NOT EXISTS events_track_ts ON events (track_id, ts);
+    """
+
+    def __init__(self, path="safescan_events.db", batch_size=500, flush_interval=1.0, max_queue=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval  # Max seconds an event waits before being written
+        self.max_queue = max_queue
+        self.pending = deque()
+        self.dropped = 0  # Events lost because the queue was full
+        self.stopped = Event()
+        self.written = 0
+
+        connection = self._connect()
+        connection.executescript(self.SCHEMA)
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(events)")]
+        if "run_id" not in columns:
+            # Stores written before runs were told apart: their events keep a NULL run_id
+            connection.execute("ALTER TABLE events ADD COLUMN run_id REAL")
+        connection.close()
+
+        self.running = True
+        self.thread = Thread(target=self._writer_loop, daemon=True)
+        self.thread.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def record(self, ts, stream, track_id, kind, station=None, duration=None, run_id=None):
+        """Queue one event (never blocks)"""
+        if len(self.pending) >= self.max_queue:
+            self.dropped += 1
+            return
+        self.pending.append((ts, stream, int(track_id), kind, station, duration, run_id))
+
+    def close(self):
+        """Write everything still queued and stop the writer"""
+        self.running = False
+        self.stopped.set()
+        self.thread.join(timeout=5.0)
+
+    def _writer_loop(self):
+        connection = self._connect()
+        try:
+            while True:
+                batch = []
+                while self.pending and len(batch) < self.batch_size:
+                    batch.append(self.pending.popleft())
+                if not batch:
+                    if not self.running:
+                        break
+                    self.stopped.wait(self.flush_interval)
+                    continue
+                try:
+                    with connection:
+                        connection.executemany(
+                            "INSERT INTO events (ts, stream, track_id, kind, station, duration, run_id) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            batch
+                        )
+                    self.written += len(batch)
+                except sqlite3.Error as e:
+                    print(f"Event store error: {str(e)}")
+        finally:
+            connection.close()
+
+    def _where(self, start, end, station, track_id, stream, kind=None):
+        clauses = []
+        params = []
+        for column, operator, value in (
+            ("ts", ">=", start), ("ts", "<", end), ("station", "=", station),
+            ("track_id", "=", track_id), ("stream", "=", stream), ("kind", "=", kind)
+        ):
+            if value is not None:
+                clauses.append(f"{column} {operator} ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, start=None, end=None, station=None, track_id=None, stream=None, kind=None, limit=1000):
+        """Raw events in a time range, newest first"""
+        where, params = self._where(start, end, station, track_id, stream, kind)
+        connection = self._connect()
+        try:
+            return connection.execute(
+                f"SELECT ts, stream, track_id, kind, station, duration, run_id FROM events{where} "
+                f"ORDER BY ts DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        finally:
+            connection.close()
+
+    def dwell_report(self, start=None, end=None, station=None, track_id=None, stream=None):
+        """Time spent per track and station from completed visits.
+
+        Returns rows of (stream, run_id, track_id, station, visits, total seconds).
+        """
+        where, params = self._where(start, end, station, track_id, stream, kind="exit")
+        connection = self._connect()
+        try:
+            return connection.execute(
+                f"SELECT stream, run_id, track_id, station, COUNT(*), SUM(duration) FROM events{where} "
+                f"GROUP BY stream, run_id, track_id, station ORDER BY stream, run_id, track_id, station",
+                params
+            ).fetchall()
+        finally:
+            connection.close()
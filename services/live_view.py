@@ -0,0 +1,360 @@
+"""Local live view of the annotated video.
+
+LiveView serves, on a background HTTP server:
+
+    /                       a page with every stream and the live counts
+    /stream/<name>.mjpg     MJPEG video of one stream (/stream.mjpg: the first)
+    /snapshot/<name>.jpg    the latest frame as one JPEG
+    /ws                     WebSocket feed of JSON messages: per-frame people
+                            and station counts, and violation events
+
+The frame loop calls publish() with each annotated frame. The counts go to
+the WebSocket clients for every frame; the frames are rate limited to fps
+and, only while someone is watching that stream, copied into
+a reused buffer (converted to BGR on the way when they are RGB) for an
+encoder thread, which JPEG-encodes each frame once and shares the bytes with
+every viewer. Each viewer has its own thread that always sends the newest
+frame when it is ready for one, so a slow client skips frames and never
+holds up the others or the frame loop. WebSocket messages are likewise
+encoded once and put in a bounded queue per client that drops the oldest
+message when the client falls behind.
+"""
+import base64
+import hashlib
+import json
+import select
+import struct
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Condition, Thread
+import cv2
+import numpy as np
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+PAGE = """<!doctype html>
+<html><head><title>SafeScan live view</title>
+<style>body{font-family:sans-serif;margin:1em}img{max-width:48%%;margin:2px}pre{background:#eee;padding:.5em}</style>
+</head><body>
+<h3>SafeScan live view</h3>
+%s
+<pre id="counts">Connecting...</pre>
+<pre id="events"></pre>
+<script>
+var counts = {}, events = [];
+var ws = new WebSocket("ws://" + location.host + "/ws");
+ws.onmessage = function (message) {
+  var data = JSON.parse(message.data);
+  if (data.type == "frame") {
+    counts[data.stream] = data.stream + ": " + data.people + " people " + JSON.stringify(data.stations);
+    document.getElementById("counts").textContent = Object.values(counts).join("\\n");
+  } else if (data.type == "violation") {
+    events.unshift(new Date(data.time * 1000).toLocaleTimeString() + " " + data.stream +
+                   " person " + data.track_id + ": no " + data.reason);
+    document.getElementById("events").textContent = events.slice(0, 20).join("\\n");
+  }
+};
+ws.onclose = function () { document.getElementById("counts").textContent = "Disconnected"; };
+</script>
+</body></html>
+"""
+
+def _ws_frame(payload, opcode=0x1):
+    """One unmasked, unfragmented WebSocket frame (server to client)"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+def _read_ws_frame(rfile):
+    """(opcode, payload) of the next client frame, None if the connection closed"""
+    head = rfile.read(2)
+    if len(head) < 2:
+        return None
+    opcode, length = head[0] & 0x0F, head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", rfile.read(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", rfile.read(8))[0]
+    mask = rfile.read(4) if head[1] & 0x80 else b""
+    payload = rfile.read(length)
+    if mask:
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    return opcode, payload
+
+def _readable(sock, rfile):
+    """Whether client data waits, on the socket or already in rfile's buffer"""
+    if select.select([sock], [], [], 0)[0]:
+        return True
+    # The buffered reader may hold bytes it took from the socket earlier (e.g. a
+    # frame sent right behind the handshake); peek without blocking to see them
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        return bool(rfile.peek(1))
+    except OSError:
+        return False
+    finally:
+        sock.settimeout(timeout)
+
+class _Channel:
+    """Latest frame of one stream and its viewers"""
+    def __init__(self):
+        self.pending = None  # Copied frame waiting for the encoder
+        self.spare = []      # Frame buffers to reuse
+        self.jpeg = None     # Latest encoded frame, shared by all viewers
+        self.seq = 0         # Frames encoded so far
+        self.viewers = 0
+        self.due = float("-inf")  # Next publish time, paced to fps
+
+class LiveView:
+    def __init__(self, host="127.0.0.1", port=8091, fps=10.0, quality=80, rgb=False, max_messages=256,
+                 clock=time.monotonic):
+        self.host = host
+        self.port = port
+        self.fps = fps  # Frames per second per stream sent to viewers
+        self.quality = quality  # JPEG quality
+        self.rgb = rgb  # Frames are RGB (GUI), encoded as BGR
+        self.max_messages = max_messages  # WebSocket messages queued per client before the oldest go
+        self.clock = clock
+        self.condition = Condition()  # Guards everything below, wakes the encoder and the viewers
+        self.channels = {}  # {stream name: _Channel}
+        self.clients = []   # WebSocket clients, a deque of encoded frames each
+        self.running = False
+        self.server = None
+        self.encoder = None
+        self.encoded = 0    # Frames JPEG-encoded
+        self.frames_dropped = 0  # Encoded frames a viewer skipped because it was still sending
+        self.messages_dropped = 0
+
+    def publish(self, frame, stream="live", people=0, stations=None):
+        """Offer an annotated frame and its counts; returns at once, nothing waits for viewers"""
+        now = self.clock()
+        with self.condition:
+            # Counts of every frame; only the video is paced
+            self._broadcast({"type": "frame", "stream": stream, "time": time.time(), "people": people,
+                             "stations": stations or {}})
+            channel = self._channel(stream)
+            if now < channel.due:
+                return
+            # Keeps the average rate when frames arrive a little early or late
+            channel.due = max(channel.due, now - 1.0 / self.fps) + 1.0 / self.fps
+            if not channel.viewers or not self.running:
+                return
+            buffer = channel.spare.pop() if channel.spare else None
+        if buffer is None or buffer.shape != frame.shape:
+            buffer = np.empty_like(frame)
+        if self.rgb:
+            cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=buffer)
+        else:
+            np.copyto(buffer, frame)
+        with self.condition:
+            if channel.pending is not None:
+                channel.spare.append(channel.pending)  # The encoder never got to it
+            channel.pending = buffer
+            self.condition.notify_all()
+
+    def violation(self, track_id, reason, stream="live"):
+        """Send a violation event to the WebSocket clients (e.g. from on_violation)"""
+        with self.condition:
+            self._broadcast({"type": "violation", "stream": stream, "time": time.time(),
+                             "track_id": int(track_id), "reason": reason})
+
+    def _channel(self, stream):
+        channel = self.channels.get(stream)
+        if channel is None:
+            channel = self.channels[stream] = _Channel()
+        return channel
+
+    def _broadcast(self, message):
+        if not self.clients:
+            return
+        frame = _ws_frame(json.dumps(message).encode())  # Encoded once for every client
+        for queue in self.clients:
+            if len(queue) == queue.maxlen:
+                self.messages_dropped += 1
+            queue.append(frame)
+        self.condition.notify_all()
+
+    def _encode_loop(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)]
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: not self.running or any(c.pending is not None for c in self.channels.values()))
+                if not self.running:
+                    return
+                work = [(channel, channel.pending) for channel in self.channels.values()
+                        if channel.pending is not None]
+                for channel, _ in work:
+                    channel.pending = None
+            for channel, buffer in work:
+                ok, jpeg = cv2.imencode(".jpg", buffer, params)
+                with self.condition:
+                    channel.spare.append(buffer)
+                    if ok:
+                        channel.jpeg = jpeg.tobytes()
+                        channel.seq += 1
+                        self.encoded += 1
+                        self.condition.notify_all()
+
+    def _next_frame(self, channel, seq, timeout=1.0):
+        """(seq, jpeg) of a frame newer than seq, or (seq, None) on timeout or stop"""
+        with self.condition:
+            self.condition.wait_for(lambda: channel.seq != seq or not self.running, timeout)
+            if channel.seq == seq or not self.running:
+                return seq, None
+            if seq:
+                self.frames_dropped += channel.seq - seq - 1
+            return channel.seq, channel.jpeg
+
+    def start(self):
+        view = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/":
+                    self._page()
+                elif path == "/ws":
+                    self._websocket()
+                elif path.startswith("/stream") and path.endswith(".mjpg"):
+                    self._mjpeg(self._stream(path, "/stream/", ".mjpg"))
+                elif path.startswith("/snapshot") and path.endswith(".jpg"):
+                    self._snapshot(self._stream(path, "/snapshot/", ".jpg"))
+                else:
+                    self.send_error(404)
+
+            def _stream(self, path, prefix, suffix):
+                """Stream name from the path, None for the first stream"""
+                return path[len(prefix):-len(suffix)] if path.startswith(prefix) else None
+
+            def _page(self):
+                with view.condition:
+                    names = list(view.channels) or ["live"]
+                images = "\n".join(f'<img src="/stream/{name}.mjpg" alt="{name}">' for name in names)
+                body = (PAGE % images).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _watch(self, stream, frames):
+                """Yield up to frames new JPEGs of a stream, encoding only while someone watches"""
+                with view.condition:
+                    if stream is None:
+                        # Whichever stream publishes first
+                        while view.running and not view.channels:
+                            view.condition.wait(1.0)
+                        stream = next(iter(view.channels), "live")
+                    channel = view._channel(stream)
+                    channel.viewers += 1
+                try:
+                    seq = 0
+                    sent = 0
+                    while view.running and sent < frames:
+                        seq, jpeg = view._next_frame(channel, seq)
+                        if jpeg is not None:
+                            sent += 1
+                            yield jpeg
+                finally:
+                    with view.condition:
+                        channel.viewers -= 1
+
+            def _mjpeg(self, stream):
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                try:
+                    for jpeg in self._watch(stream, float("inf")):
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: " +
+                                         str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                except OSError:
+                    pass  # Viewer went away
+
+            def _snapshot(self, stream):
+                jpeg = next(self._watch(stream, 1), None)
+                if jpeg is None:
+                    self.send_error(503, "No frame yet")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(jpeg)))
+                self.end_headers()
+                self.wfile.write(jpeg)
+
+            def _websocket(self):
+                key = self.headers.get("Sec-WebSocket-Key")
+                if not key or self.headers.get("Upgrade", "").lower() != "websocket":
+                    self.send_error(400, "WebSocket upgrade expected")
+                    return
+                accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+                self.send_response(101)
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", accept)
+                self.end_headers()
+
+                queue = deque(maxlen=view.max_messages)
+                with view.condition:
+                    view.clients.append(queue)
+                try:
+                    while view.running:
+                        with view.condition:
+                            view.condition.wait_for(lambda: queue or not view.running, timeout=1.0)
+                            messages = list(queue)
+                            queue.clear()
+                        if messages:
+                            self.wfile.write(b"".join(messages))
+                        # Answer pings and notice a close without a reader thread
+                        closed = False
+                        while not closed and _readable(self.connection, self.rfile):
+                            frame = _read_ws_frame(self.rfile)
+                            closed = frame is None or frame[0] == 0x8
+                            if closed:
+                                self.wfile.write(_ws_frame(b"", opcode=0x8))
+                            elif frame[0] == 0x9:
+                                self.wfile.write(_ws_frame(frame[1], opcode=0xA))
+                        if closed:
+                            break
+                except OSError:
+                    pass  # Client went away
+                finally:
+                    with view.condition:
+                        view.clients.remove(queue)
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass  # Every viewer connection would print a line
+
+        try:
+            self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"Live view disabled, could not bind {self.host}:{self.port}: {str(e)}")
+            return False
+        self.port = self.server.server_address[1]
+        self.server.daemon_threads = True
+        self.running = True
+        self.encoder = Thread(target=self._encode_loop, daemon=True)
+        self.encoder.start()
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Live view at http://{self.host}:{self.port}/")
+        return True
+
+    def stop(self):
+        if self.server is None:
+            return
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        self.encoder.join(timeout=1.0)
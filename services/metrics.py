@@ -0,0 +1,255 @@
+import time
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+class RollingStats:
+    """Keeps the most recent samples of a measurement (e.g. latency in ms)"""
+    def __init__(self, size=300):
+        self.samples = deque(maxlen=size)
+
+    def add(self, value):
+        self.samples.append(value)
+
+    def percentile(self, q):
+        """Return the q-th percentile (0-100) of the current window"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def mean(self):
+        if not self.samples:
+            return 0.0
+        return sum(self.samples) / len(self.samples)
+
+    def clear(self):
+        self.samples.clear()
+
+class RateMeter:
+    """Counts events and reports the rate since the last reset"""
+    def __init__(self):
+        self.count = 0
+        self.start_time = time.perf_counter()
+
+    def tick(self, n=1):
+        self.count += n
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.start_time
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def reset(self):
+        self.count = 0
+        self.start_time = time.perf_counter()
+
+class StageLatency:
+    """Rolling latency (ms) per pipeline stage, e.g. capture/queue/inference/display"""
+    def __init__(self, stages, size=300):
+        self.stages = list(stages)
+        self.stats = {stage: RollingStats(size) for stage in self.stages}
+
+    def add(self, stage, milliseconds):
+        self.stats[stage].add(milliseconds)
+
+    def summary(self):
+        """One-line p50/p99 report for every stage"""
+        return " | ".join(
+            f"{stage} p50 {self.stats[stage].percentile(50):.1f}/p99 {self.stats[stage].percentile(99):.1f} ms"
+            for stage in self.stages
+        )
+
+# Latency buckets in seconds, from 0.1 ms to 2.5 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class Histogram:
+    """Prometheus-style histogram with one child per label value.
+
+    observe() is a bisect and three increments, cheap enough to call several
+    times per frame. Each child also keeps its recent samples in a
+    RollingStats window for local p50/p99 reports. Updates are not locked;
+    under the GIL a rare lost increment is acceptable for metrics.
+    """
+    def __init__(self, name, help_text, label, buckets=DEFAULT_BUCKETS, window=300):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.window = window
+        self.children = {}  # {label value: [bucket counts, sum, count, RollingStats]}
+
+    def _child(self, value):
+        child = self.children.get(value)
+        if child is None:
+            child = self.children[value] = [[0] * (len(self.buckets) + 1), 0.0, 0, RollingStats(self.window)]
+        return child
+
+    def observe(self, label_value, seconds):
+        child = self.children.get(label_value) or self._child(label_value)
+        child[0][bisect_left(self.buckets, seconds)] += 1
+        child[1] += seconds
+        child[2] += 1
+        child[3].add(seconds)
+
+    def recent(self, label_value):
+        """RollingStats of the latest samples for one label value"""
+        return self._child(label_value)[3]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for value, (counts, total, count, _) in list(self.children.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {total}')
+            lines.append(f'{self.name}_count{{{self.label}="{value}"}} {count}')
+        return lines
+
+class Counter:
+    """Monotonic counter"""
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+class Callback:
+    """Counter or gauge read from existing state when scraped, so it costs nothing per frame"""
+    def __init__(self, name, help_text, kind, func):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind  # "counter" or "gauge"
+        self.func = func
+
+    def render(self):
+        try:
+            value = self.func()
+        except Exception as e:
+            print(f"Metric {self.name} failed: {str(e)}")
+            return []
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}", f"{self.name} {value}"]
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text format"""
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric  # Registering a name again replaces it
+        return metric
+
+    def histogram(self, name, help_text, label, buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, label, buckets))
+
+    def counter(self, name, help_text):
+        return self._add(Counter(name, help_text))
+
+    def callback(self, name, help_text, func, kind="gauge"):
+        return self._add(Callback(name, help_text, kind, func))
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+class MetricsServer:
+    """Serves a registry at http://host:port/metrics on a background thread.
+
+    routes adds POST control endpoints: {path: callable(query string) -> text}.
+    """
+    def __init__(self, registry, host="127.0.0.1", port=9108, routes=None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.routes = dict(routes or {})
+        self.server = None
+
+    def start(self):
+        registry = self.registry
+        routes = self.routes
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                path, _, query = self.path.partition("?")
+                route = routes.get(path)
+                if route is None:
+                    self.send_error(404)
+                    return
+                try:
+                    body = route(query).encode()
+                except ValueError as e:
+                    self.send_error(400, str(e))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes every few seconds would flood the console
+
+        try:
+            self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"Metrics endpoint disabled, could not bind {self.host}:{self.port}: {str(e)}")
+            return False
+        self.server.daemon_threads = True
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Metrics at http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+# Shared by every stage of the process
+registry = MetricsRegistry()
+stage_seconds = registry.histogram(
+    "safescan_stage_seconds", "Time spent in each pipeline stage per frame", "stage")
+inferences_skipped = registry.counter(
+    "safescan_inferences_skipped_total", "Frames that reused cached detections instead of running the models")
+frames_processed = registry.counter(
+    "safescan_frames_processed_total", "Frames that went through detection")
+ppe_checks = registry.counter(
+    "safescan_ppe_checks_total", "Tracked people whose PPE the model checked on an inference frame")
+ppe_checks_reused = registry.counter(
+    "safescan_ppe_checks_reused_total", "Tracked people on an inference frame whose PPE came from the state cache")
+
+def register_pipeline_counters(slots, email_service=None):
+    """Dropped frames and alert counters, read from the stages only when scraped"""
+    registry.callback("safescan_frames_dropped_total", "Frames replaced in a hand-off slot before being used",
+                      lambda: sum(slot.dropped for slot in slots), kind="counter")
+    if email_service is not None:
+        registry.callback("safescan_alerts_queued_total", "Violation alerts accepted for sending",
+                          lambda: email_service.queued, kind="counter")
+        registry.callback("safescan_alerts_dropped_total", "Violation alerts dropped because the queue was full",
+                          lambda: email_service.dropped, kind="counter")
+        registry.callback("safescan_alerts_sent_total", "Alert emails delivered (a digest counts once)",
+                          lambda: email_service.sent, kind="counter")
+        registry.callback("safescan_alerts_failed_total", "Alert emails given up on after failed attempts",
+                          lambda: email_service.failed, kind="counter")
+        registry.callback("safescan_alerts_pending", "Violation alerts waiting to be sent",
+                          email_service.pending)
@@ -0,0 +1,157 @@
+import cv2
+import numpy as np
+
+class MotionGate:
+    """Decides per frame whether the person and PPE models need to run.
+
+    Each frame is shrunk to a small grayscale thumbnail and compared with the
+    thumbnail from the last inference frame. Inference runs when enough of the
+    thumbnail changed, but never more often than every min_interval frames and
+    never less often than every max_interval frames (so static people keep
+    their tracks and violation timers keep running).
+    """
+    def __init__(self, min_interval=2, max_interval=10, threshold=0.005, pixel_delta=20, width=160):
+        self.min_interval = max(1, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.threshold = threshold      # Fraction of thumbnail pixels that must change
+        self.pixel_delta = pixel_delta  # Gray level difference that counts as change
+        self.width = width
+        self.reference = None           # Thumbnail from the last inference frame
+        self.frames_since = 0
+        self.last_motion = 0.0          # Changed fraction measured on the last check
+        self.buffers = None             # Reused thumbnail buffers for the current frame size
+        self.buffers_for = None
+
+    def reset(self):
+        self.reference = None
+        self.buffers_for = None  # Start over with fresh buffers
+        self.frames_since = 0
+        self.last_motion = 0.0
+
+    def _thumbnail(self, frame):
+        if self.buffers_for != frame.shape:
+            height, width = frame.shape[:2]
+            size = (self.width, max(1, int(height * self.width / width)))
+            self.buffers = {
+                'size': size,
+                'small': np.empty((size[1], size[0], *frame.shape[2:]), dtype=np.uint8),
+                'gray': np.empty((size[1], size[0]), dtype=np.uint8),
+                'blurred': np.empty((size[1], size[0]), dtype=np.uint8),
+                'spare': np.empty((size[1], size[0]), dtype=np.uint8),  # Swapped with the reference
+                'diff': np.empty((size[1], size[0]), dtype=np.uint8)
+            }
+            self.buffers_for = frame.shape
+            self.reference = None
+        buffers = self.buffers
+        small = cv2.resize(frame, buffers['size'], dst=buffers['small'], interpolation=cv2.INTER_LINEAR)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=buffers['gray']) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0, dst=buffers['blurred'])
+
+    def should_run(self, frame):
+        """Return True if this frame should go through the models"""
+        self.frames_since += 1
+        if self.reference is not None and self.frames_since < self.min_interval:
+            return False
+
+        thumbnail = self._thumbnail(frame)
+        if self.reference is None:
+            run = True
+        elif self.frames_since >= self.max_interval:
+            run = True
+        else:
+            diff = cv2.absdiff(thumbnail, self.reference, dst=self.buffers['diff'])
+            cv2.threshold(diff, self.pixel_delta, 255, cv2.THRESH_BINARY, dst=diff)
+            self.last_motion = cv2.countNonZero(diff) / diff.size
+            run = self.last_motion >= self.threshold
+
+        if run:
+            # Keep this thumbnail as the reference, the old reference becomes the next output
+            spare = self.reference if self.reference is not None else self.buffers['spare']
+            self.reference = thumbnail
+            self.buffers['blurred'] = spare
+            self.frames_since = 0
+        return run
+
+class BoxPredictor:
+    """Constant-velocity Kalman filter per track, to move boxes on frames without inference.
+
+    Each box coordinate (x1, y1, x2, y2) is an independent position/velocity
+    filter in pixels per frame. The noise settings are the same for all of
+    them, so one 2x2 covariance per track serves all four coordinates, and all
+    tracks are updated together as arrays. update() corrects the filters with
+    the tracker's boxes on an inference frame; predict() extrapolates them to a
+    later frame without changing the state. Predictions stop moving after
+    max_gap frames, so a lost track is held rather than sent off screen.
+    """
+    def __init__(self, process_noise=0.5, measurement_noise=4.0, initial_velocity_var=25.0, max_gap=15):
+        self.process_noise = process_noise        # Velocity change variance per frame (px/frame)^2
+        self.measurement_noise = measurement_noise  # Tracker box jitter variance (px^2)
+        self.initial_velocity_var = initial_velocity_var
+        self.max_gap = max_gap
+        self.ids = np.zeros(0, np.int64)
+        self.position = np.zeros((0, 4))  # Filtered box per track
+        self.velocity = np.zeros((0, 4))  # Pixels per frame
+        self.covariance = np.zeros((0, 3))  # [p_pos, p_cross, p_vel] per track
+        self.frame = 0  # Frame of the last update
+
+    def reset(self):
+        self.__init__(self.process_noise, self.measurement_noise, self.initial_velocity_var, self.max_gap)
+
+    def update(self, track_ids, boxes, frame):
+        """Correct the filters with the tracked boxes seen on this frame (forgets tracks not in it)"""
+        track_ids = np.asarray(track_ids, dtype=np.int64).reshape(-1)
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        dt = max(frame - self.frame, 1)
+
+        # Rows of the known tracks in the previous state, -1 for new ones
+        lookup = {track_id: row for row, track_id in enumerate(self.ids.tolist())}
+        rows = np.array([lookup.get(int(track_id), -1) for track_id in track_ids], dtype=np.int64)
+        known = rows >= 0
+
+        position = boxes.copy()
+        velocity = np.zeros_like(boxes)
+        covariance = np.tile([self.measurement_noise, 0.0, self.initial_velocity_var], (len(boxes), 1))
+        if known.any():
+            old = rows[known]
+            # Predict: x = F x, P = F P F' + Q for a constant velocity over dt frames
+            p00, p01, p11 = self.covariance[old].T
+            q = self.process_noise
+            p00 = p00 + 2 * dt * p01 + dt * dt * p11 + q * dt ** 3 / 3
+            p01 = p01 + dt * p11 + q * dt ** 2 / 2
+            p11 = p11 + q * dt
+            predicted = self.position[old] + self.velocity[old] * dt
+
+            # Correct with the measured boxes
+            gain_pos = p00 / (p00 + self.measurement_noise)
+            gain_vel = p01 / (p00 + self.measurement_noise)
+            residual = boxes[known] - predicted
+            position[known] = predicted + gain_pos[:, None] * residual
+            velocity[known] = self.velocity[old] + gain_vel[:, None] * residual
+            covariance[known] = np.stack([(1 - gain_pos) * p00, (1 - gain_pos) * p01, p11 - gain_vel * p01], axis=1)
+
+        self.ids = track_ids
+        self.position = position
+        self.velocity = velocity
+        self.covariance = covariance
+        self.frame = frame
+
+    def predict(self, track_ids, boxes, frame, size=None):
+        """Boxes for track_ids moved to this frame (boxes are returned for unknown tracks).
+
+        size = (width, height) clips the result to the frame. Returns int boxes.
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if not len(self.ids) or not len(boxes):
+            return boxes.astype(int)
+        dt = min(frame - self.frame, self.max_gap)
+        lookup = {track_id: row for row, track_id in enumerate(self.ids.tolist())}
+        predicted = boxes.copy()
+        for i, track_id in enumerate(track_ids):
+            row = lookup.get(int(track_id))
+            if row is not None:
+                predicted[i] = self.position[row] + self.velocity[row] * dt
+        if size is not None:
+            width, height = size
+            np.clip(predicted[:, 0::2], 0, width - 1, out=predicted[:, 0::2])
+            np.clip(predicted[:, 1::2], 0, height - 1, out=predicted[:, 1::2])
+        return predicted.astype(int)
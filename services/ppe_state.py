@@ -0,0 +1,194 @@
+"""Per-track PPE state, so people already known to wear their PPE are not re-checked every frame.
+
+Every tracked person keeps a score per PPE class, the belief that the item is
+worn: 0 missing, 1 worn, 0.5 unknown. A model check moves the score halfway to
+what the model saw, and between checks it decays back towards 0.5 with a half
+life, so a confident state expires on its own. Only people confidently
+wearing all their PPE skip checks: a person is due when they are new, when
+any score is below the confident level (uncertain, expired or missing, so
+people in violation are checked on every inference frame and the alert is
+reset as soon as the PPE goes back on), or as a periodic re-verification
+sample of the confident people.
+
+The violation timers are fed from the state rather than from the raw boxes of
+one frame: status() gives the time each person's PPE has been missing since.
+When a check finds an item gone, it is dated back to the previous check, so
+skipping checks of confident people never delays an alert.
+"""
+import time
+import numpy as np
+
+HELMET_CLASS = 0
+VEST_CLASS = 1
+
+def match_ppe(person_boxes, ppe_boxes, ppe_classes, regions):
+    """Return {class_id: bool matrix, people x PPE boxes} of which PPE box each person wears.
+
+    A PPE box counts for a person when the boxes overlap and, if a region rule
+    is set for its class, the PPE box center lies inside that vertical band of
+    the person box (e.g. (0, 1/3) = the helmet must be in the top third).
+    """
+    persons = np.asarray(person_boxes, dtype=np.float32).reshape(-1, 4)
+    boxes = np.asarray(ppe_boxes if ppe_boxes is not None else [], dtype=np.float32).reshape(-1, 4)
+    classes = np.asarray(ppe_classes if ppe_classes is not None else [], dtype=np.int64).reshape(-1)
+
+    # persons along rows, PPE boxes along columns
+    px1, py1, px2, py2 = (persons[:, k:k + 1] for k in range(4))
+    qx1, qy1, qx2, qy2 = (boxes[:, k] for k in range(4))
+    overlap = (qx1 <= px2) & (px1 <= qx2) & (qy1 <= py2) & (py1 <= qy2)
+
+    matches = {}
+    for class_id, region in regions.items():
+        class_matches = overlap & (classes == class_id)
+        if region is not None and class_matches.any():
+            top, bottom = region
+            center_y = (qy1 + qy2) / 2
+            height = py2 - py1
+            class_matches &= (center_y >= py1 + top * height) & (center_y <= py1 + bottom * height)
+        matches[class_id] = class_matches
+    return matches
+
+def to_relative(boxes, person_box):
+    """Express boxes as fractions of a person box"""
+    x1, y1, x2, y2 = person_box
+    scale = np.array([max(x2 - x1, 1), max(y2 - y1, 1)] * 2, np.float32)
+    return (boxes - np.array([x1, y1, x1, y1], np.float32)) / scale
+
+def from_relative(boxes, person_box):
+    """Inverse of to_relative for the person's current box"""
+    x1, y1, x2, y2 = person_box
+    scale = np.array([max(x2 - x1, 1), max(y2 - y1, 1)] * 2, np.float32)
+    return boxes * scale + np.array([x1, y1, x1, y1], np.float32)
+
+class TrackPPE:
+    """PPE state of one tracked person"""
+    __slots__ = (
+        'scores',         # Belief per class that the item is worn, as of checked_at
+        'missing_since',  # Per class, time the item has been missing since (NaN while worn)
+        'checked_at',     # Time of the last model check, None before the first one
+        'boxes',          # PPE boxes from the last check, relative to the person box
+        'classes'
+    )
+
+    def __init__(self, current_time, class_count):
+        self.scores = np.full(class_count, 0.5)
+        # Unchecked people count as missing from the moment they appear, as they
+        # would if the model had run on them and found nothing
+        self.missing_since = np.full(class_count, current_time)
+        self.checked_at = None
+        self.boxes = np.zeros((0, 4), np.float32)
+        self.classes = np.zeros(0, np.float32)
+
+class PPEStateCache:
+    def __init__(self, regions=None, half_life=8.0, confident=0.85, sample_every=5, clock=time.time):
+        # {class_id: (top, bottom) band or None}, see match_ppe; FrameProcessor shares
+        # the violation detector's rules here so both agree on what counts as worn
+        self.regions = regions or {HELMET_CLASS: (0.0, 1 / 3), VEST_CLASS: None}
+        self.half_life = half_life    # Seconds for a score to decay halfway back to 0.5
+        self.confident = confident    # Score above which a worn item needs no check
+        self.sample_every = sample_every  # Re-verify one confident person every N inference frames
+        self.clock = clock
+        self.tracks = {}  # {track_id: TrackPPE}
+        self.plans = 0    # due() calls, for the re-verification sample
+
+    def reset(self):
+        self.tracks = {}
+        self.plans = 0
+
+    def sync(self, track_ids):
+        """Start state for new tracks and forget the ones no longer tracked"""
+        now = self.clock()
+        class_count = len(self.regions)
+        active = set()
+        for track_id in track_ids:
+            track_id = int(track_id)
+            active.add(track_id)
+            if track_id not in self.tracks:
+                self.tracks[track_id] = TrackPPE(now, class_count)
+        for track_id in [tid for tid in self.tracks if tid not in active]:
+            del self.tracks[track_id]
+
+    def scores(self, track, now):
+        """The track's scores decayed towards 0.5 for the time since its last check"""
+        if track.checked_at is None:
+            return track.scores
+        return 0.5 + (track.scores - 0.5) * 0.5 ** ((now - track.checked_at) / self.half_life)
+
+    def due(self, track_ids):
+        """Indices into track_ids needing a PPE check, most urgent first (call once per inference frame).
+
+        New people come first, then uncertain ones from the least recently
+        checked, then every sample_every calls the longest unchecked of the
+        confident people.
+        """
+        now = self.clock()
+        self.plans += 1
+        new = []
+        uncertain = []
+        confident = []
+        for i, track_id in enumerate(track_ids):
+            track = self.tracks.get(int(track_id))
+            if track is None or track.checked_at is None:
+                new.append(i)
+            elif (np.abs(self.scores(track, now) - 0.5) >= self.confident - 0.5).all():
+                confident.append((track.checked_at, i))
+            else:
+                uncertain.append((track.checked_at, i))
+
+        due = new + [i for _, i in sorted(uncertain)]
+        if confident and self.plans % self.sample_every == 0:
+            due.append(min(confident)[1])
+        return due
+
+    def observe(self, track_ids, person_boxes, ppe_boxes, ppe_classes):
+        """Record a model check of these people, given the PPE boxes found on them (frame coordinates)"""
+        now = self.clock()
+        boxes = np.asarray(ppe_boxes, dtype=np.float32).reshape(-1, 4)
+        classes = np.asarray(ppe_classes, dtype=np.float32).reshape(-1)
+        matches = match_ppe(person_boxes, boxes, classes, self.regions)
+        matched = np.stack([m for m in matches.values()])  # classes x people x boxes
+        worn = matched.any(axis=2).T.astype(np.float64)    # people x classes
+        # Each box is kept (for drawing) with the first person it matches
+        wearers = matched.any(axis=0)                      # people x boxes
+        owners = np.where(wearers.any(axis=0), wearers.argmax(axis=0), -1)
+
+        for row, track_id in enumerate(track_ids):
+            track = self.tracks.get(int(track_id))
+            if track is None:
+                continue
+            scores = self.scores(track, now)
+            scores = scores + (worn[row] - scores) * 0.5
+            missing = scores < 0.5
+            newly_missing = missing & np.isnan(track.missing_since)
+            # The item went missing some time after the previous check (unchecked
+            # people already count from when they appeared)
+            track.missing_since[newly_missing] = track.checked_at
+            track.missing_since[~missing] = np.nan
+            track.scores = scores
+            track.checked_at = now
+            own = owners == row
+            track.boxes = to_relative(boxes[own], person_boxes[row])
+            track.classes = classes[own]
+
+    def status(self, track_ids):
+        """{class_id: time each person's PPE has been missing since, NaN while worn}"""
+        since = np.full((len(self.regions), len(track_ids)), np.nan)
+        for i, track_id in enumerate(track_ids):
+            track = self.tracks.get(int(track_id))
+            if track is not None:
+                since[:, i] = track.missing_since
+        return {class_id: since[k] for k, class_id in enumerate(self.regions)}
+
+    def project(self, person_boxes, track_ids):
+        """(boxes, class_ids) from everyone's last check, moved onto their current boxes"""
+        boxes = []
+        class_ids = []
+        for person_box, track_id in zip(person_boxes, track_ids):
+            track = self.tracks.get(int(track_id))
+            if track is None or not len(track.classes):
+                continue
+            boxes.append(from_relative(track.boxes, person_box))
+            class_ids.append(track.classes)
+        if not boxes:
+            return np.zeros((0, 4), np.float32), np.zeros(0, np.float32)
+        return np.concatenate(boxes), np.concatenate(class_ids)
@@ -0,0 +1,171 @@
+"""On-demand profiling of a running process.
+
+Nothing runs until a session is requested, so there is no cost while off.
+A CPU session samples one thread's stack (sys._current_frames) from a
+background thread for N seconds; a memory session takes tracemalloc
+snapshots N seconds apart and reports the biggest growth. Reports are
+written to out_dir.
+
+Sessions are started by signal (SIGUSR1 = CPU, SIGUSR2 = memory, where the
+platform has them) or by POST to the metrics server, e.g.
+    curl -X POST "http://127.0.0.1:9108/profile/cpu?seconds=30"
+"""
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from urllib.parse import parse_qs
+
+class ProfileControl:
+    def __init__(self, thread, out_dir="profiles", interval=0.005, watches=None):
+        self.thread = thread      # threading.Thread to sample (e.g. the processing thread)
+        self.out_dir = out_dir
+        self.interval = interval  # Seconds between stack samples
+        self.watches = watches or {}  # {name: callable returning a size}, reported by memory sessions
+        self.active = set()       # Kinds of session currently running
+        self.lock = threading.Lock()
+
+    def install_signals(self, seconds=30):
+        """SIGUSR1 starts a CPU session, SIGUSR2 a memory session (not available on Windows)"""
+        if not hasattr(signal, "SIGUSR1"):
+            return False
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.start("cpu", seconds))
+        signal.signal(signal.SIGUSR2, lambda signum, frame: self.start("memory", seconds))
+        return True
+
+    def http_routes(self):
+        """POST routes for MetricsServer: /profile/cpu and /profile/memory, ?seconds=N"""
+        def route(kind):
+            def handle(query):
+                seconds = float(parse_qs(query).get("seconds", ["30"])[0])
+                if self.start(kind, seconds):
+                    return f"{kind} profile started for {seconds:.0f}s, report in {os.path.abspath(self.out_dir)}\n"
+                return f"{kind} profile already running\n"
+            return handle
+        return {"/profile/cpu": route("cpu"), "/profile/memory": route("memory")}
+
+    def start(self, kind, seconds=30):
+        """Start a 'cpu' or 'memory' session in the background; False if one is running"""
+        with self.lock:
+            if kind in self.active:
+                return False
+            self.active.add(kind)
+        target = self._cpu_session if kind == "cpu" else self._memory_session
+        threading.Thread(target=target, args=(seconds,), daemon=True).start()
+        print(f"Profiling ({kind}) for {seconds:.0f}s")
+        return True
+
+    def _report_path(self, kind, extension="txt"):
+        os.makedirs(self.out_dir, exist_ok=True)
+        return os.path.join(self.out_dir, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.{extension}")
+
+    def _cpu_session(self, seconds):
+        try:
+            stacks = Counter()
+            samples = 0
+            ident = self.thread.ident
+            end = time.perf_counter() + seconds
+            while time.perf_counter() < end:
+                frame = sys._current_frames().get(ident)
+                if frame is None:
+                    break  # Thread ended
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, frame.f_lineno, code.co_name))
+                    frame = frame.f_back
+                stacks[tuple(reversed(stack))] += 1
+                samples += 1
+                time.sleep(self.interval)
+            self._write_cpu_report(stacks, samples, seconds)
+        except Exception as e:
+            print(f"CPU profiling failed: {str(e)}")
+        finally:
+            with self.lock:
+                self.active.discard("cpu")
+
+    def _write_cpu_report(self, stacks, samples, seconds):
+        own = Counter()
+        cumulative = Counter()
+        for stack, count in stacks.items():
+            own[self._function(stack[-1])] += count
+            for function in {self._function(entry) for entry in stack}:
+                cumulative[function] += count
+
+        path = self._report_path("cpu")
+        with open(path, "w") as f:
+            f.write(f"Thread {self.thread.name}: {samples} samples over {seconds:.0f}s "
+                    f"({self.interval * 1000:.0f} ms interval)\n\n")
+            for title, counts in (("Own time", own), ("Including callees", cumulative)):
+                f.write(f"{title}:\n{'samples':>8} {'%':>6}  function\n")
+                for function, count in counts.most_common(30):
+                    f.write(f"{count:>8} {count / max(samples, 1) * 100:>6.1f}  {function}\n")
+                f.write("\n")
+            f.write("Hottest lines:\n")
+            lines = Counter()
+            for stack, count in stacks.items():
+                filename, lineno, name = stack[-1]
+                lines[f"{name} ({filename}:{lineno})"] += count
+            for line, count in lines.most_common(20):
+                f.write(f"{count:>8} {count / max(samples, 1) * 100:>6.1f}  {line}\n")
+
+        # Collapsed stacks, the input format of flamegraph tools
+        with open(path[:-4] + ".folded", "w") as f:
+            for stack, count in stacks.items():
+                f.write(";".join(self._function(entry) for entry in stack) + f" {count}\n")
+        print(f"CPU profile written to {path}")
+
+    @staticmethod
+    def _function(entry):
+        filename, _, name = entry
+        return f"{name} ({os.path.basename(filename)})"
+
+    def _memory_session(self, seconds):
+        started = not tracemalloc.is_tracing()
+        try:
+            if started:
+                tracemalloc.start(5)
+            sizes_before = self._watch_sizes()
+            before = tracemalloc.take_snapshot()
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+            sizes_after = self._watch_sizes()
+            current, peak = tracemalloc.get_traced_memory()
+        except Exception as e:
+            print(f"Memory profiling failed: {str(e)}")
+            return
+        finally:
+            if started:
+                tracemalloc.stop()
+            with self.lock:
+                self.active.discard("memory")
+
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "traceback")
+        path = self._report_path("memory")
+        with open(path, "w") as f:
+            f.write(f"Allocation growth over {seconds:.0f}s (traced now {current / 1024:.0f} KiB, "
+                    f"peak {peak / 1024:.0f} KiB)\n\n")
+            if self.watches:
+                f.write("Watched sizes (before -> after):\n")
+                for name in self.watches:
+                    f.write(f"  {name}: {sizes_before.get(name)} -> {sizes_after.get(name)}\n")
+                f.write("\n")
+            for stat in stats[:25]:
+                f.write(f"{stat.size_diff / 1024:+.1f} KiB ({stat.count_diff:+d} blocks), "
+                        f"now {stat.size / 1024:.1f} KiB\n")
+                for line in stat.traceback.format(limit=5, most_recent_first=True):
+                    f.write(f"    {line}\n")
+        print(f"Memory profile written to {path}")
+
+    def _watch_sizes(self):
+        sizes = {}
+        for name, size in self.watches.items():
+            try:
+                sizes[name] = size()
+            except Exception as e:
+                sizes[name] = f"error: {str(e)}"
+        return sizes
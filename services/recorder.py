@@ -0,0 +1,226 @@
+"""Violation clip recording.
+
+ClipRecorder keeps the most recent annotated frames in a fixed ring of
+slots in shared memory, allocated once under a memory budget. When a
+violation is triggered, the frames from pre_seconds before to post_seconds
+after it are handed to a separate encoder process, which copies them out
+of the ring and writes an MP4 (or a JPEG sequence when no MP4 encoder is
+available). The frame loop only pays for one frame copy per recorded frame.
+
+The encoder runs as `python -m services.recorder` rather than through
+multiprocessing so that spawning it never re-imports the GUI script.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from queue import Queue
+import cv2
+import numpy as np
+
+HEADER_ALIGN = 64
+
+def _ring_views(buf, slots, shape):
+    """Sequence numbers and frames laid out in one shared memory block.
+
+    A slot's sequence number is -1 while it is being written, so a reader can
+    tell a frame was overwritten by checking it before and after the copy.
+    """
+    header = -(-slots * 8 // HEADER_ALIGN) * HEADER_ALIGN
+    seqs = np.ndarray((slots,), dtype=np.int64, buffer=buf)
+    frames = np.ndarray((slots, *shape), dtype=np.uint8, buffer=buf, offset=header)
+    return seqs, frames, header
+
+class ClipRecorder:
+    def __init__(self, out_dir="clips", pre_seconds=5.0, post_seconds=5.0, fps=8.0, memory_mb=256,
+                 rgb=False, clock=time.time):
+        self.out_dir = out_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.fps = fps
+        self.memory_budget = int(memory_mb * 1024 * 1024)
+        self.rgb = rgb  # Frames are RGB (GUI), the encoder converts them back to BGR
+        self.clock = clock
+
+        self.lock = threading.Lock()  # trigger() may come from another thread than add_frame()
+        self.pending = []  # Clips waiting for their post-event frames
+        self.shm = None    # Allocated on the first frame, once the frame size is known
+        self.encoder = None
+        self.shape = None
+        self.slots = 0
+        self.times = None  # Capture time per slot (only needed on this side)
+        self.next_seq = 0
+        self.last_frame_time = 0.0
+        self.clips = 0
+        self.disabled = False
+
+    def _allocate(self, shape):
+        frame_bytes = int(np.prod(shape))
+        window = self.pre_seconds + self.post_seconds
+        # Half a window of headroom so the encoder can copy a clip out before it is overwritten
+        wanted = int(window * self.fps * 1.5) + 1
+        self.slots = min(wanted, (self.memory_budget - HEADER_ALIGN) // (frame_bytes + 8))
+        if self.slots < 4:
+            print(f"Clip recording disabled: {self.memory_budget // (1024 * 1024)} MB is too small for {shape} frames")
+            self.disabled = True
+            return
+        if self.slots < wanted:
+            # Keep the whole window by recording fewer frames per second
+            self.fps = (self.slots - 1) / (window * 1.5)
+            print(f"Clip recording at {self.fps:.1f} fps to stay within the memory budget")
+
+        self.shape = shape
+        self.times = np.zeros(self.slots, dtype=np.float64)
+        header = -(-self.slots * 8 // HEADER_ALIGN) * HEADER_ALIGN
+        self.shm = shared_memory.SharedMemory(create=True, size=header + self.slots * frame_bytes)
+        self.seqs, self.frames, _ = _ring_views(self.shm.buf, self.slots, shape)
+        self.seqs[:] = -1
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.encoder = subprocess.Popen(
+            [sys.executable, "-m", "services.recorder", self.shm.name, str(self.slots),
+             ",".join(map(str, shape)), "--rgb" if self.rgb else "--bgr"],
+            stdin=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            text=True
+        )
+
+    def add_frame(self, frame):
+        """Store a frame in the ring (rate limited to fps) and dispatch finished clips"""
+        now = self.clock()
+        if self.disabled or now - self.last_frame_time < 1.0 / self.fps:
+            return
+        if self.shm is None:
+            self._allocate(frame.shape)
+            if self.disabled:
+                return
+        if frame.shape != self.shape:
+            return  # Resolution changed, the ring keeps its original frame size
+
+        self.last_frame_time = now
+        slot = self.next_seq % self.slots
+        self.seqs[slot] = -1
+        np.copyto(self.frames[slot], frame)
+        self.times[slot] = now
+        self.seqs[slot] = self.next_seq
+        self.next_seq += 1
+
+        if self.pending:
+            self._dispatch(now)
+
+    def trigger(self, track_id, reason):
+        """Record a clip around now (e.g. as the PPEViolationDetector on_violation callback)"""
+        if self.disabled:
+            return
+        now = self.clock()
+        with self.lock:
+            self.pending.append((now, track_id, reason))
+
+    def _dispatch(self, now):
+        with self.lock:
+            due = [clip for clip in self.pending if now >= clip[0] + self.post_seconds]
+            self.pending = [clip for clip in self.pending if now < clip[0] + self.post_seconds]
+
+        first_seq = max(0, self.next_seq - self.slots)
+        for event_time, track_id, reason in due:
+            start, end = event_time - self.pre_seconds, event_time + self.post_seconds
+            frames = [[seq % self.slots, seq] for seq in range(first_seq, self.next_seq)
+                      if start <= self.times[seq % self.slots] <= end]
+            name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(event_time))}_id{track_id}_{reason}"
+            job = {"path": os.path.join(os.path.abspath(self.out_dir), name), "fps": self.fps, "frames": frames}
+            try:
+                self.encoder.stdin.write(json.dumps(job) + "\n")
+                self.encoder.stdin.flush()
+                self.clips += 1
+            except (OSError, ValueError) as e:
+                print(f"Clip encoder unavailable: {str(e)}")
+
+    def close(self, timeout=10.0):
+        """Let the encoder finish queued clips, then free the ring"""
+        if self.encoder is not None:
+            self._dispatch(float("inf"))  # Clips still waiting get the frames recorded so far
+            try:
+                self.encoder.stdin.close()
+                self.encoder.wait(timeout=timeout)
+            except (OSError, subprocess.TimeoutExpired):
+                self.encoder.kill()
+        if self.shm is not None:
+            del self.seqs, self.frames  # Views must go before the block can be closed
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+def _attach(name):
+    """Open the ring without letting this process's resource tracker unlink it on exit"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+def _write_clip(path, frames, fps, rgb):
+    if not frames:
+        return
+    height, width = frames[0].shape[:2]
+    writer = cv2.VideoWriter(path + ".mp4", cv2.VideoWriter_fourcc(*"mp4v"), max(fps, 1.0), (width, height))
+    if writer.isOpened():
+        for frame in frames:
+            writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR) if rgb else frame)
+        writer.release()
+        print(f"Saved clip {path}.mp4 ({len(frames)} frames)")
+        return
+
+    # No MP4 encoder in this OpenCV build
+    os.makedirs(path, exist_ok=True)
+    for i, frame in enumerate(frames):
+        cv2.imwrite(os.path.join(path, f"{i:04d}.jpg"), cv2.cvtColor(frame, cv2.COLOR_RGB2BGR) if rgb else frame)
+    print(f"Saved clip {path}/ ({len(frames)} frames)")
+
+def _read_jobs(seqs, ring, clips):
+    """Copy each clip out of the ring as soon as it arrives, while older clips encode"""
+    for line in sys.stdin:
+        job = json.loads(line)
+        frames = []
+        for slot, seq in job["frames"]:
+            if seqs[slot] != seq:
+                continue
+            frame = ring[slot].copy()
+            if seqs[slot] == seq:  # Not overwritten during the copy
+                frames.append(frame)
+        clips.put((job["path"], frames, job["fps"]))
+    clips.put(None)
+
+def main():
+    parser = argparse.ArgumentParser(description="Clip encoder process for ClipRecorder")
+    parser.add_argument("shm")
+    parser.add_argument("slots", type=int)
+    parser.add_argument("shape")
+    parser.add_argument("--rgb", action="store_true")
+    parser.add_argument("--bgr", dest="rgb", action="store_false")
+    args = parser.parse_args()
+
+    shm = _attach(args.shm)
+    seqs, ring, _ = _ring_views(shm.buf, args.slots, tuple(int(v) for v in args.shape.split(",")))
+    clips = Queue()
+    threading.Thread(target=_read_jobs, args=(seqs, ring, clips), daemon=True).start()
+    while True:
+        clip = clips.get()
+        if clip is None:
+            break
+        path, frames, fps = clip
+        try:
+            _write_clip(path, frames, fps, args.rgb)
+        except Exception as e:
+            print(f"Clip encoding error: {str(e)}")
+    del seqs, ring
+    shm.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,36 @@
 import json
 import os
 import cv2
+import numpy as np
+from threading import Lock
+from services.overlay import StaticOverlay
 
 class StationManager:
+    """Station polygons and a frame-sized label mask for person lookups.
+
+    The mask holds 0 for "no station" and i + 1 for station i. It is rebuilt
+    only when stations or the frame size change, so finding the station of
+    every person in a frame is a single array index. Where stations overlap,
+    the earlier station wins.
+    """
     def __init__(self):
-        self.rectangles = []  # Format: [((x1, y1), (x2, y2)), ...]
+        self.polygons = []  # Format: [[[x, y], [x, y], ...], ...]
         self.station_names = []  # Format: ["Station 1", "Station 2", ...]
         self.stations_file = "services/stations.json"
-        self.rectangle_start = None
+        self.pending_points = []  # Vertices of the polygon being drawn
+        self.frame_size = None  # (width, height) of the label mask
+        self.label_mask = None
+        self.overlay = None  # Pre-rendered outlines and names, rebuilt on change
+        self.version = 0  # Bumped on every change to the stations
+        self.lock = Lock()
 
     def save(self):
         """Save stations to file with data validation"""
-        data = {
-            "rectangles": self.rectangles,
-            "station_names": self.station_names
-        }
+        with self.lock:
+            data = {
+                "polygons": self.polygons,
+                "station_names": self.station_names
+            }
         with open(self.stations_file, "w") as file:
             json.dump(data, file, indent=2)
 
@@ -23,47 +39,151 @@ class StationManager:
         if os.path.exists(self.stations_file):
             with open(self.stations_file, "r") as file:
                 data = json.load(file)
-                self.rectangles = data.get("rectangles", [])
+            polygons = data.get("polygons")
+            if polygons is None:
+                # Older files store two-corner rectangles
+                polygons = [self._rectangle_points(start, end) for start, end in data.get("rectangles", [])]
+            with self.lock:
+                self.polygons = [[list(map(int, point)) for point in polygon] for polygon in polygons]
                 self.station_names = data.get("station_names", [])
+                self._changed()
+
+    @staticmethod
+    def _rectangle_points(start_pos, end_pos):
+        (x1, y1), (x2, y2) = start_pos, end_pos
+        x1, x2 = sorted((int(x1), int(x2)))
+        y1, y2 = sorted((int(y1), int(y2)))
+        return [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+
+    def add_station(self, points):
+        """Add a new station polygon (at least 3 points)."""
+        with self.lock:
+            self.polygons.append([list(map(int, point)) for point in points])
+            self.station_names.append(f"Station {len(self.station_names) + 1}")
+            self._changed()
 
-    def add_station(self, start_pos, end_pos):
-        """Add a new station rectangle."""
-        self.rectangles.append((start_pos, end_pos))
-        self.station_names.append(f"Station {len(self.station_names) + 1}")
+    def add_rectangle(self, start_pos, end_pos):
+        """Add a new station rectangle from two corners."""
+        self.add_station(self._rectangle_points(start_pos, end_pos))
+
+    def add_point(self, point):
+        """Add a vertex to the polygon being drawn"""
+        self.pending_points.append(tuple(point))
+
+    def finish_polygon(self):
+        """Close the polygon being drawn. Two points make a rectangle."""
+        points, self.pending_points = self.pending_points, []
+        if len(points) == 2:
+            self.add_rectangle(*points)
+        elif len(points) >= 3:
+            self.add_station(points)
 
     def clear(self):
         """Remove all stations."""
-        self.rectangles = []
-        self.station_names = []
-        
-    def count_people_in_stations(self, people_positions):
+        with self.lock:
+            self.polygons = []
+            self.station_names = []
+            self.pending_points = []
+            self._changed()
+
+    def bounding_rect(self, index):
+        """Axis-aligned (x1, y1, x2, y2) around a station polygon"""
+        points = np.array(self.polygons[index])
+        return (*points.min(axis=0), *points.max(axis=0))
+
+    def _changed(self):
+        # Caller holds self.lock
+        self.version += 1
+        self.label_mask = None
+        self.overlay = None
+
+    def set_frame_size(self, width, height):
+        """Size of the frames positions refer to; rebuilds the mask if it changed"""
+        if self.frame_size != (width, height):
+            with self.lock:
+                self.frame_size = (width, height)
+                self.label_mask = None
+
+    def _build_mask(self):
+        # Caller holds self.lock. Fill in reverse so the earlier station wins overlaps.
+        width, height = self.frame_size
+        mask = np.zeros((height, width), dtype=np.int16)
+        for i in range(len(self.polygons) - 1, -1, -1):
+            cv2.fillPoly(mask, [np.array(self.polygons[i], dtype=np.int32)], i + 1)
+        self.label_mask = mask
+        return mask
+
+    def lookup(self, people_positions):
+        """Station index for every (x, y) position at once, -1 when outside all stations"""
+        positions = np.asarray(people_positions, dtype=np.int64).reshape(-1, 2)
+        if not len(positions) or not self.polygons or self.frame_size is None:
+            return np.full(len(positions), -1, dtype=np.int64)
+
+        with self.lock:
+            mask = self.label_mask if self.label_mask is not None else self._build_mask()
+
+        height, width = mask.shape
+        xs, ys = positions[:, 0], positions[:, 1]
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        labels = np.zeros(len(positions), dtype=np.int64)
+        labels[inside] = mask[ys[inside], xs[inside]]
+        return labels - 1
+
+    def names_for(self, station_indices):
+        """Station name (or None) for each looked-up index"""
+        return [self.station_names[i] if 0 <= i < len(self.station_names) else None
+                for i in station_indices]
+
+    def count_people_in_stations(self, people_positions=None, station_indices=None):
         """Returns station counts and formatted display text"""
-        station_counts = [0] * len(self.rectangles)
-        
-        for (px, py) in people_positions:
-            for i, ((x1, y1), (x2, y2)) in enumerate(self.rectangles):
-                if x1 <= px <= x2 and y1 <= py <= y2:
-                    station_counts[i] += 1
-        
-        # Generate formatted text
+        if station_indices is None:
+            station_indices = self.lookup(people_positions)
+        station_indices = np.asarray(station_indices, dtype=np.int64)
+        station_counts = np.bincount(
+            station_indices[station_indices >= 0], minlength=len(self.polygons)
+        )[:len(self.polygons)].tolist()
+
+        return station_counts, self.format_counts(station_counts)
+
+    def format_counts(self, station_counts):
+        """Generate formatted text"""
+        if not self.polygons:
+            return "Draw stations to begin tracking"
         display_text = ""
-        for i, count in enumerate(station_counts):
-            display_text += f"{self.station_names[i]}: {count}\n"
-        
-        return station_counts, display_text.strip()
-    
+        for name, count in zip(self.station_names, station_counts):
+            display_text += f"{name}: {count}\n"
+        return display_text.strip()
+
     def get_station_counts_text(self, people_positions):
         """Returns formatted text of people counts per station"""
-        if not self.rectangles:
+        if not self.polygons:
             return "Draw stations to begin tracking"
-        
+
         counts, text = self.count_people_in_stations(people_positions)
         return text
 
+    def _draw_overlay(self, layer, mask):
+        # Caller holds self.lock
+        for i, polygon in enumerate(self.polygons):
+            points = np.array(polygon, dtype=np.int32)
+            x1, y1 = points.min(axis=0)
+            for image, color in ((layer, (0, 255, 255)), (mask, 255)):
+                cv2.polylines(image, [points], True, color, 2)
+                cv2.putText(image, self.station_names[i], (int(x1), int(y1) - 5),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
     def draw_stations(self, frame):
         """Draws all stations on the frame"""
-        for i, ((x1, y1), (x2, y2)) in enumerate(self.rectangles):
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 255), 2)
-            cv2.putText(frame, self.station_names[i], (x1, y1 - 5), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
-        return frame
\ No newline at end of file
+        with self.lock:
+            overlay = self.overlay
+            if overlay is None or overlay.shape != frame.shape[:2]:
+                overlay = self.overlay = StaticOverlay(frame.shape, self._draw_overlay)
+        overlay.blend(frame)
+
+        # Polygon currently being drawn
+        pending = list(self.pending_points)
+        for point in pending:
+            cv2.circle(frame, point, 3, (0, 255, 255), -1)
+        if len(pending) >= 2:
+            cv2.polylines(frame, [np.array(pending, dtype=np.int32)], False, (0, 255, 255), 1)
+        return frame
@@ -0,0 +1,145 @@
+"""Tiled full-resolution inference for small, distant people.
+
+The models normally see the whole frame downscaled to 320 px, where a worker
+on the far side of the yard is a few pixels tall. A Tiler cuts overlapping
+tiles from the full-resolution frame, either across the whole frame or only
+over chosen regions (station bounding boxes or fixed rectangles). Each region
+has its own tile size and stride, so CPU is spent only where small targets
+live. The model runs on each tile at the tile's own size, so nothing is
+downscaled.
+
+Detections from the tiles (and from the usual whole-frame pass, which still
+finds the people close to the camera) are merged with merge_detections(): a
+box cut off by an inner tile edge is dropped, since the whole-frame pass or
+the neighbouring tile sees that person whole, and overlapping boxes of the
+same class are reduced by non-maximum suppression.
+
+Without the whole-frame pass (full_frame=False) only edges that another tile
+continues past count as cuts; boxes at the border of a region are kept. A
+person larger than a tile reaches opposite edges of every tile they are in,
+so those boxes are kept too, but the parts found in different tiles only
+merge as far as they overlap: keep full_frame on where people near the
+camera are bigger than the tiles. A tiler without any tile (no stations
+drawn yet, regions outside the frame) falls back to the whole-frame pass.
+"""
+import numpy as np
+
+def tile_starts(low, high, size, stride, limit):
+    """Start offsets of tiles of the given size covering [low, high), inside [0, limit)"""
+    if limit <= size:
+        return [0]
+    if high - low <= size:
+        # Region smaller than a tile: one tile centered on it, kept inside the frame
+        return [int(min(max((low + high - size) // 2, 0), limit - size))]
+    starts = list(range(int(low), int(high) - size, stride))
+    starts.append(int(min(high, limit)) - size)
+    return starts
+
+def merge_detections(xyxy, conf, cls, iou=0.7):
+    """Indices of the detections kept by class-wise greedy NMS, highest confidence first"""
+    order = np.argsort(-conf, kind="stable")
+    areas = np.maximum(xyxy[:, 2] - xyxy[:, 0], 0) * np.maximum(xyxy[:, 3] - xyxy[:, 1], 0)
+    suppressed = np.zeros(len(conf), dtype=bool)
+    keep = []
+    for k, best in enumerate(order):
+        if suppressed[best]:
+            continue
+        keep.append(best)
+        rest = order[k + 1:]
+        rest = rest[~suppressed[rest] & (cls[rest] == cls[best])]
+        if not len(rest):
+            continue
+        width = np.minimum(xyxy[rest, 2], xyxy[best, 2]) - np.maximum(xyxy[rest, 0], xyxy[best, 0])
+        height = np.minimum(xyxy[rest, 3], xyxy[best, 3]) - np.maximum(xyxy[rest, 1], xyxy[best, 1])
+        inter = np.maximum(width, 0) * np.maximum(height, 0)
+        union = areas[rest] + areas[best] - inter
+        suppressed[rest[inter >= iou * np.maximum(union, 1e-6)]] = True
+    return np.array(keep, dtype=np.int64)
+
+class Tiler:
+    def __init__(self, regions=None, tile_size=320, stride=240, full_frame=True, stations=None,
+                 iou=0.7, edge=4):
+        # [{"station": name} or {"rect": [x1, y1, x2, y2]}, each with optional
+        # "tile_size" and "stride"]; no regions = tile the whole frame
+        self.regions = regions or []
+        self.tile_size = tile_size  # Default tile side, also the model input size
+        self.stride = stride        # Default step between tiles (tile_size - stride = overlap)
+        self.full_frame = full_frame  # Also run the usual downscaled whole-frame pass
+        self.stations = stations    # StationManager for "station" regions
+        self.iou = iou  # Same IoU as the models' own NMS, so only cross-tile duplicates go
+        self.edge = edge  # Pixels from an inner tile edge at which a box counts as cut off
+        self.cached = None
+        self.cached_for = None
+        self.inner = {}  # {tile: (left, top, right, bottom)} edges another tile continues past
+
+    def tiles(self, width, height):
+        """[(x0, y0, x1, y1, size), ...] for a frame size, rebuilt only when it or the stations change"""
+        key = (width, height, self.stations.version if self.stations is not None else None)
+        if key != self.cached_for:
+            self.cached = self._build(width, height)
+            self.inner = {tile: self._inner_edges(tile, self.cached) for tile in self.cached}
+            self.cached_for = key
+        return self.cached
+
+    def _build(self, width, height):
+        tiles = []
+        for x1, y1, x2, y2, size, stride in self._region_rects(width, height):
+            tile_width = min(size, width)
+            tile_height = min(size, height)
+            for y0 in tile_starts(y1, y2, size, stride, height):
+                for x0 in tile_starts(x1, x2, size, stride, width):
+                    tile = (x0, y0, x0 + tile_width, y0 + tile_height, size)
+                    if tile not in tiles:
+                        tiles.append(tile)
+        return tiles
+
+    def _region_rects(self, width, height):
+        if not self.regions:
+            return [(0, 0, width, height, self.tile_size, self.stride)]
+        rects = []
+        for region in self.regions:
+            size = int(region.get("tile_size", self.tile_size))
+            stride = max(1, int(region.get("stride", self.stride)))
+            if "station" in region:
+                if self.stations is None or region["station"] not in self.stations.station_names:
+                    print(f"Tiling: no station named {region['station']!r}")
+                    continue
+                x1, y1, x2, y2 = self.stations.bounding_rect(self.stations.station_names.index(region["station"]))
+            else:
+                x1, y1, x2, y2 = region["rect"]
+            x1, x2 = max(0, int(x1)), min(width, int(x2))
+            y1, y2 = max(0, int(y1)), min(height, int(y2))
+            if x2 > x1 and y2 > y1:
+                rects.append((x1, y1, x2, y2, size, stride))
+        return rects
+
+    @staticmethod
+    def _inner_edges(tile, tiles):
+        x0, y0, x1, y1, _ = tile
+        left = top = right = bottom = False
+        for u0, v0, u1, v1, _ in tiles:
+            if v0 < y1 and v1 > y0:  # Side by side
+                left = left or u0 < x0 < u1
+                right = right or u0 < x1 < u1
+            if u0 < x1 and u1 > x0:  # One above the other
+                top = top or v0 < y0 < v1
+                bottom = bottom or v0 < y1 < v1
+        return left, top, right, bottom
+
+    def cut_off(self, xyxy, tile, width, height):
+        """Mask of tile-local boxes to drop: cut by an edge inside the frame with the whole-frame
+        pass on, else cut by an edge that a neighbouring tile continues past"""
+        x0, y0, x1, y1, _ = tile
+        edge = self.edge
+        at_left = xyxy[:, 0] <= edge
+        at_top = xyxy[:, 1] <= edge
+        at_right = xyxy[:, 2] >= x1 - x0 - edge
+        at_bottom = xyxy[:, 3] >= y1 - y0 - edge
+        if self.full_frame:
+            # The whole-frame pass sees anyone cut by an edge inside the frame
+            return ((x0 > 0) & at_left) | ((y0 > 0) & at_top) | ((x1 < width) & at_right) | \
+                   ((y1 < height) & at_bottom)
+        left, top, right, bottom = self.inner.get(tile) or self._inner_edges(tile, self.tiles(width, height))
+        # Wider or taller than the tile: no tile sees this person whole, keep the part
+        larger = (at_left & at_right) | (at_top & at_bottom)
+        return ((left & at_left) | (top & at_top) | (right & at_right) | (bottom & at_bottom)) & ~larger
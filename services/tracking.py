@@ -1,85 +1,183 @@
 import time
+from collections import OrderedDict, deque
+from threading import Lock
+
+class TrackRecord:
+    """Per-track state. Slotted so thousands of tracks stay small."""
+    __slots__ = (
+        'total_time',           # Total time visible
+        'station_time',         # Time specifically in stations
+        'current_station',
+        'station_history',      # Last few (station_name, duration) visits
+        'station_totals',       # {station_name: total seconds}, one entry per station
+        'last_seen',
+        'last_station_update',
+        'version'               # Tracker version of the last change, for changes_since()
+    )
+
+    def __init__(self, current_time, max_station_history):
+        self.total_time = 0.0
+        self.station_time = 0.0
+        self.current_station = None
+        self.station_history = deque(maxlen=max_station_history)
+        self.station_totals = {}
+        self.last_seen = current_time
+        self.last_station_update = current_time
+        self.version = 0
 
 class PeopleTracker:
-    def __init__(self):
-        self.history = {}  # Format: {track_id: {data}}
-        self.last_update_time = time.time()  # Track last global update
+    def __init__(self, timeout=300, max_station_history=20, clock=time.time, event_store=None, stream="default",
+                 max_removed=1024, removed_window=120.0, run_id=None):
+        # {track_id: TrackRecord}, ordered from least to most recently seen, so
+        # expired tracks are always at the front
+        self.history = OrderedDict()
+        self.timeout = timeout  # Seconds after which unseen tracks are dropped
+        self.max_station_history = max_station_history
+        self.clock = clock
+        self.event_store = event_store  # Optional services.events.EventStore
+        self.stream = stream
+        # Track IDs start from 1 on every run, stored events are told apart by this
+        self.run_id = time.time() if run_id is None else run_id
+        self.lock = Lock()  # update() runs on the processing thread, reads come from the UI
+        self.last_update_time = self.clock()  # Track last global update
+        # Change feed: every update() is a new version, each changed track is
+        # stamped with it and dropped tracks are remembered here for
+        # removed_window seconds (at most max_removed of them); a view that
+        # has not caught up for longer starts over
+        self.version = 0
+        self.removed = deque(maxlen=max_removed)  # (version, time removed, track_id)
+        self.removed_window = removed_window
+        self.removed_floor = 0  # Versions up to here may have lost their removals
 
-    def update(self, people_positions, person_ids, station_rectangles, station_names):
-        current_time = time.time()
+    def update(self, person_ids, person_stations):
+        """person_stations holds the station name (or None) for each person,
+        from the StationManager lookup shared with the station counts"""
+        current_time = self.clock()
         time_elapsed = current_time - self.last_update_time
         self.last_update_time = current_time
 
-        # 1. Update or create tracks
-        for track_id in person_ids:
-            if track_id not in self.history:
-                self.history[track_id] = {
-                    'total_time': 0.0,  # Total time visible
-                    'station_time': 0.0, # Time specifically in stations
-                    'current_station': None,
-                    'station_history': [],  # List of (station_name, duration)
-                    'last_seen': current_time,
-                    'last_station_update': current_time
-                }
-
-        # 2. Update all tracks
-        for track_id, data in self.history.items():
-            if track_id in person_ids:
+        with self.lock:
+            self.version += 1
+            # 1. Update or create the visible tracks only
+            for track_id, current_station in zip(person_ids, person_stations):
+                track_id = int(track_id)
+                track = self.history.get(track_id)
+                if track is None:
+                    track = TrackRecord(current_time, self.max_station_history)
+                    self.history[track_id] = track
+                    self._event(current_time, track_id, 'appear')
+                else:
+                    self.history.move_to_end(track_id)
+
                 # Person is visible - update total time
-                data['total_time'] += time_elapsed
-                data['last_seen'] = current_time
-
-                # Find current station (if any)
-                current_station = None
-                idx = person_ids.index(track_id)
-                x, y = people_positions[idx]
-                
-                for i, ((x1, y1), (x2, y2)) in enumerate(station_rectangles):
-                    if x1 <= x <= x2 and y1 <= y <= y2:
-                        current_station = station_names[i]
-                        break
+                track.total_time += time_elapsed
+                track.last_seen = current_time
+                track.version = self.version
 
                 # Handle station changes
-                if data['current_station'] != current_station:
-                    if data['current_station'] is not None:
+                if track.current_station != current_station:
+                    if track.current_station is not None:
                         # Record time spent in previous station
-                        elapsed = current_time - data['last_station_update']
-                        data['station_history'].append((
-                            data['current_station'],
-                            elapsed
-                        ))
-                        data['station_time'] += elapsed
-                    
-                    data['current_station'] = current_station
-                    data['last_station_update'] = current_time
-
-            # Else: person not currently visible, don't update times
-
-        # 3. Clean up old tracks (5 minute timeout)
-        self.history = {
-            tid: data for tid, data in self.history.items()
-            if current_time - data['last_seen'] <= 300
-        }
+                        elapsed = current_time - track.last_station_update
+                        track.station_history.append((track.current_station, elapsed))
+                        track.station_totals[track.current_station] = \
+                            track.station_totals.get(track.current_station, 0.0) + elapsed
+                        track.station_time += elapsed
+                        self._event(current_time, track_id, 'exit', track.current_station, elapsed)
+
+                    if current_station is not None:
+                        self._event(current_time, track_id, 'enter', current_station)
+                    track.current_station = current_station
+                    track.last_station_update = current_time
+
+            # 2. Clean up old tracks (5 minute timeout), oldest first
+            while self.history:
+                track_id, track = next(iter(self.history.items()))
+                if current_time - track.last_seen <= self.timeout:
+                    break
+                self.history.popitem(last=False)
+                self._removed(track_id, current_time)
+
+                # The person left while last seen, close their visit there
+                if track.current_station is not None:
+                    self._event(track.last_seen, track_id, 'exit', track.current_station,
+                                track.last_seen - track.last_station_update)
+                self._event(track.last_seen, track_id, 'disappear', duration=track.total_time)
+
+    def close(self):
+        """Record the end of every open visit, e.g. when the program exits"""
+        with self.lock:
+            for track_id, track in self.history.items():
+                if track.current_station is not None:
+                    self._event(track.last_seen, track_id, 'exit', track.current_station,
+                                track.last_seen - track.last_station_update)
+                self._event(track.last_seen, track_id, 'disappear', duration=track.total_time)
+            self.version += 1
+            self.removed_floor = self.version  # Everything went, views start over
+            self.removed.clear()
+            self.history.clear()
+
+    def _removed(self, track_id, current_time):
+        # Forget removals older than the window, and the oldest one when full
+        while self.removed and (current_time - self.removed[0][1] > self.removed_window or
+                                len(self.removed) == self.removed.maxlen):
+            self.removed_floor = self.removed.popleft()[0]
+        self.removed.append((self.version, current_time, track_id))
+
+    def changes_since(self, version):
+        """Change feed for incremental views: (version, rows, removed, reset).
+
+        rows are (track_id, total_time, station, station_time, station_since)
+        for the tracks changed after the given version (0 for a first call),
+        removed the track IDs dropped since then. reset=True means the version
+        is too old to catch up from, rows then hold every track and the caller
+        starts over. Pass the returned version to the next call.
+        """
+        with self.lock:
+            reset = version < self.removed_floor or version == 0
+            if reset:
+                version = 0
+            rows = []
+            # Changed tracks were moved to the end, so stop at the first older one
+            for track_id, track in reversed(self.history.items()):
+                if track.version <= version:
+                    break
+                rows.append((
+                    track_id,
+                    track.total_time,
+                    track.current_station,
+                    track.station_time,
+                    track.last_station_update if track.current_station is not None else None
+                ))
+            removed = []
+            for removed_version, _, track_id in reversed(self.removed):
+                if removed_version <= version:
+                    break
+                removed.append(track_id)
+            return self.version, rows, removed, reset
+
+    def _event(self, ts, track_id, kind, station=None, duration=None):
+        if self.event_store is not None:
+            self.event_store.record(ts, self.stream, track_id, kind, station, duration, self.run_id)
 
     def get_history_table_data(self):
         """Returns formatted data for history table"""
-        current_time = time.time()
+        current_time = self.clock()
         table_data = []
-        
-        for track_id, data in self.history.items():
-            # Calculate current station time if still in station
-            current_station_time = 0.0
-            if data['current_station'] is not None:
-                current_station_time = current_time - data['last_station_update']
-                total_station_time = data['station_time'] + current_station_time
-            else:
-                total_station_time = data['station_time']
-
-            table_data.append((
-                track_id,
-                f"{data['total_time']:.1f}s",  # Total time visible
-                data['current_station'] or "None",
-                f"{total_station_time:.1f}s" if data['current_station'] else f"{data['station_time']:.1f}s"
-            ))
-        
-        return table_data
\ No newline at end of file
+
+        with self.lock:
+            for track_id, track in self.history.items():
+                # Calculate current station time if still in station
+                if track.current_station is not None:
+                    total_station_time = track.station_time + current_time - track.last_station_update
+                else:
+                    total_station_time = track.station_time
+
+                table_data.append((
+                    track_id,
+                    f"{track.total_time:.1f}s",  # Total time visible
+                    track.current_station or "None",
+                    f"{total_station_time:.1f}s"
+                ))
+
+        return table_data
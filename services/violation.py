@@ -1,21 +1,41 @@
 import time
 from services.email import EmailService
-from threading import Thread, Lock
-import cv2
+from threading import Lock
+from services.overlay import LabelSprites
+from services.ppe_state import HELMET_CLASS, VEST_CLASS, match_ppe
+import numpy as np
 
 class PPEViolationDetector:
-    def __init__(self, email_service: EmailService):
+    HELMET_CLASS = HELMET_CLASS
+    VEST_CLASS = VEST_CLASS
+
+    def __init__(self, email_service: EmailService, helmet_region=(0.0, 1 / 3), vest_region=None,
+                 on_violation=None, clock=time.time):
         self.email_service = email_service
+        self.clock = clock
+        self.on_violation = on_violation  # Optional callback(track_id, ppe_type), e.g. ClipRecorder.trigger
+        # {class_id: (top, bottom) fraction of the person box height the PPE center
+        # must fall in, or None for any overlap}
+        self.ppe_regions = {
+            self.HELMET_CLASS: helmet_region,  # Default: helmet in the top third of the person
+            self.VEST_CLASS: vest_region
+        }
         self.violation_timers = {}  # {track_id: {'helmet': timer, 'vest': timer}}
         self.lock = Lock()
         self.detection_threshold = 10  # Seconds of continuous violation before email
         self.check_interval = 1.0  # How often to check for violations
         self.sent_alerts = set()  # Track IDs we've already alerted for  # <-- NEW
+        self.labels = LabelSprites(color=(206, 32, 41), thickness=2, outline_thickness=4)
         
-    def update(self, person_boxes, person_ids, ppe_boxes, ppe_classes, check_helmet=True, check_vest=True):
-        """Update detection with current frame data"""
+    def update(self, person_boxes, person_ids, ppe_boxes, ppe_classes, check_helmet=True, check_vest=True,
+               missing_since=None):
+        """Update detection with current frame data.
+
+        missing_since (PPEStateCache.status) replaces matching this frame's PPE
+        boxes: {class_id: time each person's PPE has been missing since, NaN while worn}.
+        """
         with self.lock:
-            current_time = time.time()
+            current_time = self.clock()
             
             # Reset all timers for detected people
             for track_id in person_ids:
@@ -25,58 +45,43 @@ class PPEViolationDetector:
                         'vest': {'start': None, 'reported': False}
                     }
             
-            # Check for PPE violations
+            if missing_since is None:
+                # Check which people have the required PPE (one matrix for everyone)
+                worn = self.match_ppe(person_boxes, ppe_boxes, ppe_classes)
+                missing_since = {class_id: np.where(has, np.nan, current_time) for class_id, has in worn.items()}
+            helmet_since = missing_since[self.HELMET_CLASS]
+            vest_since = missing_since[self.VEST_CLASS]
+
             for i, track_id in enumerate(person_ids):
-                person_box = person_boxes[i]
-                has_helmet = False
-                has_vest = False
-                
-                # Check if person has required PPE
-                if len(ppe_boxes) >= 1:
-                    for i, ppe_box in enumerate(ppe_boxes):
-                        if self._boxes_overlap(person_box, ppe_box):
-                            class_id = ppe_classes[i]
-                            if class_id == 0:  # Helmet class ID
-                                has_helmet = True
-                            elif class_id == 1:  # Vest class ID
-                                has_vest = True
-                
                 # Update violation timers
-                if check_helmet and not has_helmet:
-                    self._update_violation_timer(track_id, 'helmet', current_time)
+                if check_helmet and not np.isnan(helmet_since[i]):
+                    self._update_violation_timer(track_id, 'helmet', current_time, helmet_since[i])
                 else:
                     self._reset_violation_timer(track_id, 'helmet')
                     
-                if check_vest and not has_vest:
-                    self._update_violation_timer(track_id, 'vest', current_time)
+                if check_vest and not np.isnan(vest_since[i]):
+                    self._update_violation_timer(track_id, 'vest', current_time, vest_since[i])
                 else:
                     self._reset_violation_timer(track_id, 'vest')
+
+    def match_ppe(self, person_boxes, ppe_boxes, ppe_classes):
+        """Return {class_id: bool array over people} telling who wears each PPE class
+        (see services.ppe_state.match_ppe for the region rules)"""
+        matches = match_ppe(person_boxes, ppe_boxes, ppe_classes, self.ppe_regions)
+        return {class_id: m.any(axis=1) for class_id, m in matches.items()}
     
-    def _boxes_overlap(self, box1, box2):
-        """Check if two bounding boxes overlap"""
-        x1_1, y1_1, x2_1, y2_1 = box1
-        x1_2, y1_2, x2_2, y2_2 = box2
-        
-        # Check if one rectangle is to the left of the other
-        if x1_1 > x2_2 or x1_2 > x2_1:
-            return False
-            
-        # Check if one rectangle is above the other
-        if y1_1 > y2_2 or y1_2 > y2_1:
-            return False
-            
-        return True
-    
-    def _update_violation_timer(self, track_id, ppe_type, current_time):
-        """Update violation timer for a specific PPE type"""
+    def _update_violation_timer(self, track_id, ppe_type, current_time, since=None):
+        """Update violation timer for a specific PPE type (since = when it went missing, if known)"""
         timer = self.violation_timers[track_id][ppe_type]
         
         if timer['start'] is None:
-            timer['start'] = current_time
+            timer['start'] = current_time if since is None else min(since, current_time)
         elif not timer['reported'] and current_time - timer['start'] >= self.detection_threshold:
             if track_id not in self.sent_alerts:  # <-- NEW CHECK
                 self._send_violation_alert(track_id, ppe_type)
                 self.sent_alerts.add(track_id)  # <-- REMEMBER WE SENT IT
+                if self.on_violation is not None:
+                    self.on_violation(track_id, ppe_type)
             timer['reported'] = True
     
     def _reset_violation_timer(self, track_id, ppe_type):
@@ -89,8 +94,13 @@ class PPEViolationDetector:
         subject = f"PPE Violation Alert - ID {track_id}"
         message = f"Person with ID {track_id} detected without {ppe_name} for more than {self.detection_threshold} seconds."
         
-        # Send email in a separate thread
-        Thread(target=self.email_service.send_alert, args=(subject, message), daemon=True).start()
+        if self.email_service is None:
+            # Headless runs without SMTP credentials just log the alert
+            print(f"{subject}: {message}")
+            return
+
+        # Only queues the alert, the service's worker thread does the sending
+        self.email_service.send_alert(subject, message)
         
     # Add to PPEViolationDetector class:
 
@@ -112,8 +122,5 @@ class PPEViolationDetector:
                         # Draw warning background
                         # Draw violation text
                         text = " | ".join(violations)
-                        cv2.putText(frame, text, (x1, y1+20), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 4, cv2.LINE_AA)
-                        cv2.putText(frame, text, (x1, y1+20), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.4, (206, 32, 41), 2, cv2.LINE_AA)
+                        self.labels.draw(frame, text, (x1, y1+20))
         return frame
\ No newline at end of file
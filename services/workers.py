@@ -0,0 +1,344 @@
+"""Inference worker processes.
+
+DetectionEngine pins torch to one thread, so in-process inference keeps one
+core busy however many cameras there are. InferencePool runs a DetectionEngine
+in each of several worker processes and splits every model call's images
+between them, balanced by pixel count, so a multi-camera batch keeps that many
+cores busy.
+
+Each worker owns one shared memory slot. The parent copies the call's images
+(whole frames, tiles or person crops) into the worker's slot and sends a small
+JSON job with their offsets and shapes; the worker runs the model on views of
+the slot and writes the detections back into it as float32
+[x1, y1, x2, y2, conf, cls] rows, replying with the row count per image.
+No frame is ever pickled. A slot too small for a job is replaced by a larger
+one. Tracking stays in the parent, in each stream's DetectionPipeline, so
+track identity is kept per stream whichever worker saw the frame.
+
+InferencePool has the DetectionEngine interface the scheduler and the
+runners use, so it replaces the shared engine with detection.use_engine().
+Workers run as `python -m services.workers` rather than through
+multiprocessing so that spawning them never re-imports the GUI script.
+"""
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+from multiprocessing import shared_memory
+from threading import Event, Lock, Thread
+import numpy as np
+from detection import _Detections
+from services.recorder import _attach
+
+ALIGN = 64
+ROW_BYTES = 6 * 4  # float32 [x1, y1, x2, y2, conf, cls]
+
+def _aligned(size):
+    return -(-size // ALIGN) * ALIGN
+
+class _JobError(RuntimeError):
+    """A worker reported an error for a job; its pipes are still in step"""
+
+class _Worker:
+    """Parent side of one worker process and its shared memory slot"""
+    def __init__(self, index, command, cwd, size):
+        self.index = index
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.process = subprocess.Popen(
+            command + ["--shm", self.shm.name],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=cwd,
+            text=True
+        )
+        self.info = None  # Ready message with the worker's load and warmup times
+
+    def send(self, job):
+        self.process.stdin.write(json.dumps(job) + "\n")
+        self.process.stdin.flush()
+
+    def receive(self):
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Inference worker {self.index} exited (code {self.process.poll()})")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise _JobError(f"Inference worker {self.index}: {reply['error']}")
+        return reply
+
+    def write(self, images, max_det):
+        """Copy images into the slot (growing it if needed), returns the job's image list and result offset"""
+        layout = []
+        position = 0
+        for image in images:
+            layout.append([position, list(image.shape)])
+            position = _aligned(position + image.nbytes)
+        needed = position + len(images) * max_det * ROW_BYTES
+        if needed > self.shm.size:
+            self._grow(needed + needed // 2)
+        for (offset, shape), image in zip(layout, images):
+            np.copyto(np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=offset), image)
+        return layout, position
+
+    def read(self, offset, counts):
+        rows = np.ndarray((sum(counts), 6), dtype=np.float32, buffer=self.shm.buf, offset=offset).copy()
+        results = []
+        start = 0
+        for count in counts:
+            part = rows[start:start + count]
+            results.append(_Detections(part[:, :4], part[:, 4], part[:, 5]))
+            start += count
+        return results
+
+    def _grow(self, size):
+        old = self.shm
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.send({"op": "attach", "shm": self.shm.name})
+        self.receive()  # The worker has let go of the old slot
+        old.close()
+        old.unlink()
+
+    def close(self, timeout):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.shm.close()
+        self.shm.unlink()
+
+class InferencePool:
+    """DetectionEngine stand-in that spreads every model call over worker processes.
+
+    A model error in a worker fails that call only. A worker that exits or
+    stops answering in step breaks the pool: the workers are stopped, error
+    is set and is_ready() turns False, so no later call can read a reply
+    meant for an earlier one.
+    """
+    def __init__(self, workers=2, person_weights="yolov8m.pt", ppe_weights="best.pt", backend="torch",
+                 calibration_dir=None, engine="detection:DetectionEngine", slot_mb=16, max_det=300):
+        self.size = max(1, workers)
+        self.person_weights = person_weights
+        self.ppe_weights = ppe_weights
+        self.backend = backend  # See services.backends.BACKENDS
+        self.calibration_dir = calibration_dir
+        self.engine = engine  # "module:Class" each worker runs, with the DetectionEngine interface
+        self.slot_bytes = int(slot_mb * 1024 * 1024)  # Initial slot size, grows with the jobs
+        self.max_det = max_det  # Result rows reserved per image (the models' own limit)
+        self.workers = []
+        self.lock = Lock()  # One model call at a time (the slots are reused)
+        self.ready = Event()
+        self.error = None
+        self.created_at = time.perf_counter()
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.ready_time = None
+
+    def warmup(self):
+        """Start the workers and wait until each has loaded and warmed up its models"""
+        with self.lock:
+            if self.workers:
+                return
+            command = [sys.executable, "-m", "services.workers", "--engine", self.engine,
+                       "--person-weights", self.person_weights, "--ppe-weights", self.ppe_weights,
+                       "--backend", self.backend]
+            if self.calibration_dir:
+                command += ["--calibration", self.calibration_dir]
+            cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            self.workers = [_Worker(index, command, cwd, self.slot_bytes) for index in range(self.size)]
+            try:
+                for worker in self.workers:
+                    worker.info = worker.receive()
+            except Exception:
+                for worker in self.workers:
+                    worker.close(timeout=1.0)
+                self.workers = []
+                raise
+        # Workers load side by side, so the slowest one is the pool's time
+        self.load_seconds = max(worker.info["load_seconds"] or 0.0 for worker in self.workers)
+        self.warmup_seconds = max(worker.info["warmup_seconds"] or 0.0 for worker in self.workers)
+        self.ready_time = time.perf_counter()
+        self.ready.set()
+        print(f"{self.size} inference workers ready {self.cold_start_seconds():.1f}s after start")
+
+    def start_warmup(self):
+        """Warm up on a background thread; callers poll is_ready()"""
+        def _warmup_thread():
+            try:
+                self.warmup()
+            except Exception as e:
+                self.error = e
+                print(f"Inference workers failed to start: {str(e)}")
+
+        thread = Thread(target=_warmup_thread, daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self):
+        return self.ready.is_set()
+
+    def cold_start_seconds(self):
+        """Seconds from pool creation until every worker reported ready (None while loading)"""
+        if self.ready_time is None:
+            return None
+        return self.ready_time - self.created_at
+
+    def detect_people(self, frames, imgsz=320):
+        """Person detections for a batch of frames or tiles, spread over the workers"""
+        return self._run("people", frames, imgsz)
+
+    def detect_ppe(self, images, imgsz=320):
+        """PPE detections for a batch of whole frames or person crops, spread over the workers"""
+        return self._run("ppe", images, imgsz)
+
+    def detect_batch(self, frames):
+        """Run both models once over a list of frames, returns (person_dets, ppe_dets) lists"""
+        return self.detect_people(frames), self.detect_ppe(frames)
+
+    def _split(self, images):
+        """Image indices per worker, largest images first to the least loaded worker"""
+        shares = [[] for _ in self.workers]
+        load = [0] * len(self.workers)
+        for i in sorted(range(len(images)), key=lambda i: -images[i].size):
+            worker = load.index(min(load))
+            shares[worker].append(i)
+            load[worker] += images[i].size
+        return shares
+
+    def _run(self, op, images, imgsz):
+        if not images:
+            return []
+        if self.error is not None:
+            raise RuntimeError(f"Inference workers unavailable: {str(self.error)}")
+        if not self.workers:
+            self.warmup()
+        with self.lock:
+            # Hand out every job first so the workers run side by side, then collect
+            jobs = []
+            failure = None
+            try:
+                for worker, indices in zip(self.workers, self._split(images)):
+                    if not indices:
+                        continue
+                    layout, offset = worker.write([images[i] for i in indices], self.max_det)
+                    worker.send({"op": op, "imgsz": imgsz, "images": layout, "out": offset,
+                                 "max_det": self.max_det})
+                    jobs.append((worker, indices, offset))
+            except Exception as e:
+                failure = e
+
+            # Every job sent gets its reply read, even after a failure, or the
+            # next call would take it for its own
+            results = [None] * len(images)
+            for worker, indices, offset in jobs:
+                try:
+                    reply = worker.receive()
+                except Exception as e:
+                    failure = failure or e
+                    continue
+                for i, dets in zip(indices, worker.read(offset, reply["counts"])):
+                    results[i] = dets
+            if failure is None:
+                return results
+            if not isinstance(failure, _JobError):
+                self._break(failure)
+            raise failure
+
+    def _break(self, error):
+        """Stop every worker after one went out of step (called with the lock held)"""
+        print(f"Inference workers stopped: {str(error)}")
+        for worker in self.workers:
+            worker.close(timeout=1.0)
+        self.workers = []
+        self.error = error
+        self.ready.clear()
+
+    def close(self, timeout=5.0):
+        """Stop the workers and free their slots"""
+        with self.lock:
+            for worker in self.workers:
+                worker.close(timeout)
+            self.workers = []
+            self.ready.clear()
+
+def _serve(engine, shm, jobs, replies):
+    stale = []  # Old slots still referenced by the model's last batch
+    for line in jobs:
+        job = json.loads(line)
+        if job["op"] == "attach":
+            stale.append(shm)
+            shm = _attach(job["shm"])
+            for old in list(stale):
+                try:
+                    old.close()
+                    stale.remove(old)
+                except BufferError:
+                    pass
+            replies.write(json.dumps({"ok": True}) + "\n")
+            replies.flush()
+            continue
+
+        try:
+            images = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+                      for offset, shape in job["images"]]
+            detect = engine.detect_people if job["op"] == "people" else engine.detect_ppe
+            counts = []
+            rows = np.ndarray((len(images) * job["max_det"], 6), dtype=np.float32, buffer=shm.buf,
+                              offset=job["out"])
+            start = 0
+            for dets in detect(images, imgsz=job["imgsz"]):
+                count = min(len(dets), job["max_det"])
+                rows[start:start + count, :4] = dets.xyxy[:count]
+                rows[start:start + count, 4] = dets.conf[:count]
+                rows[start:start + count, 5] = dets.cls[:count]
+                counts.append(count)
+                start += count
+            del images, rows
+            reply = {"counts": counts}
+        except Exception as e:
+            reply = {"error": str(e)}
+        replies.write(json.dumps(reply) + "\n")
+        replies.flush()
+    try:
+        shm.close()
+    except BufferError:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference worker process for InferencePool")
+    parser.add_argument("--shm", required=True)
+    parser.add_argument("--engine", default="detection:DetectionEngine")
+    parser.add_argument("--person-weights", default="yolov8m.pt")
+    parser.add_argument("--ppe-weights", default="best.pt")
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--calibration")
+    args = parser.parse_args()
+
+    # Replies go over the original stdout; print() from the models goes to stderr
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    module, name = args.engine.split(":")
+    try:
+        engine = getattr(importlib.import_module(module), name)(
+            person_weights=args.person_weights,
+            ppe_weights=args.ppe_weights,
+            backend=args.backend,
+            calibration_dir=args.calibration
+        )
+        engine.warmup()
+    except Exception as e:
+        replies.write(json.dumps({"error": f"model loading failed: {str(e)}"}) + "\n")
+        replies.flush()
+        return
+    replies.write(json.dumps({"ready": True, "load_seconds": engine.load_seconds,
+                              "warmup_seconds": engine.warmup_seconds}) + "\n")
+    replies.flush()
+    _serve(engine, _attach(args.shm), sys.stdin, replies)
+
+if __name__ == "__main__":
+    main()